@@ -1,2 +1,4 @@
+from .compact import CompactDependencyGraph
 from .components import Link, LinkType, Node, NodeType
-from .network import DependencyGraph
+from .network import DependencyGraph, TrainView
+from .routes import RouteIndex
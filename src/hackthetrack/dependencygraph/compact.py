@@ -0,0 +1,236 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+from ugraph import EndNodeIdPair, NodeId, ThreeDCoordinates
+
+from hackthetrack.dependencygraph.components import Link, LinkType, Node, NodeType
+from hackthetrack.dependencygraph.network import DependencyGraph
+from hackthetrack.displib.resource_registry import ResourceRegistry
+from hackthetrack.instrumentation import timed
+
+if TYPE_CHECKING:
+    from hackthetrack.displib.compiled_instance import CompiledInstance
+    from hackthetrack.displib.load_displib_instance import DisplibInstance
+
+
+@dataclass(frozen=True, slots=True)
+class CompactDependencyGraph:
+    """
+    Array-backed dependency graph with integer node handles.
+
+    Nodes are numbered train by train, so operation `index` of train `train_id` is the node
+    train_offsets[train_id] + index. Successors and predecessors are stored in CSR form with global node indices,
+    node attributes are stored as columns (missing bounds are NaN). No per-node objects are created.
+    """
+
+    train_offsets: np.ndarray
+    train_ids: np.ndarray
+    start_lb: np.ndarray
+    start_ub: np.ndarray
+    min_duration: np.ndarray
+    successor_offsets: np.ndarray
+    successors: np.ndarray
+    predecessor_offsets: np.ndarray
+    predecessors: np.ndarray
+    resource_offsets: np.ndarray
+    resource_ids: np.ndarray
+    release_times: np.ndarray
+    resource_names: tuple[str, ...]
+
+    @classmethod
+    def from_compiled_instance(cls, compiled: "CompiledInstance") -> "CompactDependencyGraph":
+        with timed("compact_graph"):
+            return _create_compact_dependency_graph(compiled)
+
+    @classmethod
+    def from_displib_instance(cls, instance: "DisplibInstance") -> "CompactDependencyGraph":
+        from hackthetrack.displib.compiled_instance import CompiledInstance  # pylint: disable=import-outside-toplevel
+
+        return _create_compact_dependency_graph(CompiledInstance.from_displib_instance(instance))
+
+    @property
+    def n_count(self) -> int:
+        return len(self.min_duration)
+
+    @property
+    def l_count(self) -> int:
+        return len(self.successors)
+
+    @property
+    def n_trains(self) -> int:
+        return len(self.train_offsets) - 1
+
+    @property
+    def effective_start_lb(self) -> np.ndarray:
+        return np.where(np.isnan(self.start_lb), 0.0, self.start_lb)
+
+    @property
+    def effective_start_ub(self) -> np.ndarray:
+        return np.where(np.isnan(self.start_ub), np.inf, self.start_ub)
+
+    @property
+    def local_indices(self) -> np.ndarray:
+        return np.arange(self.n_count) - self.train_offsets[self.train_ids]
+
+    def node_index(self, train_id: int, index: int) -> int:
+        return int(self.train_offsets[train_id]) + index
+
+    def node_indices(self, train_ids: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        return self.train_offsets[train_ids] + indices
+
+    def node_id(self, node: int) -> NodeId:
+        """The id the node has in the ugraph based DependencyGraph."""
+        train_id = int(self.train_ids[node])
+        return NodeId(f"train_{train_id}_op_{node - int(self.train_offsets[train_id])}")
+
+    def successors_of(self, node: int) -> np.ndarray:
+        return self.successors[self.successor_offsets[node] : self.successor_offsets[node + 1]]
+
+    def predecessors_of(self, node: int) -> np.ndarray:
+        return self.predecessors[self.predecessor_offsets[node] : self.predecessor_offsets[node + 1]]
+
+    def resources_of(self, node: int) -> np.ndarray:
+        return self.resource_ids[self.resource_offsets[node] : self.resource_offsets[node + 1]]
+
+    def release_times_of(self, node: int) -> np.ndarray:
+        return self.release_times[self.resource_offsets[node] : self.resource_offsets[node + 1]]
+
+    def link_sources(self) -> np.ndarray:
+        """Source node of every link, aligned with `successors`."""
+        return np.repeat(np.arange(self.n_count), np.diff(self.successor_offsets))
+
+    def resource_use_nodes(self) -> np.ndarray:
+        """Node of every resource use, aligned with `resource_ids`."""
+        return np.repeat(np.arange(self.n_count), np.diff(self.resource_offsets))
+
+    def extended(self, other: "CompactDependencyGraph") -> "CompactDependencyGraph":
+        """The trains of `other` appended after the trains of this graph; resources are matched by name."""
+        return _append_trains(self, other)
+
+    def select_trains(self, trains: np.ndarray) -> "CompactDependencyGraph":
+        """The given trains only, renumbered in increasing order of their ids."""
+        return _select_trains(self, np.unique(trains))
+
+    def to_dependency_graph(self) -> DependencyGraph:
+        """Materialise the ugraph based representation, only needed for layouts, plots and json export."""
+        return _create_dependency_graph_from_compact(self)
+
+
+def _create_compact_dependency_graph(compiled: "CompiledInstance") -> CompactDependencyGraph:
+    n_count = compiled.n_operations
+    train_ids = np.repeat(np.arange(compiled.n_trains), np.diff(compiled.train_offsets))
+    sources = np.repeat(np.arange(n_count), np.diff(compiled.successor_offsets))
+    successors = compiled.successors + compiled.train_offsets[train_ids[sources]]
+
+    order = np.argsort(successors, kind="stable")
+    predecessor_offsets = np.zeros(n_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(successors, minlength=n_count), out=predecessor_offsets[1:])
+
+    return CompactDependencyGraph(
+        train_offsets=np.asarray(compiled.train_offsets),
+        train_ids=train_ids,
+        start_lb=np.asarray(compiled.start_lb),
+        start_ub=np.asarray(compiled.start_ub),
+        min_duration=np.asarray(compiled.min_duration),
+        successor_offsets=np.asarray(compiled.successor_offsets),
+        successors=successors,
+        predecessor_offsets=predecessor_offsets,
+        predecessors=sources[order],
+        resource_offsets=np.asarray(compiled.resource_offsets),
+        resource_ids=np.asarray(compiled.resource_ids),
+        release_times=np.asarray(compiled.release_times),
+        resource_names=compiled.resource_names,
+    )
+
+
+def _append_trains(graph: CompactDependencyGraph, other: CompactDependencyGraph) -> CompactDependencyGraph:
+    names = {name: resource for resource, name in enumerate(graph.resource_names)}
+    for name in other.resource_names:
+        names.setdefault(name, len(names))
+    resource_map = np.asarray([names[name] for name in other.resource_names], dtype=np.int64)
+    n_count = graph.n_count
+    return CompactDependencyGraph(
+        train_offsets=np.concatenate([graph.train_offsets, other.train_offsets[1:] + n_count]),
+        train_ids=np.concatenate([graph.train_ids, other.train_ids + graph.n_trains]),
+        start_lb=np.concatenate([graph.start_lb, other.start_lb]),
+        start_ub=np.concatenate([graph.start_ub, other.start_ub]),
+        min_duration=np.concatenate([graph.min_duration, other.min_duration]),
+        successor_offsets=np.concatenate([graph.successor_offsets, other.successor_offsets[1:] + graph.l_count]),
+        successors=np.concatenate([graph.successors, other.successors + n_count]),
+        predecessor_offsets=np.concatenate([graph.predecessor_offsets, other.predecessor_offsets[1:] + graph.l_count]),
+        predecessors=np.concatenate([graph.predecessors, other.predecessors + n_count]),
+        resource_offsets=np.concatenate([graph.resource_offsets, other.resource_offsets[1:] + len(graph.resource_ids)]),
+        resource_ids=np.concatenate([graph.resource_ids, resource_map[other.resource_ids]]),
+        release_times=np.concatenate([graph.release_times, other.release_times]),
+        resource_names=tuple(names),
+    )
+
+
+def _select_trains(graph: CompactDependencyGraph, trains: np.ndarray) -> CompactDependencyGraph:
+    """Links and predecessors never cross trains, so the rows of kept nodes only refer to kept nodes."""
+    kept = np.isin(graph.train_ids, trains)
+    index = np.cumsum(kept) - 1
+    used = kept[graph.resource_use_nodes()]
+    return CompactDependencyGraph(
+        train_offsets=_offsets(np.diff(graph.train_offsets)[trains]),
+        train_ids=np.searchsorted(trains, graph.train_ids[kept]),
+        start_lb=graph.start_lb[kept],
+        start_ub=graph.start_ub[kept],
+        min_duration=graph.min_duration[kept],
+        successor_offsets=_offsets(np.diff(graph.successor_offsets)[kept]),
+        successors=index[graph.successors[kept[graph.successors]]],
+        predecessor_offsets=_offsets(np.diff(graph.predecessor_offsets)[kept]),
+        predecessors=index[graph.predecessors[kept[graph.predecessors]]],
+        resource_offsets=_offsets(np.diff(graph.resource_offsets)[kept]),
+        resource_ids=graph.resource_ids[used],
+        release_times=graph.release_times[used],
+        resource_names=graph.resource_names,
+    )
+
+
+def _offsets(counts: np.ndarray) -> np.ndarray:
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def _create_dependency_graph_from_compact(graph: CompactDependencyGraph) -> DependencyGraph:
+    local_indices = graph.local_indices.tolist()
+    train_ids = graph.train_ids.tolist()
+    node_ids = [NodeId(f"train_{train_id}_op_{index}") for train_id, index in zip(train_ids, local_indices)]
+    start_lb = [None if np.isnan(value) else value for value in graph.start_lb.tolist()]
+    start_ub = [None if np.isnan(value) else value for value in graph.start_ub.tolist()]
+    min_duration = graph.min_duration.tolist()
+    successor_offsets, successors = graph.successor_offsets.tolist(), graph.successors.tolist()
+    resource_offsets = graph.resource_offsets.tolist()
+    registry = ResourceRegistry(graph.resource_names)
+    resources = [
+        registry.intern_id(rid, release)
+        for rid, release in zip(graph.resource_ids.tolist(), graph.release_times.tolist())
+    ]
+    zero_coordinates = ThreeDCoordinates(x=0, y=0, z=0)
+    nodes = [
+        Node(
+            index=local_indices[i],
+            id=node_ids[i],
+            coordinates=zero_coordinates,
+            node_type=NodeType.OPERATION,
+            train_id=train_ids[i],
+            start_lb=start_lb[i],
+            start_ub=start_ub[i],
+            min_duration=min_duration[i],
+            resources=resources[resource_offsets[i] : resource_offsets[i + 1]],
+            successors=[local_indices[s] for s in successors[successor_offsets[i] : successor_offsets[i + 1]]],
+        )
+        for i in range(graph.n_count)
+    ]
+    network = DependencyGraph.create_empty()
+    network.add_nodes(nodes)
+    network.add_links(
+        [
+            (EndNodeIdPair((node_ids[source], node_ids[target])), Link(link_type=LinkType.DEPENDENCY))
+            for source, target in zip(graph.link_sources().tolist(), successors)
+        ]
+    )
+    return network
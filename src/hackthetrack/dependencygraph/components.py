@@ -8,6 +8,7 @@ from ugraph import BaseLinkType, BaseNodeType, LinkABC, NodeABC
 class Resource:
     name: str
     release_time: float
+    id: int  # dense per instance, see ResourceRegistry
 
 
 @unique
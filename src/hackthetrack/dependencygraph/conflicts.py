@@ -0,0 +1,143 @@
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from hackthetrack.dependencygraph.compact import CompactDependencyGraph
+from hackthetrack.dependencygraph.propagation import propagate_start_bounds
+from hackthetrack.instrumentation import timed
+
+
+@dataclass(frozen=True, slots=True)
+class ResourceConflicts:
+    """Unordered pairs of nodes of different trains that may occupy `resource_ids` at the same time."""
+
+    resource_ids: np.ndarray
+    first: np.ndarray
+    second: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.resource_ids)
+
+    def node_pairs(self) -> np.ndarray:
+        """Conflicting (first, second) node pairs, each pair only once even if it shares several resources."""
+        pairs = np.stack((np.minimum(self.first, self.second), np.maximum(self.first, self.second)), axis=1)
+        return np.unique(pairs, axis=0)
+
+    def train_pairs(self, graph: CompactDependencyGraph) -> np.ndarray:
+        pairs = np.sort(np.stack((graph.train_ids[self.first], graph.train_ids[self.second]), axis=1), axis=1)
+        return np.unique(pairs, axis=0)
+
+
+@dataclass(frozen=True, slots=True)
+class ResourceConflictIndex:
+    """
+    All resource uses sorted by resource and then by the begin of their feasible occupation window.
+
+    The uses of resource r are use_nodes[use_offsets[r]:use_offsets[r + 1]]. The window of a use spans from the
+    earliest start of the operation to the latest time the train can leave it, extended by the release time. Without
+    a start_ub behind a use, its window never ends, so it conflicts with every later use of another train.
+    """
+
+    use_offsets: np.ndarray
+    use_nodes: np.ndarray
+    use_trains: np.ndarray
+    window_begin: np.ndarray
+    window_end: np.ndarray
+    resource_names: tuple[str, ...]
+
+    @classmethod
+    def from_graph(
+        cls,
+        graph: CompactDependencyGraph,
+        earliest_start: np.ndarray | None = None,
+        latest_start: np.ndarray | None = None,
+        horizon: float | None = None,
+    ) -> "ResourceConflictIndex":
+        """
+        Without explicit bounds the start bounds are propagated over the graph first.
+
+        A horizon, e.g. the makespan of an incumbent, is the latest start of every operation. It bounds the windows
+        of instances without start_ub, whose conflicts otherwise pair up nearly all uses of a resource; conflicts are
+        then only complete for schedules starting all operations by the horizon.
+        """
+        with timed("conflict_index"):
+            if earliest_start is None or latest_start is None:
+                bounded = graph if horizon is None else replace(graph, start_ub=np.fmin(graph.start_ub, horizon))
+                bounds = propagate_start_bounds(bounded)
+                earliest_start = bounds.earliest if earliest_start is None else earliest_start
+                latest_start = bounds.latest if latest_start is None else latest_start
+            latest = latest_start if horizon is None else np.minimum(latest_start, horizon)
+            return _create_conflict_index(graph, earliest_start, latest)
+
+    @property
+    def n_resources(self) -> int:
+        return len(self.use_offsets) - 1
+
+    def uses_of(self, resource_id: int) -> np.ndarray:
+        return self.use_nodes[self.use_offsets[resource_id] : self.use_offsets[resource_id + 1]]
+
+    def conflicts(self) -> ResourceConflicts:
+        """
+        Sweep over every resource and report the overlapping windows of different trains.
+
+        The number of pairs is quadratic in the uses of a resource whose windows never end, see from_graph for a
+        horizon bounding them.
+        """
+        with timed("resource_conflicts"):
+            resources, first, second = [], [], []
+            for resource_id in range(self.n_resources):
+                lo, hi = self.use_offsets[resource_id], self.use_offsets[resource_id + 1]
+                begin, end = self.window_begin[lo:hi], self.window_end[lo:hi]
+                # windows are sorted by begin, so use i overlaps exactly with the uses i + 1, ..., stop[i] - 1
+                stop = np.searchsorted(begin, end, side="left")
+                stop = np.maximum(stop, np.arange(1, hi - lo + 1))
+                counts = stop - np.arange(1, hi - lo + 1)
+                i = np.repeat(np.arange(hi - lo), counts)
+                j = i + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                different_trains = self.use_trains[lo + i] != self.use_trains[lo + j]
+                first.append(self.use_nodes[lo + i[different_trains]])
+                second.append(self.use_nodes[lo + j[different_trains]])
+                resources.append(np.full(int(different_trains.sum()), resource_id, dtype=np.int64))
+            if not resources:
+                empty = np.zeros(0, dtype=np.int64)
+                return ResourceConflicts(resource_ids=empty, first=empty, second=empty)
+            return ResourceConflicts(
+                resource_ids=np.concatenate(resources), first=np.concatenate(first), second=np.concatenate(second)
+            )
+
+
+def occupation_windows(
+    graph: CompactDependencyGraph, earliest_start: np.ndarray, latest_start: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Earliest begin and latest end of the occupation of every node.
+
+    A train leaves an operation when it starts one of its successors, the last operation ends after min_duration.
+    """
+    latest_leave = latest_start + graph.min_duration
+    has_successors = np.diff(graph.successor_offsets) > 0
+    if graph.l_count > 0:
+        latest_successor_start = np.full(graph.n_count, -np.inf)
+        np.maximum.at(latest_successor_start, graph.link_sources(), latest_start[graph.successors])
+        latest_leave = np.where(has_successors, latest_successor_start, latest_leave)
+    return earliest_start, latest_leave
+
+
+def _create_conflict_index(
+    graph: CompactDependencyGraph, earliest_start: np.ndarray, latest_start: np.ndarray
+) -> ResourceConflictIndex:
+    begin, end = occupation_windows(graph, earliest_start, latest_start)
+    nodes = graph.resource_use_nodes()
+    window_begin, window_end = begin[nodes], end[nodes] + graph.release_times
+    order = np.lexsort((window_begin, graph.resource_ids))
+    n_resources = len(graph.resource_names)
+    use_offsets = np.zeros(n_resources + 1, dtype=np.int64)
+    np.cumsum(np.bincount(graph.resource_ids, minlength=n_resources), out=use_offsets[1:])
+    return ResourceConflictIndex(
+        use_offsets=use_offsets,
+        use_nodes=nodes[order],
+        use_trains=graph.train_ids[nodes[order]],
+        window_begin=window_begin[order],
+        window_end=window_end[order],
+        resource_names=graph.resource_names,
+    )
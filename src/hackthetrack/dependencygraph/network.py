@@ -1,20 +1,93 @@
-from ugraph import EndNodeIdPair, MutableNetworkABC, NodeId, ThreeDCoordinates
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator
+
+from ugraph import NODE_ATTRIBUTE_KEY, EndNodeIdPair, MutableNetworkABC, NodeId, NodeIndex, ThreeDCoordinates
 
 from hackthetrack.dependencygraph.components import Link, LinkType, Node, NodeType
-from hackthetrack.displib.load_displib_instance import DisplibInstance
+from hackthetrack.instrumentation import timed
+
+if TYPE_CHECKING:
+    from hackthetrack.displib.load_displib_instance import DisplibInstance
 
 
 class DependencyGraph(MutableNetworkABC[Node, Link, NodeType, LinkType]):
 
     @classmethod
-    def from_displib_instance(cls, instance: DisplibInstance) -> "DependencyGraph":
-        return _create_dependency_graph(instance)
+    def from_displib_instance(cls, instance: "DisplibInstance") -> "DependencyGraph":
+        with timed("dependency_graph"):
+            return _create_dependency_graph(instance)
 
     def node_by_train_id_and_index(self, train_id: int, index: int) -> Node:
         return self.node_by_id(NodeId(f"train_{train_id}_op_{index}"))
 
+    def train(self, train_id: int) -> "TrainView":
+        first = self.node_index_by_name(NodeId(f"train_{train_id}_op_0"))
+        return TrainView(graph=self, train_id=train_id, first=first, stop=self._train_stop(train_id))
+
+    def trains(self) -> Iterator["TrainView"]:
+        """Views of all trains in order of their nodes, only the views themselves are created."""
+        first, vertices = 0, self.underlying_digraph.vs
+        while first < self.n_count:
+            train_id = vertices[first][NODE_ATTRIBUTE_KEY].train_id
+            stop = self._train_stop(train_id)
+            yield TrainView(graph=self, train_id=train_id, first=first, stop=stop)
+            first = stop
+
+    def _train_stop(self, train_id: int) -> NodeIndex:
+        """Nodes are added train by train, so a train ends where the next one starts."""
+        try:
+            return self.node_index_by_name(NodeId(f"train_{train_id + 1}_op_0"))
+        except ValueError:
+            return self.n_count
+
+
+@dataclass(frozen=True, slots=True)
+class TrainView:
+    """
+    The operations of one train as a view into a DependencyGraph, nothing is copied.
+
+    Operation `index` of the train is node first + index, successors are the local operation indices stored in the
+    nodes, so per-train algorithms run on local indices without building a sub network.
+    """
+
+    graph: DependencyGraph
+    train_id: int
+    first: NodeIndex
+    stop: NodeIndex
+
+    @property
+    def n_operations(self) -> int:
+        return self.stop - self.first
+
+    def node(self, index: int) -> Node:
+        return self.graph.underlying_digraph.vs[self.first + index][NODE_ATTRIBUTE_KEY]
+
+    def nodes(self) -> list[Node]:
+        """The nodes in order of their operation index, the list references the nodes stored in the graph."""
+        return self.graph.underlying_digraph.vs[self.first : self.stop][NODE_ATTRIBUTE_KEY]
+
+    def successors(self, index: int) -> list[int]:
+        return self.node(index).successors
+
+    def dfs(self, root: int = 0) -> Iterator[tuple[int, int]]:
+        """(operation, parent) pairs in depth first order, the root has parent -1; visits like igraph's dfs."""
+        nodes, added = self.nodes(), [False] * self.n_operations
+        added[root] = True
+        yield root, -1
+        stack = [(root, sorted(nodes[root].successors))]
+        while stack:
+            index, successors = stack[-1]
+            if not successors:
+                stack.pop()
+                continue
+            successor = successors.pop()
+            if not added[successor]:
+                added[successor] = True
+                yield successor, index
+                stack.append((successor, sorted(nodes[successor].successors)))
+
 
-def _create_dependency_graph(instance: DisplibInstance) -> DependencyGraph:
+def _create_dependency_graph(instance: "DisplibInstance") -> DependencyGraph:
     """Create a timetable network from a DisplibInstance."""
     network = DependencyGraph.create_empty()
     node_ids_per_train: list[list[NodeId]] = [[] for _ in instance.trains]
@@ -0,0 +1,190 @@
+import heapq
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+
+from hackthetrack.dependencygraph.compact import CompactDependencyGraph
+from hackthetrack.instrumentation import timed
+
+
+@dataclass(frozen=True, slots=True)
+class StartTimeBounds:
+    """Earliest and latest start of every node, indexed like the nodes of the CompactDependencyGraph."""
+
+    earliest: np.ndarray
+    latest: np.ndarray
+
+    @property
+    def feasible(self) -> np.ndarray:
+        """Nodes that can be started at all, i.e. whose earliest start does not exceed the latest start."""
+        return self.earliest <= self.latest
+
+    @property
+    def slack(self) -> np.ndarray:
+        return self.latest - self.earliest
+
+
+def topological_levels(graph: CompactDependencyGraph) -> np.ndarray:
+    """Length of the longest path from a node without predecessors to every node, computed frontier by frontier."""
+    levels = np.full(graph.n_count, -1, dtype=np.int64)
+    in_degrees = np.diff(graph.predecessor_offsets).copy()
+    frontier = np.flatnonzero(in_degrees == 0)
+    level = 0
+    while len(frontier) > 0:
+        levels[frontier] = level
+        targets = _gather(graph.successor_offsets, graph.successors, frontier)
+        in_degrees -= np.bincount(targets, minlength=graph.n_count)
+        candidates = np.unique(targets)
+        frontier = candidates[in_degrees[candidates] == 0]
+        level += 1
+    if np.any(levels < 0):
+        raise ValueError(f"Dependency graph contains a cycle through {np.count_nonzero(levels < 0)} nodes")
+    return levels
+
+
+def propagate_start_bounds(graph: CompactDependencyGraph) -> StartTimeBounds:
+    """
+    Propagate start_lb forwards and start_ub backwards over the whole graph in topological order.
+
+    A node can start once one of its predecessors has run for min_duration, and it has to start early enough to
+    reach the latest start of at least one successor. All nodes of one level are processed at once.
+    """
+    with timed("propagate_start_bounds"):
+        levels = topological_levels(graph)
+        sources, targets = graph.link_sources(), graph.successors
+        durations = graph.min_duration
+        earliest, latest = graph.effective_start_lb.copy(), graph.effective_start_ub.copy()
+
+        by_target = np.lexsort((targets, levels[targets]))
+        for edges in _split_by_level(by_target, levels[targets[by_target]]):
+            nodes, arrival = _reduce_by_key(
+                np.minimum, targets[edges], earliest[sources[edges]] + durations[sources[edges]]
+            )
+            earliest[nodes] = np.maximum(earliest[nodes], arrival)
+
+        by_source = np.lexsort((sources, -levels[sources]))
+        for edges in _split_by_level(by_source, -levels[sources[by_source]]):
+            nodes, departure = _reduce_by_key(np.maximum, sources[edges], latest[targets[edges]])
+            latest[nodes] = np.minimum(latest[nodes], departure - durations[nodes])
+
+        return StartTimeBounds(earliest=earliest, latest=latest)
+
+
+def update_start_bounds(
+    graph: CompactDependencyGraph, bounds: StartTimeBounds, levels: np.ndarray, nodes: Iterable[int]
+) -> np.ndarray:
+    """
+    Propagate changed start_lb or start_ub of `nodes` into `bounds` in place, `levels` are the topological levels.
+
+    Only the cone of the changed nodes is visited: nodes are recomputed in order of their level, forwards for the
+    earliest and backwards for the latest start, and pass a change on only if their own bound moved. Returns the
+    nodes whose earliest or latest start changed.
+    """
+    with timed("update_start_bounds"):
+        nodes = set(int(node) for node in nodes)
+        changed = _update_cone(graph, levels, nodes, bounds.earliest, forwards=True)
+        changed |= _update_cone(graph, levels, nodes, bounds.latest, forwards=False)
+        return np.asarray(sorted(changed), dtype=np.int64)
+
+
+def shortest_remaining_duration(graph: CompactDependencyGraph) -> np.ndarray:
+    """Sum of min_duration along the fastest route from every node to an operation without successors."""
+    return cheapest_completion(graph, graph.min_duration)
+
+
+def cheapest_completion(
+    graph: CompactDependencyGraph, weights: np.ndarray, levels: np.ndarray | None = None
+) -> np.ndarray:
+    """Sum of node weights along the cheapest route from every node to an operation without successors."""
+    levels = topological_levels(graph) if levels is None else levels
+    sources, targets = graph.link_sources(), graph.successors
+    remaining = weights.copy()
+    by_source = np.lexsort((sources, -levels[sources]))
+    for edges in _split_by_level(by_source, -levels[sources[by_source]]):
+        nodes, cheapest = _reduce_by_key(np.minimum, sources[edges], remaining[targets[edges]])
+        remaining[nodes] = weights[nodes] + cheapest
+    return remaining
+
+
+def mandatory_nodes(graph: CompactDependencyGraph, levels: np.ndarray | None = None) -> np.ndarray:
+    """
+    Mask of the nodes on every route of their train.
+
+    The nodes of every train are ordered by topological level. A node reachable from the first operation is on
+    every route unless a link jumps over its position, or a route can end before it at an operation without
+    successors.
+    """
+    levels = topological_levels(graph) if levels is None else levels
+    n_count = graph.n_count
+    # train-major, so the positions of a train are train_offsets[train]:train_offsets[train + 1]
+    position = np.empty(n_count, dtype=np.int64)
+    position[np.lexsort((levels, graph.train_ids))] = np.arange(n_count)
+    terminals = np.flatnonzero(np.diff(graph.successor_offsets) == 0)
+    jumps = np.bincount(position[graph.link_sources()] + 1, minlength=n_count + 1)
+    jumps -= np.bincount(position[graph.successors], minlength=n_count + 1)
+    jumps += np.bincount(position[terminals] + 1, minlength=n_count + 1)
+    jumps -= np.bincount(graph.train_offsets[graph.train_ids[terminals] + 1], minlength=n_count + 1)
+    covered = np.cumsum(jumps[:-1])[position] > 0
+    return _reachable_from_first_operations(graph) & ~covered
+
+
+def _reachable_from_first_operations(graph: CompactDependencyGraph) -> np.ndarray:
+    reached = np.zeros(graph.n_count, dtype=bool)
+    frontier = graph.train_offsets[:-1]
+    while len(frontier) > 0:
+        reached[frontier] = True
+        targets = _gather(graph.successor_offsets, graph.successors, frontier)
+        frontier = np.unique(targets[~reached[targets]])
+    return reached
+
+
+def _update_cone(
+    graph: CompactDependencyGraph, levels: np.ndarray, nodes: set[int], values: np.ndarray, forwards: bool
+) -> set[int]:
+    """Nodes are only pushed from lower (forwards) or higher levels, so a popped node sees its final inputs."""
+    sign = 1 if forwards else -1
+    queue = [(sign * int(levels[node]), node) for node in nodes]
+    heapq.heapify(queue)
+    done, changed = set(), set()
+    while queue:
+        _, node = heapq.heappop(queue)
+        if node in done:
+            continue
+        done.add(node)
+        if forwards:
+            value = 0.0 if np.isnan(graph.start_lb[node]) else float(graph.start_lb[node])
+            predecessors = graph.predecessors_of(node)
+            if len(predecessors) > 0:
+                value = max(value, float(np.min(values[predecessors] + graph.min_duration[predecessors])))
+            following = graph.successors_of(node)
+        else:
+            value = np.inf if np.isnan(graph.start_ub[node]) else float(graph.start_ub[node])
+            successors = graph.successors_of(node)
+            if len(successors) > 0:
+                value = min(value, float(np.max(values[successors])) - float(graph.min_duration[node]))
+            following = graph.predecessors_of(node)
+        if value != values[node]:
+            values[node] = value
+            changed.add(node)
+            for other in following.tolist():
+                heapq.heappush(queue, (sign * int(levels[other]), other))
+    return changed
+
+
+def _gather(offsets: np.ndarray, values: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Concatenation of the CSR rows `rows`."""
+    starts, counts = offsets[rows], offsets[rows + 1] - offsets[rows]
+    positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+    return values[positions]
+
+
+def _split_by_level(order: np.ndarray, sorted_levels: np.ndarray) -> list[np.ndarray]:
+    boundaries = np.flatnonzero(sorted_levels[1:] != sorted_levels[:-1]) + 1
+    return np.split(order, boundaries) if len(order) > 0 else []
+
+
+def _reduce_by_key(ufunc: np.ufunc, keys: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Reduce `values` per key, `keys` has to be sorted."""
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], ufunc.reduceat(values, starts)
@@ -0,0 +1,257 @@
+import hashlib
+import heapq
+import os
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from pathlib import Path
+
+import numpy as np
+
+from hackthetrack.dependencygraph.compact import CompactDependencyGraph, _offsets
+from hackthetrack.dependencygraph.propagation import topological_levels
+from hackthetrack.instrumentation import timed
+from hackthetrack.paths import OUTPUT_ROOT
+
+ROUTE_CACHE_PATH = OUTPUT_ROOT / "cache" / "routes"
+_CACHE_FORMAT_VERSION = 1
+_MEMO_SIZE = 8
+_memo: OrderedDict[str, "RouteIndex"] = OrderedDict()
+
+
+@dataclass(frozen=True, slots=True)
+class RouteIndex:
+    """
+    The k fastest routes of every train, each with the set of resources it uses.
+
+    The route DAG of every train is compressed into segments, maximal chains of nodes without route choices; segment
+    s covers the nodes segment_nodes[segment_node_offsets[s]:segment_node_offsets[s + 1]] in route order and leads
+    to the segments segment_successors[segment_successor_offsets[s]:segment_successor_offsets[s + 1]]. Train i owns
+    the routes route_offsets[i]:route_offsets[i + 1] sorted by duration, the sum of min_duration along the route.
+    Route r runs over the segments route_segments[route_segment_offsets[r]:route_segment_offsets[r + 1]] and uses
+    the resources set in footprints[r], a bitset in which bit b of word w stands for resource id 64 * w + b.
+    """
+
+    k: int
+    segment_node_offsets: np.ndarray
+    segment_nodes: np.ndarray
+    segment_successor_offsets: np.ndarray
+    segment_successors: np.ndarray
+    route_offsets: np.ndarray
+    route_segment_offsets: np.ndarray
+    route_segments: np.ndarray
+    durations: np.ndarray
+    footprints: np.ndarray
+    complete: np.ndarray
+    """Whether a train has no routes beyond its k fastest."""
+
+    @classmethod
+    def from_graph(cls, graph: CompactDependencyGraph, k: int = 8, cache_directory: Path | None = None) -> "RouteIndex":
+        """
+        Enumerate the routes once per graph content and k, later calls are lookups.
+
+        Indices are memoized for the last few graphs and, with a cache directory, stored there as .npz files.
+        """
+        if k < 1:
+            raise ValueError(f"k must be positive, got {k}")
+        key = _cache_key(graph, k)
+        path = None if cache_directory is None else cache_directory / f"{key}.npz"
+        if key in _memo:
+            _memo.move_to_end(key)
+            if path is not None and not path.is_file():  # memoized by a call without the cache directory
+                _memo[key].save(path)
+            return _memo[key]
+        if path is not None and path.is_file():
+            index = cls.load(path)
+        else:
+            with timed("route_index"):
+                index = _build_route_index(graph, k)
+            if path is not None:
+                index.save(path)
+        _memo[key] = index
+        if len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+        return index
+
+    @property
+    def n_routes(self) -> int:
+        return len(self.durations)
+
+    def routes_of(self, train: int) -> range:
+        return range(int(self.route_offsets[train]), int(self.route_offsets[train + 1]))
+
+    def fastest_routes(self) -> np.ndarray:
+        """The fastest route of every train, -1 for trains without any."""
+        first = self.route_offsets[:-1]
+        return np.where(first < self.route_offsets[1:], first, -1)
+
+    def nodes(self, route: int) -> np.ndarray:
+        segments = self.route_segments[self.route_segment_offsets[route] : self.route_segment_offsets[route + 1]]
+        return np.concatenate(
+            [self.segment_nodes[self.segment_node_offsets[s] : self.segment_node_offsets[s + 1]] for s in segments]
+        )
+
+    def resources(self, route: int) -> np.ndarray:
+        return _unpack(self.footprints[route])
+
+    def resource_mask(self, resources: np.ndarray) -> np.ndarray:
+        """Bitset of the resources, to be compared against footprints."""
+        mask = np.zeros(self.footprints.shape[1], dtype=np.uint64)
+        resources = np.asarray(resources, dtype=np.int64)
+        np.bitwise_or.at(mask, resources >> 6, np.left_shift(np.uint64(1), (resources & 63).astype(np.uint64)))
+        return mask
+
+    def routes_avoiding(self, train: int, mask: np.ndarray) -> np.ndarray:
+        """Routes of the train using none of the resources in the mask, fastest first."""
+        routes = np.arange(self.route_offsets[train], self.route_offsets[train + 1])
+        return routes[~np.any(self.footprints[routes] & mask, axis=1)]
+
+    def shared_resources(self, first: int, second: int) -> np.ndarray:
+        return _unpack(self.footprints[first] & self.footprints[second])
+
+    def save(self, path: Path) -> None:
+        """Write all arrays into one .npz file, replaced atomically."""
+        path.parent.mkdir(exist_ok=True, parents=True)
+        descriptor, temporary = tempfile.mkstemp(prefix=f".{path.stem}.", suffix=".npz", dir=path.parent)
+        with os.fdopen(descriptor, "wb") as file:
+            np.savez(file, **{field.name: getattr(self, field.name) for field in fields(self)})
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "RouteIndex":
+        with np.load(path, allow_pickle=False) as file:
+            arrays = {field.name: file[field.name] for field in fields(cls)}
+        return cls(**{**arrays, "k": int(arrays["k"])})
+
+
+def _cache_key(graph: CompactDependencyGraph, k: int) -> str:
+    digest = hashlib.sha256(f"{k} {len(graph.resource_names)}".encode())
+    for array in (graph.train_offsets, graph.successor_offsets, graph.successors, graph.min_duration):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    for array in (graph.resource_offsets, graph.resource_ids):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return f"{digest.hexdigest()}.v{_CACHE_FORMAT_VERSION}"
+
+
+def _build_route_index(graph: CompactDependencyGraph, k: int) -> RouteIndex:
+    segment_of, segment_node_offsets, segment_nodes = _segments(graph)
+    n_segments = len(segment_node_offsets) - 1
+    tails = segment_nodes[segment_node_offsets[1:] - 1]
+    out_degree = np.diff(graph.successor_offsets)[tails]
+    segment_successor_offsets = _offsets(out_degree)
+    links = _expand(graph.successor_offsets[tails], out_degree)
+    segment_successors = segment_of[graph.successors[links]]
+    durations = np.bincount(segment_of, weights=graph.min_duration, minlength=n_segments)
+
+    heads = segment_nodes[segment_node_offsets[:-1]]
+    firsts = segment_of[graph.train_offsets[:-1]]
+    routes, complete = _k_fastest_routes(
+        k, firsts, topological_levels(graph)[heads], durations, segment_successor_offsets, segment_successors
+    )
+    route_offsets = _offsets(np.bincount([train for train, _ in routes], minlength=graph.n_trains))
+    route_segment_offsets = _offsets(np.asarray([len(segments) for _, segments in routes], dtype=np.int64))
+    route_segments = np.asarray([s for _, segments in routes for s in segments], dtype=np.int64)
+    route_durations = np.add.reduceat(durations[route_segments], route_segment_offsets[:-1]) if routes else np.zeros(0)
+
+    # every use of a resource along every route, then one bit per use
+    segment_lengths = np.diff(segment_node_offsets)[route_segments]
+    nodes = segment_nodes[_expand(segment_node_offsets[:-1][route_segments], segment_lengths)]
+    node_routes = np.repeat(np.repeat(np.arange(len(routes)), np.diff(route_segment_offsets)), segment_lengths)
+    use_counts = np.diff(graph.resource_offsets)[nodes]
+    resources = graph.resource_ids[_expand(graph.resource_offsets[nodes], use_counts)]
+    footprints = np.zeros((len(routes), max((len(graph.resource_names) + 63) // 64, 1)), dtype=np.uint64)
+    bits = np.left_shift(np.uint64(1), (resources & 63).astype(np.uint64))
+    np.bitwise_or.at(footprints, (np.repeat(node_routes, use_counts), resources >> 6), bits)
+
+    return RouteIndex(
+        k=k,
+        segment_node_offsets=segment_node_offsets,
+        segment_nodes=segment_nodes,
+        segment_successor_offsets=segment_successor_offsets,
+        segment_successors=segment_successors,
+        route_offsets=route_offsets,
+        route_segment_offsets=route_segment_offsets,
+        route_segments=route_segments,
+        durations=route_durations,
+        footprints=footprints,
+        complete=complete,
+    )
+
+
+def _segments(graph: CompactDependencyGraph) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Segment of every node and the nodes of every segment in route order.
+
+    A node continues the segment of its predecessor if that is its only predecessor and has no other successor.
+    Segments are numbered by their first node, so they are train-major like the nodes.
+    """
+    n_count = graph.n_count
+    in_degree, out_degree = np.diff(graph.predecessor_offsets), np.diff(graph.successor_offsets)
+    predecessor = np.arange(n_count)
+    single = np.flatnonzero(in_degree == 1)
+    predecessor[single] = graph.predecessors[graph.predecessor_offsets[single]]
+    continues = (in_degree == 1) & (out_degree[predecessor] == 1)
+    # pointer jumping to the first node of the segment, counting the steps on the way
+    parent = np.where(continues, predecessor, np.arange(n_count))
+    depth = continues.astype(np.int64)
+    while np.any(parent[parent] != parent):
+        depth += depth[parent]
+        parent = parent[parent]
+    heads = np.flatnonzero(~continues)
+    segment_of = np.searchsorted(heads, parent)
+    segment_nodes = np.lexsort((depth, segment_of))
+    return segment_of, _offsets(np.bincount(segment_of, minlength=len(heads))), segment_nodes
+
+
+def _k_fastest_routes(
+    k: int,
+    firsts: np.ndarray,
+    levels: np.ndarray,
+    durations: np.ndarray,
+    segment_successor_offsets: np.ndarray,
+    segment_successors: np.ndarray,
+) -> tuple[list[tuple[int, list[int]]], np.ndarray]:
+    """
+    The k fastest routes from the first segment of every train, as (train, segments) in order of train and duration.
+
+    Segments are visited from the route ends backwards, each keeps its k fastest completions as (duration, successor,
+    rank of the completion of the successor); ties are broken by successor and rank, so the routes are reproducible.
+    """
+    offsets, successors = segment_successor_offsets.tolist(), segment_successors.tolist()
+    completions: list[list[tuple[float, int, int]]] = [[] for _ in levels]
+    n_routes = [0] * len(levels)  # capped at k + 1
+    durations = durations.tolist()
+    for segment in np.argsort(-levels, kind="stable").tolist():
+        children = successors[offsets[segment] : offsets[segment + 1]]
+        if not children:
+            completions[segment], n_routes[segment] = [(durations[segment], -1, -1)], 1
+            continue
+        candidates = (
+            (durations[segment] + duration, child, rank)
+            for child in children
+            for rank, (duration, _, _) in enumerate(completions[child])
+        )
+        completions[segment] = heapq.nsmallest(k, candidates)
+        n_routes[segment] = min(sum(n_routes[child] for child in children), k + 1)
+
+    routes, complete = [], np.zeros(len(firsts), dtype=bool)
+    for train, first in enumerate(firsts.tolist()):
+        complete[train] = n_routes[first] <= k
+        for rank in range(len(completions[first])):
+            segments, segment = [], first
+            while segment >= 0:
+                segments.append(segment)
+                _, segment, rank = completions[segment][rank]
+            routes.append((train, segments))
+    return routes, complete
+
+
+def _expand(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """The ranges starts[i]:starts[i] + counts[i] back to back."""
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts - starts, counts)
+
+
+def _unpack(footprint: np.ndarray) -> np.ndarray:
+    bits = np.unpackbits(footprint.astype("<u8").view(np.uint8), bitorder="little")
+    return np.flatnonzero(bits)
@@ -1 +1,3 @@
+from .compiled_instance import CompiledInstance
 from .load_displib_instance import DisplibInstance
+from .resource_registry import ResourceRegistry
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Iterable, Literal, TextIO
+
+import numpy as np
+
+from hackthetrack.displib.load_displib_instance import (
+    DisplibInstance,
+    Operation,
+    OperationDelayObjective,
+    Train,
+    _parse_objectives,
+)
+from hackthetrack.displib.resource_registry import ResourceRegistry
+from hackthetrack.displib.streaming import iter_displib_json
+from hackthetrack.instrumentation import timed
+from hackthetrack.paths import OUTPUT_ROOT
+
+CACHE_PATH = OUTPUT_ROOT / "cache" / "instances"
+_CACHE_FORMAT_VERSION = 1
+_RESOURCE_NAMES_FILE = "resource_names.json"
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledInstance:
+    """
+    Flat array representation of a DisplibInstance.
+
+    Operations of all trains are stored back to back, train i owns the operations
+    train_offsets[i]:train_offsets[i + 1]. Successors and resource uses are stored in CSR form, i.e. the successors
+    of operation j are successors[successor_offsets[j]:successor_offsets[j + 1]]. Successors are the local operation
+    indices of the DISPLIB format. Missing bounds are stored as NaN.
+    """
+
+    train_offsets: np.ndarray
+    start_lb: np.ndarray
+    start_ub: np.ndarray
+    min_duration: np.ndarray
+    successor_offsets: np.ndarray
+    successors: np.ndarray
+    resource_offsets: np.ndarray
+    resource_ids: np.ndarray
+    release_times: np.ndarray
+    objective_train: np.ndarray
+    objective_operation: np.ndarray
+    objective_threshold: np.ndarray
+    objective_increment: np.ndarray
+    objective_coeff: np.ndarray
+    resource_names: tuple[str, ...]
+
+    @property
+    def n_trains(self) -> int:
+        return len(self.train_offsets) - 1
+
+    @property
+    def n_operations(self) -> int:
+        return len(self.min_duration)
+
+    @classmethod
+    def from_displib_instance(cls, instance: DisplibInstance) -> "CompiledInstance":
+        return _compile_displib_instance(instance)
+
+    @classmethod
+    def from_json(cls, path: Path, cache_directory: Path | None = CACHE_PATH) -> "CompiledInstance":
+        """
+        Load a DISPLIB json file through the binary cache.
+
+        The cache is keyed by the hash of the file content, so a changed file is compiled again. Cached arrays are
+        memory-mapped, hence reopening an instance neither parses json nor creates per-operation objects.
+        """
+        with timed("parse"):
+            if cache_directory is None:
+                return _compile_json_file(path)
+            entry = cache_directory / _cache_key(path)
+            if not entry.is_dir():
+                _compile_json_file(path).save(entry)
+            return cls.load(entry)
+
+    @classmethod
+    def from_stream(cls, file: TextIO) -> "CompiledInstance":
+        """Fill the arrays train by train while the json is parsed, e.g. from a zip member (see open_displib_json)."""
+        with timed("parse"):
+            return _compile_json_stream(iter_displib_json(file))
+
+    def save(self, directory: Path) -> None:
+        """Write all arrays as .npy files; the directory is replaced atomically."""
+        directory.parent.mkdir(exist_ok=True, parents=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{directory.name}.", dir=directory.parent))
+        try:
+            for field in _array_fields():
+                np.save(staging / f"{field}.npy", getattr(self, field), allow_pickle=False)
+            with open(staging / _RESOURCE_NAMES_FILE, "w") as file:
+                json.dump(list(self.resource_names), file)
+            os.replace(staging, directory)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not directory.is_dir():  # otherwise a concurrent writer was faster, which is fine
+                raise
+
+    @classmethod
+    def load(cls, directory: Path, memory_map: bool = True) -> "CompiledInstance":
+        mmap_mode: Literal["r"] | None = "r" if memory_map else None
+        arrays = {field: np.load(directory / f"{field}.npy", mmap_mode=mmap_mode) for field in _array_fields()}
+        with open(directory / _RESOURCE_NAMES_FILE, "r") as file:
+            resource_names = tuple(json.load(file))
+        return cls(**arrays, resource_names=resource_names)
+
+    def resource_registry(self) -> ResourceRegistry:
+        """Lookups between resource names and the ids used in resource_ids."""
+        return ResourceRegistry(self.resource_names)
+
+    def to_displib_instance(self) -> DisplibInstance:
+        return _expand_to_displib_instance(self)
+
+
+def _array_fields() -> tuple[str, ...]:
+    return tuple(field.name for field in fields(CompiledInstance) if field.name != "resource_names")
+
+
+def _cache_key(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"{digest.hexdigest()}.v{_CACHE_FORMAT_VERSION}"
+
+
+def _compile_json_file(path: Path) -> CompiledInstance:
+    with open(path, "r") as file:
+        return _compile_json_stream(iter_displib_json(file))
+
+
+@dataclass(frozen=False, slots=True, init=False)
+class _ArrayBuilder:
+    """Collects the columns of a CompiledInstance operation by operation."""
+
+    train_offsets: list[int]
+    start_lb: list[float]
+    start_ub: list[float]
+    min_duration: list[float]
+    successor_offsets: list[int]
+    successors: list[int]
+    resource_offsets: list[int]
+    resource_ids: list[int]
+    release_times: list[float]
+    resources: ResourceRegistry
+
+    def __init__(self, resources: ResourceRegistry | None = None) -> None:
+        self.train_offsets, self.successor_offsets, self.resource_offsets = [0], [0], [0]
+        self.start_lb, self.start_ub, self.min_duration = [], [], []
+        self.successors, self.resource_ids, self.release_times = [], [], []
+        self.resources = ResourceRegistry() if resources is None else resources
+
+    def add_operation(
+        self,
+        start_lb: float | None,
+        start_ub: float | None,
+        min_duration: float,
+        resources: list[tuple[str, float]],
+        successors: list[int],
+    ) -> None:
+        self.start_lb.append(np.nan if start_lb is None else start_lb)
+        self.start_ub.append(np.nan if start_ub is None else start_ub)
+        self.min_duration.append(min_duration)
+        self.successors.extend(successors)
+        self.successor_offsets.append(len(self.successors))
+        for name, release_time in resources:
+            self.resource_ids.append(self.resources.add(name))
+            self.release_times.append(release_time)
+        self.resource_offsets.append(len(self.resource_ids))
+
+    def close_train(self) -> None:
+        self.train_offsets.append(len(self.min_duration))
+
+    def build(self, objectives: list[OperationDelayObjective]) -> CompiledInstance:
+        return CompiledInstance(
+            train_offsets=np.asarray(self.train_offsets, dtype=np.int64),
+            start_lb=np.asarray(self.start_lb, dtype=np.float64),
+            start_ub=np.asarray(self.start_ub, dtype=np.float64),
+            min_duration=np.asarray(self.min_duration, dtype=np.float64),
+            successor_offsets=np.asarray(self.successor_offsets, dtype=np.int64),
+            successors=np.asarray(self.successors, dtype=np.int64),
+            resource_offsets=np.asarray(self.resource_offsets, dtype=np.int64),
+            resource_ids=np.asarray(self.resource_ids, dtype=np.int64),
+            release_times=np.asarray(self.release_times, dtype=np.float64),
+            objective_train=np.asarray([obj["train"] for obj in objectives], dtype=np.int64),
+            objective_operation=np.asarray([obj["operation"] for obj in objectives], dtype=np.int64),
+            objective_threshold=np.asarray([obj["threshold"] for obj in objectives], dtype=np.float64),
+            objective_increment=np.asarray([obj["increment"] for obj in objectives], dtype=np.float64),
+            objective_coeff=np.asarray([obj["coeff"] for obj in objectives], dtype=np.float64),
+            resource_names=self.resources.names,
+        )
+
+
+def _compile_json_stream(items: Iterable[tuple[str, Any]]) -> CompiledInstance:
+    builder = _ArrayBuilder()
+    objectives = []
+    for key, value in items:
+        if key == "trains":
+            for op in value:
+                builder.add_operation(
+                    start_lb=op.get("start_lb"),
+                    start_ub=op.get("start_ub"),
+                    min_duration=op["min_duration"],
+                    resources=[(res["resource"], res.get("release_time", 0)) for res in op.get("resources", [])],
+                    successors=op["successors"],
+                )
+            builder.close_train()
+        elif key == "objective":
+            objectives.append(_parse_objectives(value))
+    return builder.build(objectives)
+
+
+def _compile_displib_instance(instance: DisplibInstance) -> CompiledInstance:
+    builder = _ArrayBuilder(instance.resources)
+    for train in instance.trains:
+        for operation in train["operations"]:
+            builder.add_operation(
+                start_lb=operation.start_lb,
+                start_ub=operation.start_ub,
+                min_duration=operation.min_duration,
+                resources=[(resource.name, resource.release_time) for resource in operation.resources],
+                successors=operation.successors,
+            )
+        builder.close_train()
+    return builder.build(instance.objectives)
+
+
+def _expand_to_displib_instance(compiled: CompiledInstance) -> DisplibInstance:
+    start_lb = [None if np.isnan(value) else value for value in compiled.start_lb.tolist()]
+    start_ub = [None if np.isnan(value) else value for value in compiled.start_ub.tolist()]
+    min_duration = compiled.min_duration.tolist()
+    successor_offsets, successors = compiled.successor_offsets.tolist(), compiled.successors.tolist()
+    resource_offsets = compiled.resource_offsets.tolist()
+    registry = compiled.resource_registry()
+    resources = [
+        registry.intern_id(rid, release)
+        for rid, release in zip(compiled.resource_ids.tolist(), compiled.release_times.tolist())
+    ]
+    train_offsets = compiled.train_offsets.tolist()
+    trains = [
+        Train(
+            id=train_id,
+            operations=[
+                Operation(
+                    index=op - first,
+                    start_lb=start_lb[op],
+                    start_ub=start_ub[op],
+                    min_duration=min_duration[op],
+                    resources=resources[resource_offsets[op] : resource_offsets[op + 1]],
+                    successors=successors[successor_offsets[op] : successor_offsets[op + 1]],
+                )
+                for op in range(first, last)
+            ],
+        )
+        for train_id, (first, last) in enumerate(zip(train_offsets[:-1], train_offsets[1:]))
+    ]
+    objectives = [
+        OperationDelayObjective(
+            type="op_delay", train=train, operation=operation, threshold=threshold, increment=increment, coeff=coeff
+        )
+        for train, operation, threshold, increment, coeff in zip(
+            compiled.objective_train.tolist(),
+            compiled.objective_operation.tolist(),
+            compiled.objective_threshold.tolist(),
+            compiled.objective_increment.tolist(),
+            compiled.objective_coeff.tolist(),
+        )
+    ]
+    return DisplibInstance(trains=trains, objectives=objectives, resources=registry)
@@ -1,9 +1,10 @@
-import json
 from dataclasses import dataclass
 from pathlib import Path
-from typing import TypedDict
+from typing import Any, Iterable, TextIO, TypedDict
 
 from hackthetrack.dependencygraph.components import Resource
+from hackthetrack.displib.resource_registry import ResourceRegistry
+from hackthetrack.displib.streaming import iter_displib_json
 
 
 @dataclass(frozen=True, slots=True)
@@ -34,27 +35,65 @@ class OperationDelayObjective(TypedDict):
 class DisplibInstance:
     trains: list[Train]
     objectives: list[OperationDelayObjective]
+    resources: ResourceRegistry
 
     @classmethod
-    def from_json(cls, path: Path) -> "DisplibInstance":
-        return _load_from_displib_format(path)
+    def from_json(cls, path: Path, cache_directory: Path | None = None) -> "DisplibInstance":
+        """
+        Load an instance, optionally through the binary cache of CompiledInstance.
+
+        The cache skips json parsing, but one object per operation and resource use is still created; sweeps over many
+        instances should work on CompiledInstance and CompactDependencyGraph directly.
+        """
+        if cache_directory is None:
+            return _load_from_displib_format(path)
+        from hackthetrack.displib.compiled_instance import CompiledInstance  # pylint: disable=import-outside-toplevel
+
+        return CompiledInstance.from_json(path, cache_directory).to_displib_instance()
+
+    @classmethod
+    def from_parsed_json(cls, parsed: dict) -> "DisplibInstance":
+        """Build an instance from the json object of the DISPLIB format, e.g. read from a zip archive."""
+        return _parse_displib_format(parsed)
+
+    @classmethod
+    def from_stream(cls, file: TextIO) -> "DisplibInstance":
+        """Parse an instance train by train, the json tree of the whole instance is never held in memory."""
+        return _parse_displib_stream(iter_displib_json(file))
 
 
 def _load_from_displib_format(path: Path) -> DisplibInstance:
     with open(path, "r") as file:
-        parsed = json.load(file)
+        return _parse_displib_stream(iter_displib_json(file))
+
+
+def _parse_displib_stream(items: Iterable[tuple[str, Any]]) -> DisplibInstance:
+    train_parser = TrainParser()
+    trains, objectives = [], []
+    for key, value in items:
+        if key == "trains":
+            trains.append(train_parser.parse_train(value))
+        elif key == "objective":
+            objectives.append(_parse_objectives(value))
+    return DisplibInstance(trains=trains, objectives=objectives, resources=train_parser.resources)
+
+
+def _parse_displib_format(parsed: dict) -> DisplibInstance:
     train_parser = TrainParser()
     return DisplibInstance(
         trains=[train_parser.parse_train(train) for train in parsed["trains"]],
         objectives=[_parse_objectives(obj) for obj in parsed["objective"]],
+        resources=train_parser.resources,
     )
 
 
 @dataclass(frozen=False, slots=True, init=False)
 class TrainParser:
+    resources: ResourceRegistry
     _train_count: int
 
     def __init__(self) -> None:
+        self.resources = ResourceRegistry()
         self._train_count = 0
 
     def parse_train(self, operations: list[dict]) -> Train:
@@ -68,10 +107,7 @@ class TrainParser:
                     start_ub=op.get("start_ub") if "start_ub" in op else None,
                     min_duration=op["min_duration"],
                     resources=(
-                        [
-                            Resource(name=res["resource"], release_time=res.get("release_time", 0))
-                            for res in op["resources"]
-                        ]
+                        [self.resources.intern(res["resource"], res.get("release_time", 0)) for res in op["resources"]]
                         if "resources" in op
                         else []
                     ),
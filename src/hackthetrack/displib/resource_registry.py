@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+from typing import Iterable
+
+from hackthetrack.dependencygraph.components import Resource
+
+
+@dataclass(frozen=False, slots=True, init=False)
+class ResourceRegistry:
+    """
+    Dense integer ids for the resource names of one instance, numbered in order of first use.
+
+    Resources are interned: every pair of resource and release time exists once and is shared by all operations using
+    it, so an operation only holds references and resource-keyed algorithms index arrays with Resource.id. The ids
+    are the resource_ids of CompiledInstance and CompactDependencyGraph.
+    """
+
+    _names: list[str]
+    _ids: dict[str, int]
+    _interned: dict[tuple[int, float], Resource]
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        self._names, self._ids, self._interned = [], {}, {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._ids
+
+    @property
+    def names(self) -> tuple[str, ...]:
+        """Resource names indexed by id."""
+        return tuple(self._names)
+
+    def add(self, name: str) -> int:
+        """The id of `name`, a new one if the name is not yet registered."""
+        resource_id = self._ids.get(name)
+        if resource_id is None:
+            resource_id = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return resource_id
+
+    def id_of(self, name: str) -> int:
+        return self._ids[name]
+
+    def name_of(self, resource_id: int) -> str:
+        return self._names[resource_id]
+
+    def intern(self, name: str, release_time: float) -> Resource:
+        return self.intern_id(self.add(name), release_time)
+
+    def intern_id(self, resource_id: int, release_time: float) -> Resource:
+        resource = self._interned.get((resource_id, release_time))
+        if resource is None:
+            resource = Resource(name=self._names[resource_id], release_time=release_time, id=resource_id)
+            self._interned[(resource_id, release_time)] = resource
+        return resource
@@ -0,0 +1,109 @@
+import io
+import json
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator, TextIO
+from zipfile import ZipFile
+
+STREAMED_KEYS = frozenset({"trains", "objective"})
+"""Top level arrays of the DISPLIB format that are yielded element by element."""
+
+_DECODER = json.JSONDecoder()
+_NON_WHITESPACE = re.compile(r"\S")
+
+
+@contextmanager
+def open_displib_json(path: Path, member: str | None = None) -> Iterator[TextIO]:
+    """Open a DISPLIB json file, or the json file `member` of the zip archive `path`, without extracting it."""
+    if member is None:
+        with open(path, "r") as file:
+            yield file
+        return
+    with ZipFile(path, "r") as archive, archive.open(member, "r") as binary:
+        yield io.TextIOWrapper(binary, encoding="utf-8")
+
+
+def iter_displib_json(file: TextIO, chunk_size: int = 1 << 20) -> Iterator[tuple[str, Any]]:
+    """
+    Parse the top level object of a DISPLIB json file incrementally.
+
+    Yields (key, element) for every element of the arrays in STREAMED_KEYS and (key, value) for all other keys, in
+    file order. Only one chunk and one train are held in memory at a time; every value is decoded by the C scanner of
+    the json module.
+    """
+    reader = _JsonReader(file, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key in STREAMED_KEYS and reader.peek() == "[":
+            reader.expect("[")
+            while reader.peek() != "]":
+                yield key, reader.value()
+                if reader.peek() != ",":
+                    break
+                reader.expect(",")
+            reader.expect("]")
+        else:
+            yield key, reader.value()
+        if reader.peek() != ",":
+            break
+        reader.expect(",")
+    reader.expect("}")
+
+
+@dataclass(frozen=False, slots=True, init=False)
+class _JsonReader:
+    """A window into a text file that is refilled chunk by chunk while values are decoded from it."""
+
+    _file: TextIO
+    _chunk_size: int
+    _buffer: str
+    _position: int
+    _exhausted: bool
+
+    def __init__(self, file: TextIO, chunk_size: int) -> None:
+        self._file, self._chunk_size = file, chunk_size
+        self._buffer, self._position, self._exhausted = "", 0, False
+
+    def _fill(self, size: int = 0) -> bool:
+        chunk = self._file.read(max(size, self._chunk_size))
+        if not chunk:
+            self._exhausted = True
+            return False
+        self._buffer, self._position = self._buffer[self._position :] + chunk, 0
+        return True
+
+    def peek(self) -> str:
+        """The next character that is not whitespace, or an empty string at the end of the file."""
+        while True:
+            found = _NON_WHITESPACE.search(self._buffer, self._position)
+            self._position = len(self._buffer) if found is None else found.start()
+            if self._position < len(self._buffer) or not self._fill():
+                return self._buffer[self._position : self._position + 1]
+
+    def expect(self, character: str) -> None:
+        found = self.peek()
+        if found != character:
+            raise ValueError(f"Expected {character!r} but found {found!r} in DISPLIB json")
+        self._position += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                # doubling the unread part keeps values longer than a chunk linear in their length
+                if not self._fill(len(self._buffer) - self._position):
+                    raise
+                continue
+            # a number at the end of the buffer might continue in the next chunk
+            if end == len(self._buffer) and not self._exhausted and self._fill(len(self._buffer) - self._position):
+                continue
+            self._position = end
+            return value
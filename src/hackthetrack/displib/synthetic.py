@@ -0,0 +1,130 @@
+import json
+from pathlib import Path
+from typing import Any, Iterator, NamedTuple
+
+import numpy as np
+
+
+class GeneratorOptions(NamedTuple):
+    n_trains: int = 10
+    n_corridors: int = 1
+    """Every train runs on one of the corridors, fewer corridors mean more shared resources."""
+    n_sections: int = 20
+    """Sections per corridor, a train runs over at least half of them."""
+    station_every: int = 5
+    """Every station_every-th section is a station, 0 for none."""
+    station_tracks: int = 2
+    """Parallel tracks per station, each of them is a route alternative."""
+    horizon: int = 3600
+    """Departures are drawn uniformly from [0, horizon)."""
+    min_duration: tuple[int, int] = (30, 120)
+    """Range of the running time over a section."""
+    dwell_time: int = 60
+    """min_duration of a station track."""
+    max_release_time: int = 10
+    objective_share: float = 0.5
+    """Fraction of trains with an op_delay objective at their last operations."""
+    max_slack: int = 300
+    """The objective threshold is the unhindered arrival plus up to this much."""
+    increment: int = 0
+    seed: int = 0
+
+
+def generate_instance(options: GeneratorOptions = GeneratorOptions()) -> dict[str, Any]:
+    """
+    A random DISPLIB instance as parsed json, reproducible from the seed.
+
+    Trains enter a corridor at a random section and run in either direction over a contiguous stretch of it. A
+    station splits the route into one operation per track, which all lead to the next section. Instances are always
+    feasible, as no operation has a start_ub.
+    """
+    trains, objectives = [], []
+    for operations, train_objectives in _generate_trains(options):
+        trains.append(operations)
+        objectives.extend(train_objectives)
+    return {"trains": trains, "objective": objectives}
+
+
+def write_instance(path: Path, options: GeneratorOptions = GeneratorOptions()) -> None:
+    """Write the instance of generate_instance train by train, so huge instances are never held in memory."""
+    path.parent.mkdir(exist_ok=True, parents=True)
+    objectives = []
+    with open(path, "w") as file:
+        file.write('{"trains": [')
+        for train, (operations, train_objectives) in enumerate(_generate_trains(options)):
+            file.write(("," if train else "") + json.dumps(operations))
+            objectives.extend(train_objectives)
+        file.write('], "objective": ')
+        json.dump(objectives, file)
+        file.write("}")
+
+
+def _generate_trains(options: GeneratorOptions) -> Iterator[tuple[list[dict], list[dict]]]:
+    rng = np.random.default_rng(options.seed)
+    shortest = max(options.n_sections // 2, 1)
+    for train in range(options.n_trains):
+        corridor = int(rng.integers(options.n_corridors))
+        length = int(rng.integers(shortest, options.n_sections + 1))
+        first = int(rng.integers(options.n_sections - length + 1))
+        sections = list(range(first, first + length))
+        if rng.random() < 0.5:
+            sections.reverse()
+        departure = int(rng.integers(options.horizon))
+
+        layers: list[list[dict[str, Any]]] = [[{"start_lb": departure, "min_duration": 0}]]
+        for section in sections:
+            resource = f"c{corridor}_s{section}"
+            if options.station_every > 0 and section % options.station_every == 0 and options.station_tracks > 1:
+                resources = [f"{resource}_t{track}" for track in range(options.station_tracks)]
+                durations = [options.dwell_time] * options.station_tracks
+            else:
+                resources = [resource]
+                durations = [int(rng.integers(options.min_duration[0], options.min_duration[1] + 1))]
+            layers.append(
+                [
+                    {
+                        "min_duration": duration,
+                        "resources": [
+                            {"resource": name, "release_time": int(rng.integers(options.max_release_time + 1))}
+                        ],
+                    }
+                    for name, duration in zip(resources, durations)
+                ]
+            )
+        yield _link_layers(layers), _objectives(train, layers, departure, rng, options)
+
+
+def _link_layers(layers: list[list[dict]]) -> list[dict]:
+    """Number the operations layer by layer, every operation leads to all operations of the next layer."""
+    operations, index = [], 0
+    for position, layer in enumerate(layers):
+        successors = (
+            list(range(index + len(layer), index + len(layer) + len(layers[position + 1])))
+            if position + 1 < len(layers)
+            else []
+        )
+        for operation in layer:
+            operations.append({**operation, "successors": successors})
+        index += len(layer)
+    return operations
+
+
+def _objectives(
+    train: int, layers: list[list[dict]], departure: int, rng: np.random.Generator, options: GeneratorOptions
+) -> list[dict]:
+    if rng.random() >= options.objective_share:
+        return []
+    arrival = departure + sum(min(operation["min_duration"] for operation in layer) for layer in layers[:-1])
+    threshold = arrival + int(rng.integers(options.max_slack + 1))
+    last = sum(len(layer) for layer in layers[:-1])
+    return [
+        {
+            "type": "op_delay",
+            "train": train,
+            "operation": operation,
+            "threshold": threshold,
+            "increment": options.increment,
+            "coeff": 1,
+        }
+        for operation in range(last, last + len(layers[-1]))
+    ]
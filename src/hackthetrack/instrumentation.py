@@ -0,0 +1,132 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, ContextManager, Iterator, Literal
+
+if TYPE_CHECKING:
+    from hackthetrack.statistics_logger import StatisticsBatch
+
+_ACTIVE: "Instrumentation | None" = None
+_DISABLED = nullcontext()
+
+
+@dataclass(frozen=False, slots=True, init=False)
+class Instrumentation:
+    """
+    Named timers and counters of one run, collected while the run is inside `instrumented()`.
+
+    Outside of it timed() returns a shared no-op context and count() returns immediately, so the calls can stay in
+    hot paths. With `trace` every timed block is also kept as an event for the Chrome trace format.
+    """
+
+    trace: bool
+    _origin: float
+    _seconds: dict[str, float]
+    _calls: dict[str, int]
+    _counters: dict[str, int]
+    _events: list[tuple[str, float, float, int]]
+
+    def __init__(self, trace: bool = False) -> None:
+        self.trace, self._origin = trace, time.perf_counter()
+        self._seconds, self._calls, self._counters, self._events = {}, {}, {}, []
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self._seconds[name] = self._seconds.get(name, 0.0) + seconds
+            self._calls[name] = self._calls.get(name, 0) + 1
+            if self.trace:
+                self._events.append((name, started - self._origin, seconds, threading.get_ident()))
+
+    def add(self, name: str, amount: int = 1) -> None:
+        self._counters[name] = self._counters.get(name, 0) + amount
+
+    def summary(self) -> dict[str, float | int]:
+        """Total seconds and calls of every timer and the value of every counter, keyed as in the statistics."""
+        summary: dict[str, float | int] = {}
+        for name, seconds in self._seconds.items():
+            summary[f"{name} seconds"], summary[f"{name} calls"] = seconds, self._calls[name]
+        summary.update(self._counters)
+        return summary
+
+    def update_statistics(self, batch: "StatisticsBatch", instance_name: str) -> None:
+        """Add the summary to the statistics of an instance, e.g. in a StatisticsLogger.batch()."""
+        for key, value in self.summary().items():
+            batch.update_instance(instance_name, key, value)
+
+    def write_json(self, path: Path) -> None:
+        timers = {name: {"seconds": seconds, "calls": self._calls[name]} for name, seconds in self._seconds.items()}
+        with open(path, "w") as file:
+            json.dump({"timers": timers, "counters": self._counters}, file, indent=2)
+
+    def write_chrome_trace(self, path: Path) -> None:
+        """Complete events in microseconds, open the file in chrome://tracing or Perfetto; needs `trace`."""
+        pid = os.getpid()
+        events = [
+            {"name": name, "ph": "X", "ts": begin * 1e6, "dur": seconds * 1e6, "pid": pid, "tid": tid}
+            for name, begin, seconds, tid in self._events
+        ]
+        end = (time.perf_counter() - self._origin) * 1e6
+        events.extend(
+            {"name": name, "ph": "C", "ts": end, "pid": pid, "args": {name: value}}
+            for name, value in self._counters.items()
+        )
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+@contextmanager
+def instrumented(trace: bool = False) -> Iterator[Instrumentation]:
+    """Collect timers and counters of everything run inside the block, nested blocks collect separately."""
+    global _ACTIVE  # pylint: disable=global-statement
+    previous, _ACTIVE = _ACTIVE, Instrumentation(trace)
+    try:
+        yield _ACTIVE
+    finally:
+        _ACTIVE = previous
+
+
+def timed(name: str) -> ContextManager[None]:
+    return _DISABLED if _ACTIVE is None else _ACTIVE.timer(name)
+
+
+def count(name: str, amount: int = 1) -> None:
+    if _ACTIVE is not None:
+        _ACTIVE.add(name, amount)
+
+
+@contextmanager
+def profiled(path: Path, profiler: Literal["cprofile", "pyinstrument"] = "cprofile") -> Iterator[None]:
+    """
+    Profile the block and write the result to `path`.
+
+    cProfile writes pstats data (snakeviz, python -m pstats), the optional sampling profiler pyinstrument writes an
+    html report and costs far less on call heavy code.
+    """
+    if profiler == "pyinstrument":
+        from pyinstrument import Profiler  # pylint: disable=import-outside-toplevel
+
+        sampler = Profiler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            path.write_text(sampler.output_html())
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
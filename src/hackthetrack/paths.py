@@ -0,0 +1,5 @@
+import os
+from pathlib import Path
+
+OUTPUT_ROOT = Path(os.environ.get("HACKTHETRACK_OUTPUT_ROOT", Path(__file__).resolve().parents[1] / "out"))
+"""Root of all caches, src/out unless the environment variable HACKTHETRACK_OUTPUT_ROOT names another directory."""
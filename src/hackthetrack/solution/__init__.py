@@ -0,0 +1,5 @@
+from .lower_bound import ObjectiveLowerBound
+from .objective import DelayObjective
+from .occupancy import OccupancyIndex
+from .schedule import Schedule, SolutionEvent
+from .verification import VerificationResult, verify_schedule
@@ -0,0 +1,202 @@
+from dataclasses import dataclass
+from typing import NamedTuple
+
+import numpy as np
+
+from hackthetrack.dependencygraph.compact import CompactDependencyGraph
+from hackthetrack.dependencygraph.propagation import (
+    StartTimeBounds,
+    cheapest_completion,
+    mandatory_nodes,
+    propagate_start_bounds,
+    topological_levels,
+)
+from hackthetrack.instrumentation import timed
+from hackthetrack.solution.objective import DelayObjective
+
+
+@dataclass(frozen=True, slots=True)
+class ObjectiveLowerBound:
+    """
+    A lower bound on the objective value of every feasible schedule.
+
+    The route bound lets every train run alone: each objective component costs what it would at the earliest start
+    of its node and every train takes its cheapest route by these costs. The single-resource relaxations add that
+    trains which have to use the same resource cannot hold it at the same time, see _resource_bounds.
+    """
+
+    value: float
+    route_bound: float
+    train_bounds: np.ndarray
+    """Bound of every train on its own, the route bound raised by the occupations other trains cannot avoid."""
+    resource: int
+    """Resource of the relaxation that gave `value`, -1 if the sum of the train bounds did."""
+
+    @classmethod
+    def from_graph(
+        cls, graph: CompactDependencyGraph, objective: DelayObjective, resource_relaxation: bool = True
+    ) -> "ObjectiveLowerBound":
+        with timed("lower_bound"):
+            return _compute_lower_bound(graph, objective, resource_relaxation)
+
+    def gap(self, objective_value: float) -> float:
+        """Relative gap of a schedule with this objective value, 0 once the bound is reached and 1 without one."""
+        if objective_value <= self.value:
+            return 0.0
+        if np.isinf(objective_value):
+            return 1.0
+        return (objective_value - self.value) / objective_value
+
+
+class _Occupations(NamedTuple):
+    """One row per train and resource the train has to use, for trains with objective costs at every route end."""
+
+    trains: np.ndarray
+    resources: np.ndarray
+    entry: np.ndarray
+    """Earliest time the train can enter the resource."""
+    due: np.ndarray
+    """Latest entry without objective costs, see _resource_bounds."""
+    coeff: np.ndarray
+    hold: np.ndarray
+    """Shortest time the train holds the resource."""
+
+
+def _compute_lower_bound(
+    graph: CompactDependencyGraph, objective: DelayObjective, resource_relaxation: bool
+) -> ObjectiveLowerBound:
+    levels = topological_levels(graph)
+    bounds = propagate_start_bounds(graph)
+    node_costs = np.zeros(graph.n_count)
+    np.add.at(node_costs, objective.nodes, objective.costs(bounds.earliest))
+    node_costs[~bounds.feasible] = np.inf
+    train_bounds = cheapest_completion(graph, node_costs, levels)[graph.train_offsets[:-1]]
+    route_bound = float(train_bounds.sum())
+    if not resource_relaxation or not np.isfinite(route_bound) or len(objective.nodes) == 0:
+        return ObjectiveLowerBound(value=route_bound, route_bound=route_bound, train_bounds=train_bounds, resource=-1)
+
+    mandatory = mandatory_nodes(graph, levels)
+    occupations = _occupations(graph, objective, bounds, levels, mandatory)
+    entry = _delayed_entries(occupations, _compulsory_parts(graph, bounds, mandatory))
+    occupations = occupations._replace(entry=entry)
+    train_bounds = train_bounds.copy()
+    np.maximum.at(train_bounds, occupations.trains, occupations.coeff * np.maximum(entry - occupations.due, 0.0))
+    value, resource = float(train_bounds.sum()), -1
+    resource_bounds, resources = _resource_bounds(occupations, train_bounds)
+    if len(resource_bounds) > 0 and resource_bounds.max() > value:
+        value, resource = float(resource_bounds.max()), int(resources[np.argmax(resource_bounds)])
+    return ObjectiveLowerBound(value=value, route_bound=route_bound, train_bounds=train_bounds, resource=resource)
+
+
+def _occupations(
+    graph: CompactDependencyGraph,
+    objective: DelayObjective,
+    bounds: StartTimeBounds,
+    levels: np.ndarray,
+    mandatory: np.ndarray,
+) -> _Occupations:
+    """
+    A train k enters the resource at some S_k no earlier than `entry` and reaches the end of its last operation,
+    whichever it is, at least R_k later. If every last operation of the train carries objective costs, the train
+    costs at least c_k * max(0, S_k - due) with c_k the lowest coefficient and due the latest threshold plus duration
+    of a last operation minus R_k.
+    """
+    n_resources = len(graph.resource_names)
+    coeff_at = np.bincount(objective.nodes, weights=objective.coeff, minlength=graph.n_count)
+    threshold_at = np.full(graph.n_count, -np.inf)
+    np.maximum.at(threshold_at, objective.nodes, objective.threshold)
+    terminals = np.flatnonzero(np.diff(graph.successor_offsets) == 0)
+    coeff = np.full(graph.n_trains, np.inf)
+    np.minimum.at(coeff, graph.train_ids[terminals], coeff_at[terminals])
+    due = np.full(graph.n_trains, -np.inf)
+    np.maximum.at(due, graph.train_ids[terminals], threshold_at[terminals] + graph.min_duration[terminals])
+
+    nodes = graph.resource_use_nodes()
+    keys = graph.train_ids[nodes] * n_resources + graph.resource_ids
+    order = np.argsort(keys, kind="stable")
+    keys, nodes, release_times = keys[order], nodes[order], graph.release_times[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    trains, resources = keys[starts] // n_resources, keys[starts] % n_resources
+    remaining = np.minimum.reduceat(cheapest_completion(graph, graph.min_duration, levels)[nodes], starts)
+    hold = np.minimum.reduceat(graph.min_duration[nodes], starts) + np.minimum.reduceat(release_times, starts)
+    rows = np.logical_or.reduceat(mandatory[nodes], starts) & (coeff[trains] > 0.0) & np.isfinite(coeff[trains])
+    return _Occupations(
+        trains=trains[rows],
+        resources=resources[rows],
+        entry=np.minimum.reduceat(bounds.earliest[nodes], starts)[rows],
+        due=(due[trains] - remaining)[rows],
+        coeff=coeff[trains][rows],
+        hold=hold[rows],
+    )
+
+
+def _compulsory_parts(
+    graph: CompactDependencyGraph, bounds: StartTimeBounds, mandatory: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Resource, begin and end of the intervals in which a resource is certainly held, sorted by resource and begin.
+
+    A train holds the resources of a node on all of its routes at least from the latest start to the earliest
+    start plus min_duration of the node. Parts overlapping by more than a point are merged.
+    """
+    nodes = graph.resource_use_nodes()
+    begin, end = bounds.latest[nodes], bounds.earliest[nodes] + graph.min_duration[nodes]
+    parts = mandatory[nodes] & (begin < end)
+    resources, begin, end = graph.resource_ids[parts], begin[parts], end[parts]
+    if len(resources) == 0:
+        return resources, begin, end
+    order = np.lexsort((begin, resources))
+    resources, begin, end = resources[order], begin[order], end[order]
+    new_resource = np.r_[True, resources[1:] != resources[:-1]]
+    reach = _grouped_running_max(end, np.cumsum(new_resource) - 1)
+    starts = np.flatnonzero(new_resource | np.r_[True, begin[1:] >= reach[:-1]])
+    return resources[starts], begin[starts], np.maximum.reduceat(end, starts)
+
+
+def _delayed_entries(occupations: _Occupations, compulsory: tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    A train cannot enter a resource strictly inside a part another train certainly holds it, so its entry moves to
+    the end of that part. Its own parts on the resource begin no earlier than its entry.
+    """
+    resources, begin, end = compulsory
+    entry = occupations.entry
+    if len(resources) == 0 or len(entry) == 0:
+        return entry
+    lowest = min(float(begin.min()), float(entry.min()))
+    span = max(float(end.max()), float(entry.max())) - lowest + 1.0
+    found = np.searchsorted(resources * span + (begin - lowest), occupations.resources * span + (entry - lowest)) - 1
+    part = np.maximum(found, 0)
+    inside = (found >= 0) & (resources[part] == occupations.resources) & (end[part] > entry)
+    return np.where(inside, end[part], entry)
+
+
+def _resource_bounds(occupations: _Occupations, train_bounds: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Bound of every resource used by at least one train of the occupations.
+
+    The trains cannot hold the resource at the same time, so sum(S_k) is at least sum(L_i) over the trains in order
+    of their entry with L_i = max(entry_i, L_(i - 1) + p) and p the shortest hold of them. Hence the trains cost at
+    least min(c_k) * max(0, sum(L_i) - sum(due_k)), or the sum of their train bounds if that is more.
+    """
+    if len(occupations.trains) == 0:
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+    order = np.lexsort((occupations.entry, occupations.resources))
+    trains, resources, entry, due, coeff, hold = (column[order] for column in occupations)
+    new_resource = np.r_[True, resources[1:] != resources[:-1]]
+    starts, group = np.flatnonzero(new_resource), np.cumsum(new_resource) - 1
+    hold = np.minimum.reduceat(hold, starts)[group]
+    index = np.arange(len(trains)) - starts[group]
+    # L_i = i * p + max over j <= i of (entry_j - j * p)
+    latest = _grouped_running_max(entry - index * hold, group) + index * hold
+    delay = np.maximum(np.add.reduceat(latest, starts) - np.add.reduceat(due, starts), 0.0)
+    relaxed = np.minimum.reduceat(coeff, starts) * delay
+    queued = np.add.reduceat(train_bounds[trains], starts)
+    return train_bounds.sum() - queued + np.maximum(queued, relaxed), resources[starts]
+
+
+def _grouped_running_max(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """Running maximum restarting with every group, `groups` are consecutive integers in increasing order."""
+    if len(values) == 0:
+        return values
+    span = float(values.max() - values.min()) + 1.0
+    return np.maximum.accumulate(values + groups * span) - groups * span
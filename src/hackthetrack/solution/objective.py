@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from hackthetrack.displib.compiled_instance import CompiledInstance
+
+
+@dataclass(frozen=True, slots=True)
+class DelayObjective:
+    """
+    The op_delay objective components of an instance as arrays over the global node indices.
+
+    An operation starting at t costs coeff * max(0, t - threshold), plus increment if t > threshold.
+    Operations that are not visited cost nothing.
+    """
+
+    nodes: np.ndarray
+    threshold: np.ndarray
+    increment: np.ndarray
+    coeff: np.ndarray
+
+    @classmethod
+    def from_compiled_instance(cls, compiled: CompiledInstance) -> "DelayObjective":
+        return cls(
+            nodes=compiled.train_offsets[compiled.objective_train] + compiled.objective_operation,
+            threshold=np.asarray(compiled.objective_threshold),
+            increment=np.asarray(compiled.objective_increment),
+            coeff=np.asarray(compiled.objective_coeff),
+        )
+
+    def costs(self, start: np.ndarray) -> np.ndarray:
+        """Cost of every objective component for the start times of all nodes (NaN if not visited)."""
+        delay = start[..., self.nodes] - self.threshold
+        costs = self.coeff * np.maximum(delay, 0.0) + self.increment * (delay > 0)
+        return np.where(np.isnan(delay), 0.0, costs)
+
+    def evaluate(self, start: np.ndarray) -> float:
+        return float(self.costs(start).sum())
+
+    def evaluate_many(self, starts: np.ndarray) -> np.ndarray:
+        """Objective values of a batch of schedules, `starts` has one row of node start times per schedule."""
+        return self.costs(starts).sum(axis=-1)
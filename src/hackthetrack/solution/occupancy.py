@@ -0,0 +1,215 @@
+import bisect
+import heapq
+from dataclasses import dataclass, field
+from operator import itemgetter
+
+import numpy as np
+
+from hackthetrack.dependencygraph.compact import CompactDependencyGraph
+from hackthetrack.solution.schedule import Schedule
+
+_INF = float("inf")
+_BEGIN = itemgetter(0)
+_CHUNK_SIZE = 256
+"""Chunks of a resource are split beyond this many occupations, so inserts and removals shift short lists only."""
+
+
+@dataclass(frozen=False, slots=True, init=False)
+class OccupancyIndex:
+    """
+    Occupations [begin, end) of every resource together with the holding train, the end includes the release time.
+
+    The occupations of a resource are kept sorted by begin along with the longest one present, so an overlap query
+    bisects to the occupations beginning in [begin - longest, end) instead of scanning all of them. Occupations
+    overlap as in DISPLIB: a zero length occupation only conflicts with one running strictly across it. The merged
+    busy intervals of a resource are rebuilt only after the resource has changed.
+    """
+
+    _resources: list["_ResourceOccupations"]
+    _merged: dict[int, tuple[list[float], list[float]]]
+
+    def __init__(self, n_resources: int) -> None:
+        self._resources, self._merged = [_ResourceOccupations() for _ in range(n_resources)], {}
+
+    @classmethod
+    def from_arrays(
+        cls, n_resources: int, resources: np.ndarray, begins: np.ndarray, ends: np.ndarray, trains: np.ndarray
+    ) -> "OccupancyIndex":
+        """Bulk build from one row per occupation, sorting once instead of inserting one by one."""
+        index = cls(0)
+        order = np.lexsort((trains, ends, begins, resources))
+        resources, begins, ends, trains = (np.asarray(column)[order] for column in (resources, begins, ends, trains))
+        rows = list(zip(begins.tolist(), ends.tolist(), trains.tolist()))
+        bounds = np.searchsorted(resources, np.arange(n_resources + 1)).tolist()
+        index._resources = [
+            _ResourceOccupations.from_sorted(rows[bounds[resource] : bounds[resource + 1]])
+            for resource in range(n_resources)
+        ]
+        return index
+
+    @classmethod
+    def from_schedule(cls, graph: CompactDependencyGraph, schedule: Schedule) -> "OccupancyIndex":
+        nodes, resources, begins, ends = schedule_occupations(graph, schedule)
+        return cls.from_arrays(len(graph.resource_names), resources, begins, ends, graph.train_ids[nodes])
+
+    def extend(self, n_resources: int) -> None:
+        self._resources.extend(_ResourceOccupations() for _ in range(n_resources - len(self._resources)))
+
+    def add(self, resource: int, begin: float, end: float, train: int) -> None:
+        self._resources[resource].add((begin, end, train))
+        self._merged.pop(resource, None)
+
+    def remove(self, resource: int, begin: float, end: float, train: int) -> None:
+        """Remove an occupation added before."""
+        if not self._resources[resource].remove((begin, end, train)):
+            raise ValueError(f"train {train} does not occupy resource {resource} in [{begin}, {end})")
+        self._merged.pop(resource, None)
+
+    def occupations(self, resource: int) -> list[tuple[float, float, int]]:
+        """All occupations of the resource as (begin, end, train) sorted by begin."""
+        return [occupation for chunk in self._resources[resource].chunks for occupation in chunk]
+
+    def overlapping(self, resource: int, begin: float, end: float) -> list[tuple[float, float, int]]:
+        """Occupations overlapping [begin, end); zero length ones only if strictly inside."""
+        return self._resources[resource].overlapping(begin, end)
+
+    def trains_in(self, resource: int, begin: float, end: float) -> set[int]:
+        return {train for _, _, train in self.overlapping(resource, begin, end)}
+
+    def is_free(self, resource: int, begin: float, end: float, train: int = -1) -> bool:
+        """Whether no other train than `train` occupies the resource in [begin, end)."""
+        return all(other == train for _, _, other in self.overlapping(resource, begin, end))
+
+    def merged(self, resource: int) -> tuple[list[float], list[float]]:
+        """Begins and ends of the disjoint busy intervals of a resource."""
+        if resource not in self._merged:
+            begins: list[float] = []
+            ends: list[float] = []
+            for chunk in self._resources[resource].chunks:
+                for begin, end, _ in chunk:
+                    if begins and begin <= ends[-1]:
+                        ends[-1] = max(ends[-1], end)
+                    else:
+                        begins.append(begin)
+                        ends.append(end)
+            self._merged[resource] = begins, ends
+        return self._merged[resource]
+
+    def next_begin(self, resource: int, time_: float) -> float:
+        """Begin of the first occupation after `time_`, no occupation of the resource may end later than that."""
+        begins = self.merged(resource)[0]
+        position = bisect.bisect_right(begins, time_)
+        return begins[position] if position < len(begins) else _INF
+
+
+@dataclass(frozen=False, slots=True)
+class _ResourceOccupations:
+    """
+    The occupations of one resource as a sorted list cut into chunks, each with its first entry and latest end.
+
+    Inserting or removing shifts one chunk only. An overlap query skips chunks ending before it, so a single long
+    occupation does not make the query scan all occupations beginning after it. The lengths are counted in a max heap
+    with lazy deletion, so the longest length shrinks again once long occupations are removed.
+    """
+
+    chunks: list[list[tuple[float, float, int]]] = field(default_factory=list)
+    firsts: list[tuple[float, float, int]] = field(default_factory=list)
+    ends: list[float] = field(default_factory=list)
+    lengths: dict[float, int] = field(default_factory=dict)
+    heap: list[float] = field(default_factory=list)
+
+    @classmethod
+    def from_sorted(cls, rows: list[tuple[float, float, int]]) -> "_ResourceOccupations":
+        occupations = cls()
+        step = _CHUNK_SIZE // 2
+        occupations.chunks = [rows[position : position + step] for position in range(0, len(rows), step)]
+        occupations.firsts = [chunk[0] for chunk in occupations.chunks]
+        occupations.ends = [max(end for _, end, _ in chunk) for chunk in occupations.chunks]
+        for begin, end, _ in rows:
+            occupations.count(end - begin)
+        return occupations
+
+    def longest(self) -> float:
+        while self.heap and -self.heap[0] not in self.lengths:
+            heapq.heappop(self.heap)
+        return -self.heap[0] if self.heap else 0.0
+
+    def count(self, length: float, change: int = 1) -> None:
+        count = self.lengths.get(length, 0) + change
+        if count == 0:
+            del self.lengths[length]
+            return
+        if count == 1 and change == 1:
+            heapq.heappush(self.heap, -length)
+        self.lengths[length] = count
+
+    def add(self, occupation: tuple[float, float, int]) -> None:
+        self.count(occupation[1] - occupation[0])
+        if not self.chunks:
+            self.chunks, self.firsts, self.ends = [[occupation]], [occupation], [occupation[1]]
+            return
+        position = max(bisect.bisect_right(self.firsts, occupation) - 1, 0)
+        chunk = self.chunks[position]
+        bisect.insort(chunk, occupation)
+        self.firsts[position], self.ends[position] = chunk[0], max(self.ends[position], occupation[1])
+        if len(chunk) > _CHUNK_SIZE:
+            half = len(chunk) // 2
+            self.chunks[position : position + 1] = [chunk[:half], chunk[half:]]
+            self.firsts[position : position + 1] = [chunk[0], chunk[half]]
+            self.ends[position : position + 1] = [
+                max(end for _, end, _ in part) for part in self.chunks[position : position + 2]
+            ]
+
+    def remove(self, occupation: tuple[float, float, int]) -> bool:
+        """Whether the occupation was present."""
+        position = bisect.bisect_right(self.firsts, occupation) - 1
+        if position < 0:
+            return False
+        chunk = self.chunks[position]
+        found = bisect.bisect_left(chunk, occupation)
+        if found == len(chunk) or chunk[found] != occupation:
+            return False
+        del chunk[found]
+        self.count(occupation[1] - occupation[0], -1)
+        if not chunk:
+            del self.chunks[position], self.firsts[position], self.ends[position]
+        else:
+            self.firsts[position] = chunk[0]
+            if occupation[1] == self.ends[position]:
+                self.ends[position] = max(end for _, end, _ in chunk)
+        return True
+
+    def overlapping(self, begin: float, end: float) -> list[tuple[float, float, int]]:
+        lowest = begin - self.longest()
+        first = max(bisect.bisect_right(self.firsts, lowest, key=_BEGIN) - 1, 0)
+        last = bisect.bisect_left(self.firsts, end, lo=first, key=_BEGIN)
+        found = []
+        for position in range(first, last):
+            if self.ends[position] <= begin:
+                continue
+            chunk = self.chunks[position]
+            start = bisect.bisect_right(chunk, lowest, key=_BEGIN)
+            for occupation in chunk[start : bisect.bisect_left(chunk, end, lo=start, key=_BEGIN)]:
+                if occupation[1] > begin:
+                    found.append(occupation)
+        return found
+
+
+def schedule_occupations(
+    graph: CompactDependencyGraph, schedule: Schedule, end: np.ndarray | None = None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Node, resource, begin and release of every resource use on the routes of the schedule.
+
+    A train keeps a resource while moving between consecutive operations using it, so the release time only
+    applies when the next operation does not use the same resource.
+    """
+    end = schedule.end(graph) if end is None else end
+    nodes = graph.resource_use_nodes()
+    used = schedule.visited[nodes]
+    nodes, resources, release_times = nodes[used], graph.resource_ids[used], graph.release_times[used]
+    n_resources = len(graph.resource_names)
+    use_keys = graph.resource_use_nodes() * n_resources + graph.resource_ids
+    next_nodes = schedule.next_node[nodes]
+    kept = (next_nodes >= 0) & np.isin(next_nodes * n_resources + resources, use_keys)
+    return nodes, resources, schedule.start[nodes], end[nodes] + np.where(kept, 0.0, release_times)
@@ -0,0 +1,95 @@
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TypedDict
+
+import numpy as np
+
+from hackthetrack.dependencygraph.compact import CompactDependencyGraph
+
+
+class SolutionEvent(TypedDict):
+    time: float
+    train: int
+    operation: int
+
+
+@dataclass(frozen=True, slots=True)
+class Schedule:
+    """
+    Start time and chosen successor of every node of a CompactDependencyGraph.
+
+    Nodes that are not on the route of their train have a NaN start and a next_node of -1, as has the last
+    operation of every train.
+    """
+
+    start: np.ndarray
+    next_node: np.ndarray
+
+    @classmethod
+    def from_events(cls, graph: CompactDependencyGraph, events: list[SolutionEvent]) -> "Schedule":
+        return _schedule_from_events(graph, events)
+
+    @classmethod
+    def from_json(cls, graph: CompactDependencyGraph, path: Path) -> "Schedule":
+        """Read a solution in the DISPLIB format, i.e. a json object with a list of events."""
+        with open(path, "r") as file:
+            return _schedule_from_events(graph, json.load(file)["events"])
+
+    @property
+    def visited(self) -> np.ndarray:
+        return ~np.isnan(self.start)
+
+    def end(self, graph: CompactDependencyGraph) -> np.ndarray:
+        """A train leaves an operation when it starts the next one, the last operation lasts min_duration."""
+        has_next = self.next_node >= 0
+        return np.where(has_next, self.start[np.where(has_next, self.next_node, 0)], self.start + graph.min_duration)
+
+    def to_events(self, graph: CompactDependencyGraph) -> list[SolutionEvent]:
+        nodes = np.flatnonzero(self.visited)
+        # zero duration operations start at the same time as their successor, ties are broken along the route
+        order = np.lexsort((_route_positions(self, nodes), self.start[nodes]))
+        nodes = nodes[order]
+        return [
+            SolutionEvent(time=time, train=train, operation=operation)
+            for time, train, operation in zip(
+                self.start[nodes].tolist(), graph.train_ids[nodes].tolist(), graph.local_indices[nodes].tolist()
+            )
+        ]
+
+    def write_json(self, graph: CompactDependencyGraph, path: Path, objective_value: float) -> None:
+        with open(path, "w") as file:
+            json.dump({"objective_value": objective_value, "events": self.to_events(graph)}, file)
+
+
+def _schedule_from_events(graph: CompactDependencyGraph, events: list[SolutionEvent]) -> Schedule:
+    start = np.full(graph.n_count, np.nan)
+    next_node = np.full(graph.n_count, -1, dtype=np.int64)
+    if len(events) == 0:
+        return Schedule(start=start, next_node=next_node)
+    trains = np.fromiter((event["train"] for event in events), dtype=np.int64, count=len(events))
+    operations = np.fromiter((event["operation"] for event in events), dtype=np.int64, count=len(events))
+    times = np.fromiter((event["time"] for event in events), dtype=np.float64, count=len(events))
+    # the events are listed chronologically, a stable sort keeps that order within every train
+    order = np.argsort(trains, kind="stable")
+    nodes = graph.node_indices(trains[order], operations[order])
+    start[nodes] = times[order]
+    same_train = trains[order][1:] == trains[order][:-1]
+    next_node[nodes[:-1][same_train]] = nodes[1:][same_train]
+    return Schedule(start=start, next_node=next_node)
+
+
+def _route_positions(schedule: Schedule, nodes: np.ndarray) -> np.ndarray:
+    """Position of every node along the route of its train."""
+    positions = np.zeros(len(schedule.start), dtype=np.int64)
+    has_previous = np.zeros(len(schedule.start), dtype=bool)
+    chosen = schedule.next_node[nodes]
+    has_previous[chosen[chosen >= 0]] = True
+    current = nodes[~has_previous[nodes]]
+    position = 0
+    while len(current) > 0:
+        positions[current] = position
+        current = schedule.next_node[current]
+        current = current[current >= 0]
+        position += 1
+    return positions[nodes]
@@ -0,0 +1,145 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from hackthetrack.dependencygraph.compact import CompactDependencyGraph
+from hackthetrack.instrumentation import timed
+from hackthetrack.solution.occupancy import schedule_occupations
+from hackthetrack.solution.schedule import Schedule
+
+
+@dataclass(frozen=True, slots=True)
+class VerificationResult:
+    """Nodes violating a constraint; resource conflicts are (holding node, entering node, resource) rows."""
+
+    route_violations: np.ndarray
+    duration_violations: np.ndarray
+    start_lb_violations: np.ndarray
+    start_ub_violations: np.ndarray
+    resource_conflicts: np.ndarray
+
+    @property
+    def feasible(self) -> bool:
+        return not (
+            len(self.route_violations)
+            or len(self.duration_violations)
+            or len(self.start_lb_violations)
+            or len(self.start_ub_violations)
+            or len(self.resource_conflicts)
+        )
+
+
+def verify_schedule(graph: CompactDependencyGraph, schedule: Schedule) -> VerificationResult:
+    with timed("verify_schedule"):
+        visited = schedule.visited
+        start, end = schedule.start, schedule.end(graph)
+        with np.errstate(invalid="ignore"):
+            start_lb_violations = np.flatnonzero(visited & (start < graph.start_lb))
+            start_ub_violations = np.flatnonzero(visited & (start > graph.start_ub))
+            duration_violations = np.flatnonzero(visited & (end - start < graph.min_duration))
+        return VerificationResult(
+            route_violations=_route_violations(graph, schedule),
+            duration_violations=duration_violations,
+            start_lb_violations=start_lb_violations,
+            start_ub_violations=start_ub_violations,
+            resource_conflicts=_resource_conflicts(graph, schedule, end),
+        )
+
+
+def _route_violations(graph: CompactDependencyGraph, schedule: Schedule) -> np.ndarray:
+    """
+    Visited nodes that break the route of their train.
+
+    Every train has to start with its first operation, continue along successors and stop at an operation
+    without successors.
+    """
+    visited = schedule.visited
+    first_nodes = graph.train_offsets[:-1]
+    violations = [first_nodes[~visited[first_nodes]]]
+
+    has_next = visited & (schedule.next_node >= 0)
+    sources = np.flatnonzero(has_next)
+    targets = schedule.next_node[sources]
+    link_keys = graph.link_sources() * graph.n_count + graph.successors
+    is_link = np.isin(sources * graph.n_count + targets, link_keys)
+    violations.append(sources[~is_link | ~visited[targets]])
+
+    is_terminal = np.diff(graph.successor_offsets) == 0
+    violations.append(np.flatnonzero(visited & ~has_next & ~is_terminal))
+
+    entered = np.zeros(graph.n_count, dtype=bool)
+    entered[targets] = True
+    entered[first_nodes] = True
+    violations.append(np.flatnonzero(visited & ~entered))
+    return np.unique(np.concatenate(violations))
+
+
+def _resource_conflicts(graph: CompactDependencyGraph, schedule: Schedule, end: np.ndarray) -> np.ndarray:
+    """
+    Sort the occupations of every resource by their begin and compare each one with the latest release before it.
+
+    Release times apply as in schedule_occupations. Occupations of one train never conflict.
+    """
+    nodes, resources, begin, released = schedule_occupations(graph, schedule, end)
+    if len(nodes) == 0:
+        return np.zeros((0, 3), dtype=np.int64)
+
+    # among equal begins the shortest occupation comes first, zero length occupations conflict with nothing
+    order = np.lexsort((released, begin, resources))
+    nodes, resources, begin, released = nodes[order], resources[order], begin[order], released[order]
+    trains = graph.train_ids[nodes]
+
+    # shift every resource into its own value range, so one cumulative maximum does not leak between resources
+    span = float(np.max(released) - np.min(begin)) + 1.0
+    shifted = released + resources * span
+    running = np.maximum.accumulate(shifted)
+    positions = np.arange(len(nodes))
+    holder = np.maximum.accumulate(np.where(shifted == running, positions, 0))
+
+    new_resource = np.r_[True, resources[1:] != resources[:-1]]
+    previous = np.where(new_resource, 0, np.r_[0, holder[:-1]])
+    candidates = np.flatnonzero(~new_resource & (released[previous] > begin))
+    same_train = trains[previous[candidates]] == trains[candidates]
+
+    # where the latest release belongs to the same train, the latest release of another train decides
+    others, other_holders = _other_train_holders(resources, trains, begin, released, candidates[same_train])
+    entering = np.concatenate([candidates[~same_train], others])
+    holding = np.concatenate([previous[candidates[~same_train]], other_holders])
+    order = np.argsort(entering, kind="stable")
+    entering, holding = entering[order], holding[order]
+    return np.column_stack([nodes[holding], nodes[entering], resources[entering]]).astype(np.int64)
+
+
+def _other_train_holders(
+    resources: np.ndarray, trains: np.ndarray, begin: np.ndarray, released: np.ndarray, entering: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The entering occupations that begin before the latest release of another train, along with that holder.
+
+    Occupations are sorted by resource and begin. One pass over each resource with entering occupations keeps the
+    latest releases of two different trains, so the holder of another train is known without looking back.
+    """
+    if len(entering) == 0:
+        return entering, entering
+    starts = np.flatnonzero(np.r_[True, resources[1:] != resources[:-1]])
+    firsts = starts[np.searchsorted(starts, entering, side="right") - 1]
+    trains_, begin_, released_ = trains.tolist(), begin.tolist(), released.tolist()
+    found, holders = [], []
+    position, best, second = 0, (-np.inf, -1, -1), (-np.inf, -1, -1)  # (release, position, train)
+    for k, first in zip(entering.tolist(), firsts.tolist()):
+        if first > position:
+            position, best, second = first, (-np.inf, -1, -1), (-np.inf, -1, -1)
+        for position in range(position, k):
+            latest = (released_[position], position, trains_[position])
+            if latest[2] == best[2]:
+                best = max(best, latest)
+            elif latest >= best:
+                best, second = latest, best
+            elif latest >= second:
+                second = latest
+        position = k
+        holder = second if best[2] == trains_[k] else best
+        if holder[0] > begin_[k]:
+            found.append(k)
+            holders.append(holder[1])
+    return np.asarray(found, dtype=np.int64), np.asarray(holders, dtype=np.int64)
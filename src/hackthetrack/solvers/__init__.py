@@ -0,0 +1,19 @@
+from .greedy_dispatch import (
+    DispatchHooks,
+    DispatchResult,
+    dispatch_greedily,
+    earliest_start_lb,
+    first_come_first_served,
+    objective_weighted,
+)
+from .large_neighbourhood_search import LnsHooks, LnsOptions, LnsResult, solve_with_lns
+from .preprocessing import ReducedInstance, ReductionOptions, reduce_instance
+from .redispatch import (
+    BoundChange,
+    DispatchState,
+    Disruption,
+    RepairResult,
+    ResourceOutage,
+    TrainInsertion,
+    TrainRemoval,
+)
@@ -0,0 +1,595 @@
+import bisect
+import heapq
+from dataclasses import dataclass
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from hackthetrack.dependencygraph.compact import CompactDependencyGraph
+from hackthetrack.dependencygraph.propagation import shortest_remaining_duration
+from hackthetrack.instrumentation import timed
+from hackthetrack.solution.objective import DelayObjective
+from hackthetrack.solution.schedule import Schedule
+
+PriorityRule = Callable[[int, int, float], float]
+"""Maps (train, current node, time) to a priority, trains with lower values are dispatched first."""
+
+
+def first_come_first_served(graph: CompactDependencyGraph) -> PriorityRule:  # pylint: disable=unused-argument
+    return lambda train, node, time: 0.0
+
+
+def earliest_start_lb(graph: CompactDependencyGraph) -> PriorityRule:
+    start_lb = graph.effective_start_lb.tolist()
+    return lambda train, node, time: start_lb[node]
+
+
+def objective_weighted(graph: CompactDependencyGraph, objective: DelayObjective) -> PriorityRule:
+    """Trains with the highest total objective coefficients go first, ties are broken by start_lb."""
+    weights = np.zeros(graph.n_trains)
+    np.add.at(weights, graph.train_ids[objective.nodes], objective.coeff + objective.increment)
+    train_weights, start_lb = weights.tolist(), graph.effective_start_lb.tolist()
+    scale = 1.0 + float(np.max(graph.effective_start_lb, initial=0.0))
+    return lambda train, node, time: -train_weights[train] + start_lb[node] / scale
+
+
+class DispatchHooks(NamedTuple):
+    on_enter: Callable[[int, int, float], None] | None = None
+    """Called with (train, node, time) for every operation started in the final schedule, in order of time."""
+    on_finish: Callable[[int, float], None] | None = None
+    """Called with (train, time) when a train completes its last operation in the final schedule."""
+
+
+@dataclass(frozen=True, slots=True)
+class DispatchResult:
+    schedule: Schedule
+    unfinished_trains: np.ndarray
+    rollbacks: int
+
+    @property
+    def complete(self) -> bool:
+        return len(self.unfinished_trains) == 0
+
+
+def dispatch_greedily(
+    graph: CompactDependencyGraph,
+    priority_rule: Callable[[CompactDependencyGraph], PriorityRule] = first_come_first_served,
+    hooks: DispatchHooks = DispatchHooks(),
+    max_rollbacks: int = 1000,
+) -> DispatchResult:
+    """
+    Simulate all trains with a discrete event queue and move every train as soon as it can.
+
+    A train advances to the first successor (fastest remaining route first) whose resources are neither held by
+    another train nor still blocked by a release time. Trains blocked by a held resource wait until it is released.
+    Entering an operation locks the resources up to the next route choice; trains running through a locked section
+    in the opposite direction have to wait, which avoids most head-on deadlocks on single track sections. Locks are
+    ignored for operations without resources, which hold nothing, and once an operation reaches its start_ub.
+
+    If all remaining trains wait, the one with the best priority that is only held back by locks ignores them for
+    its next step. If there is none, a train on the cycle of waiting trains that took a contested resource has to
+    give way, i.e. it may only take the resource after the other train has released it. That train is rolled back
+    to the operation before it took the resource, together with the trains that took a resource of that operation
+    since, and the simulation continues from the current time instead of starting over. Once max_rollbacks is
+    reached, trains still blocking each other are reported as unfinished. An operation that can only be started
+    after its start_ub, because of a resource released too late, is started late. The hooks only see the final
+    schedule.
+    """
+    with timed("dispatch_greedily"):
+        dispatcher = _GreedyDispatcher(graph, priority_rule(graph))
+        rollbacks = dispatcher.run(max_rollbacks)
+        dispatcher.replay(hooks)
+        return dispatcher.result(rollbacks)
+
+
+class _Path(NamedTuple):
+    """Operations from a head node along single successors until the next route choice."""
+
+    positions: dict[int, int]
+    """Position of the first operation using each resource along the path."""
+    alternatives: list[int]
+    """Successors of the last operation, i.e. the route choice ending the path."""
+    extended: dict[int, int]
+    """The positions together with the resources of the alternatives, which come right after the path."""
+
+
+@dataclass(frozen=False, slots=True, init=False)
+class _GreedyDispatcher:
+    _graph: CompactDependencyGraph
+    _priority: PriorityRule
+    _start_lb: list[float]
+    _start_ub: list[float]
+    _min_duration: list[float]
+    _successors: list[list[int]]
+    _resources: list[list[tuple[int, float]]]
+    _paths: list[_Path]
+    _path_of: list[int]
+    _offset: list[int]
+    _paths_using: list[list[int]]
+    _overlapping: dict[int, set[int]]
+    _opposing: dict[tuple[int, int, bool], list[tuple[int, int, int]] | None]
+    _give_way: dict[int, list[tuple[int, int]]]
+    """(other train, resource) pairs per node, the node may only be entered after the other train released the
+    resource or finished."""
+    _yielding_to: dict[int, set[int]]
+    """The other trains each train has to give way to by some rule."""
+    _holder: list[int]
+    _free_at: list[float]
+    _last_releaser: list[int]
+    _acquisitions: list[list[tuple[int, int]]]
+    """(entry number, node) of every entry taking the resource, entries rolled back since are skipped on access."""
+    _entry_number: list[int]
+    """Running number of the entry into every node, -1 if it has not been entered."""
+    _n_entries: int
+    _released: set[tuple[int, int]]
+    _waiters: list[set[int]]
+    _yielding: list[set[int]]
+    _locked_from: list[int]
+    _lockers: dict[int, set[int]]
+    _alternative_locks: list[set[int]]
+    _position: list[int]
+    _entered: list[float]
+    _start: list[float]
+    _next_node: list[int]
+    _finished: list[bool]
+    _entries: list[tuple[int, int, float]]
+    _queue: list[tuple[float, float, int, int]]
+    _sequence: int
+    _now: float
+    _forced: int
+
+    def __init__(self, graph: CompactDependencyGraph, priority: PriorityRule) -> None:
+        self._graph, self._priority = graph, priority
+        self._start_lb = graph.effective_start_lb.tolist()
+        self._start_ub = graph.effective_start_ub.tolist()
+        self._min_duration = graph.min_duration.tolist()
+        remaining = shortest_remaining_duration(graph).tolist()
+        successors, offsets = graph.successors.tolist(), graph.successor_offsets.tolist()
+        self._successors = [
+            sorted(successors[offsets[i] : offsets[i + 1]], key=lambda s: remaining[s]) for i in range(graph.n_count)
+        ]
+        resource_ids, release_times = graph.resource_ids.tolist(), graph.release_times.tolist()
+        offsets = graph.resource_offsets.tolist()
+        self._resources = [
+            list(zip(resource_ids[offsets[i] : offsets[i + 1]], release_times[offsets[i] : offsets[i + 1]]))
+            for i in range(graph.n_count)
+        ]
+        n_resources = len(graph.resource_names)
+        self._build_paths(n_resources)
+        self._overlapping, self._opposing, self._give_way, self._yielding_to = {}, {}, {}, {}
+        self._holder, self._last_releaser = [-1] * n_resources, [-1] * n_resources
+        self._free_at = [-float("inf")] * n_resources
+        self._acquisitions, self._released = [[] for _ in range(n_resources)], set()
+        self._entry_number, self._n_entries = [-1] * graph.n_count, 0
+        self._waiters, self._yielding = [set() for _ in range(n_resources)], [set() for _ in range(graph.n_trains)]
+        self._locked_from, self._lockers = [-1] * graph.n_trains, {}
+        self._alternative_locks = [set() for _ in range(n_resources)]
+        self._position, self._entered = [-1] * graph.n_trains, [-float("inf")] * graph.n_trains
+        self._start, self._next_node = [float("nan")] * graph.n_count, [-1] * graph.n_count
+        self._finished, self._entries = [False] * graph.n_trains, []
+        self._queue, self._sequence = [], 0
+        self._now, self._forced = -float("inf"), -1
+        for train, first in enumerate(graph.train_offsets[:-1].tolist()):
+            self._push(train, self._start_lb[first])
+
+    def _build_paths(self, n_resources: int) -> None:
+        """
+        Split the graph into paths, every node is covered by the path of a head node at some offset.
+
+        The section ahead of a node, i.e. everything until the next route choice, is the rest of its path, so
+        sections do not have to be built for every single node.
+        """
+        graph = self._graph
+        branching = np.diff(graph.successor_offsets) != 1
+        is_head = np.diff(graph.predecessor_offsets) == 0
+        is_head[graph.successors[branching[graph.link_sources()]]] = True
+        self._paths, self._paths_using = [], [[] for _ in range(n_resources)]
+        self._path_of, self._offset = [-1] * graph.n_count, [0] * graph.n_count
+        for head in np.flatnonzero(is_head).tolist():
+            path, positions = len(self._paths), dict[int, int]()
+            current, position = head, 0
+            while True:
+                if self._path_of[current] < 0:
+                    self._path_of[current], self._offset[current] = path, position
+                for resource, _ in self._resources[current]:
+                    positions.setdefault(resource, position)
+                if len(self._successors[current]) != 1:
+                    break
+                current, position = self._successors[current][0], position + 1
+            alternatives = self._successors[current]
+            extended = dict(positions)
+            for alternative in alternatives:
+                for resource, _ in self._resources[alternative]:
+                    extended.setdefault(resource, position + 1)
+            self._paths.append(_Path(positions, alternatives, extended))
+            for resource in positions:
+                self._paths_using[resource].append(path)
+
+    def run(self, max_rollbacks: int) -> int:
+        """Process events until all trains finished or they block each other for good, returns the rollbacks."""
+        rollbacks = 0
+        while True:
+            while self._queue or self._break_deadlock():
+                time, _, _, train = heapq.heappop(self._queue)
+                self._now = time
+                self._advance(train, time)
+            if all(self._finished) or rollbacks == max_rollbacks or not self._resolve_deadlock():
+                return rollbacks
+            rollbacks += 1
+
+    def replay(self, hooks: DispatchHooks) -> None:
+        for train, node, time in sorted(self._entries, key=lambda entry: entry[2]):
+            if hooks.on_enter is not None:
+                hooks.on_enter(train, node, time)
+            if hooks.on_finish is not None and not self._successors[node]:
+                hooks.on_finish(train, time + self._min_duration[node])
+
+    def result(self, rollbacks: int) -> DispatchResult:
+        return DispatchResult(
+            schedule=Schedule(start=np.asarray(self._start), next_node=np.asarray(self._next_node, dtype=np.int64)),
+            unfinished_trains=np.flatnonzero(~np.asarray(self._finished, dtype=bool)),
+            rollbacks=rollbacks,
+        )
+
+    def _current_node(self, train: int) -> int:
+        return self._position[train] if self._position[train] >= 0 else int(self._graph.train_offsets[train])
+
+    def _candidates(self, train: int) -> list[int]:
+        current = self._position[train]
+        return self._successors[current] if current >= 0 else [int(self._graph.train_offsets[train])]
+
+    def _push(self, train: int, time: float) -> None:
+        heapq.heappush(
+            self._queue, (time, self._priority(train, self._current_node(train), time), self._sequence, train)
+        )
+        self._sequence += 1
+
+    def _advance(self, train: int, time: float) -> None:
+        current = self._position[train]
+        if self._finished[train] or (current >= 0 and time < self._entered[train] + self._min_duration[current]):
+            return  # outdated event, the train has moved on in the meantime
+        retry_at, late_candidate, blocking = float("inf"), -1, []
+        for candidate in self._candidates(train):
+            blocked_by = self._hard_blocking(train, candidate)
+            if not blocked_by and self._obeys_locks(train, candidate, time):
+                blocked_by = self._locked_resources(train, candidate)
+                if blocked_by and self._start_ub[candidate] < float("inf"):
+                    retry_at = min(retry_at, self._start_ub[candidate])  # from then on the locks are ignored
+            if blocked_by:
+                blocking.extend(blocked_by)
+                continue
+            ready_at = max(time, self._start_lb[candidate])
+            for resource, _ in self._resources[candidate]:
+                if self._last_releaser[resource] != train:
+                    ready_at = max(ready_at, self._free_at[resource])
+            if ready_at > time:
+                retry_at = min(retry_at, ready_at)
+            elif time <= self._start_ub[candidate]:
+                self._enter(train, candidate, time)
+                return
+            elif late_candidate < 0:
+                late_candidate = candidate
+        if late_candidate >= 0 and retry_at == float("inf"):
+            self._enter(train, late_candidate, time)
+            return
+        if retry_at < float("inf"):
+            self._push(train, retry_at)
+        for resource in blocking:
+            self._waiters[resource].add(train)
+
+    def _enter(self, train: int, node: int, time: float) -> None:
+        current = self._position[train]
+        if current >= 0:
+            self._next_node[current] = node
+            kept = {resource for resource, _ in self._resources[node]}
+            for resource, release_time in self._resources[current]:
+                if resource not in kept:
+                    self._release(train, resource, time + release_time)
+        self._entry_number[node], self._n_entries = self._n_entries, self._n_entries + 1
+        for resource, _ in self._resources[node]:
+            if self._holder[resource] != train:
+                self._acquisitions[resource].append((self._entry_number[node], node))
+            self._holder[resource] = train
+        if self._resources[node]:
+            self._lock(train, node)
+        else:
+            self._unlock(train)  # nothing is held, so the train does not keep anyone from entering the section ahead
+        if train == self._forced:
+            self._forced = -1
+        self._start[node], self._position[train], self._entered[train] = time, node, time
+        self._entries.append((train, node, time))
+
+        leave_at = time + self._min_duration[node]
+        if self._successors[node]:
+            self._push(train, leave_at)
+            return
+        for resource, release_time in self._resources[node]:
+            self._release(train, resource, leave_at + release_time)
+        self._unlock(train)
+        self._finished[train] = True
+        for waiting in self._yielding[train]:
+            self._push(waiting, leave_at)
+        self._yielding[train].clear()
+
+    def _release(self, train: int, resource: int, free_at: float) -> None:
+        self._holder[resource], self._free_at[resource], self._last_releaser[resource] = -1, free_at, train
+        self._released.add((train, resource))
+        for waiting in self._waiters[resource]:
+            self._push(waiting, free_at)
+        self._waiters[resource].clear()
+
+    def _break_deadlock(self) -> bool:
+        """Let the waiting train with the best priority, which is only held back by locks, ignore the locks."""
+        waiting = [train for train in range(self._graph.n_trains) if not self._finished[train]]
+        for train in sorted(waiting, key=lambda train: self._priority(train, self._current_node(train), self._now)):
+            if any(not self._hard_blocking(train, candidate) for candidate in self._candidates(train)):
+                self._forced = train
+                self._push(train, self._now)
+                return True
+        return False
+
+    def _resolve_deadlock(self) -> bool:
+        """
+        Let a train on a cycle of waiting trains give way to the train on the cycle waiting for it.
+
+        Of the resources contested on the cycle, the one taken last is given up first, preferably by a train that
+        does not already have the other train give way to it, directly or through other trains, and by an operation
+        without start_ub, as waiting for another train cannot make such an operation late.
+        """
+        waits_for: dict[int, list[tuple[int, int]]] = {}
+        for train in range(self._graph.n_trains):
+            if not self._finished[train]:
+                waits_for[train] = [
+                    (self._holder[resource], resource)
+                    for candidate in self._candidates(train)
+                    for resource, _ in self._resources[candidate]
+                    if self._holder[resource] not in (-1, train)
+                ]
+                waits_for[train].extend(
+                    (other, resource)
+                    for candidate in self._candidates(train)
+                    for other, resource in self._give_way.get(candidate, ())
+                    if not self._finished[other] and (other, resource) not in self._released
+                )
+        on_cycle = set(waits_for)
+        while True:  # drop trains nobody on the cycle waits for, and trains waiting for nobody on it
+            waited_for = {holder for train in on_cycle for holder, _ in waits_for[train]}
+            kept = {
+                train for train in on_cycle & waited_for if any(holder in on_cycle for holder, _ in waits_for[train])
+            }
+            if kept == on_cycle:
+                break
+            on_cycle = kept
+        contested = sorted(
+            (
+                self._gives_way(train, holder),
+                self._start_ub[self._acquisition(resource)[1]] < float("inf"),
+                -self._acquisition(resource)[0],
+                train,
+                resource,
+            )
+            for train in on_cycle
+            for holder, resource in waits_for[train]
+            if holder in on_cycle and holder == self._holder[resource]
+        )
+        return any(
+            self._give_way_to(self._acquisition(resource)[1], train, resource) for *_, train, resource in contested
+        )
+
+    def _acquisition(self, resource: int) -> tuple[int, int]:
+        """(entry number, node) of the last entry that took the resource and has not been rolled back."""
+        acquisitions = self._acquisitions[resource]
+        while acquisitions and self._entry_number[acquisitions[-1][1]] != acquisitions[-1][0]:
+            acquisitions.pop()
+        return acquisitions[-1] if acquisitions else (-1, -1)
+
+    def _gives_way(self, train: int, other: int) -> bool:
+        """True if `train` has to give way to `other` by a rule, directly or through other trains."""
+        reached, stack = {train}, [train]
+        while stack:
+            for following in self._yielding_to.get(stack.pop(), ()):
+                if following == other:
+                    return True
+                if following not in reached:
+                    reached.add(following)
+                    stack.append(following)
+        return False
+
+    def _give_way_to(self, node: int, other: int, resource: int) -> bool:
+        """
+        Add the rule that `node` may only be entered after `other` released `resource` and roll the train back to
+        the operation before `node`, unless the rule is known and still met or the train cannot be rolled back. A
+        known rule is no longer met once `other` has been rolled back to before its release of `resource`.
+        """
+        rules = self._give_way.setdefault(node, [])
+        if (other, resource) in rules and (self._finished[other] or (other, resource) in self._released):
+            return False
+        if not self._roll_back(node):
+            return False
+        if (other, resource) not in rules:
+            rules.append((other, resource))
+        self._yielding_to.setdefault(int(self._graph.train_ids[node]), set()).add(other)
+        return True
+
+    def _roll_back(self, node: int) -> bool:
+        """
+        Undo the entry of the train into `node` and everything after it, so the train waits in the operation before.
+
+        The train holds the resources of that operation again, so other trains that took one of them in the meantime
+        are rolled back as well, to the operation before they took it, and so on. Fails without changing anything if
+        one of these trains could then no longer start an operation within its start_ub. Resources used only by the
+        undone operations are free again at once.
+        """
+        first_undone: dict[int, int] = {}
+        pending = [node]
+        while pending:
+            first = pending.pop()
+            train = int(self._graph.train_ids[first])
+            if train in first_undone and self._entry_number[first_undone[train]] <= self._entry_number[first]:
+                continue
+            previous = self._previous(first)
+            candidates = self._successors[previous] if previous >= 0 else [first]
+            if all(self._start_ub[candidate] <= self._now for candidate in candidates):
+                return False
+            first_undone[train] = first
+            for resource, _ in self._resources[previous] if previous >= 0 else ():
+                for number, acquiring in reversed(self._acquisitions[resource]):
+                    if number <= self._entry_number[first]:
+                        break
+                    if self._entry_number[acquiring] == number and self._graph.train_ids[acquiring] != train:
+                        pending.append(acquiring)
+        undone: set[int] = set()
+        for train, first in first_undone.items():
+            undone.update(self._undo(train, first))
+        self._entries = [entry for entry in self._entries if entry[1] not in undone]
+        for train, first in first_undone.items():
+            previous = self._previous(first)
+            if previous >= 0:
+                self._next_node[previous] = -1
+                self._position[train], self._entered[train] = previous, self._start[previous]
+                for resource, _ in self._resources[previous]:
+                    self._holder[resource] = train
+                    self._released.discard((train, resource))
+                if self._resources[previous]:
+                    self._lock(train, previous)
+            else:
+                self._position[train], self._entered[train] = -1, -float("inf")
+            self._push(train, self._now)
+        return True
+
+    def _previous(self, node: int) -> int:
+        """The operation the train entered `node` from, -1 for its first operation."""
+        return next((p for p in self._graph.predecessors_of(node).tolist() if self._next_node[p] == node), -1)
+
+    def _undo(self, train: int, first: int) -> list[int]:
+        """Forget the operations of the train from `first` on and free their resources, returns the operations."""
+        undone = [first]
+        while self._next_node[undone[-1]] >= 0:
+            undone.append(self._next_node[undone[-1]])
+        for undone_node in undone:
+            self._start[undone_node], self._next_node[undone_node] = float("nan"), -1
+            self._entry_number[undone_node] = -1
+            for resource, _ in self._resources[undone_node]:
+                if self._holder[resource] == train:
+                    self._holder[resource] = -1
+                self._released.discard((train, resource))
+                if self._last_releaser[resource] == train:
+                    self._free_at[resource], self._last_releaser[resource] = -float("inf"), -1
+                for waiting in self._waiters[resource]:
+                    self._push(waiting, self._now)
+                self._waiters[resource].clear()
+        self._unlock(train)
+        self._finished[train] = False
+        return undone
+
+    def _hard_blocking(self, train: int, node: int) -> list[int]:
+        """Resources held by other trains, and resources the train has to give way on."""
+        for other, resource in self._give_way.get(node, ()):
+            if not self._finished[other] and (other, resource) not in self._released:
+                self._yielding[other].add(train)
+                return [resource]
+        return [resource for resource, _ in self._resources[node] if self._holder[resource] not in (-1, train)]
+
+    def _obeys_locks(self, train: int, node: int, time: float) -> bool:
+        """
+        Locks only hold a train back while it can still start `node` in time, and unless it has been forced on.
+
+        Operations without resources hold nothing, so they never have to wait for a lock.
+        """
+        return train != self._forced and time < self._start_ub[node] and bool(self._resources[node])
+
+    def _locked_resources(self, train: int, node: int) -> list[int]:
+        """
+        Resources locked by trains passing the section ahead in opposite direction.
+
+        Alternatives locked by an opposite train may only be taken while that train keeps another usable alternative,
+        and the train itself needs a usable alternative at its next route choice, so a station is never filled up
+        with trains waiting for each other.
+        """
+        for path in self._lockers.keys() & self._overlapping_paths(self._path_of[node]):
+            for other in self._lockers[path]:
+                if other != train and (blocking := self._opposite(node, self._locked_from[other], False)):
+                    return blocking
+        taken = [resource for resource, _ in self._resources[node]]
+        for other in {other for resource in taken for other in self._alternative_locks[resource]} - {train}:
+            other_node = self._locked_from[other]
+            if self._opposite(other_node, node, True) and not self._has_usable_alternative(other, other_node, taken):
+                return taken
+        alternatives = self._paths[self._path_of[node]].alternatives
+        if alternatives and not self._has_usable_alternative(train, node, []):
+            return [resource for alternative in alternatives for resource, _ in self._resources[alternative]]
+        return []
+
+    def _has_usable_alternative(self, train: int, node: int, taken: list[int]) -> bool:
+        """True if one alternative ahead of `node` is neither taken nor held by a train coming the other way."""
+        for alternative in self._paths[self._path_of[node]].alternatives:
+            resources = [resource for resource, _ in self._resources[alternative]]
+            if any(resource in taken for resource in resources):
+                continue
+            holders = {self._holder[resource] for resource in resources} - {-1, train}
+            if not any(self._opposite(node, self._locked_from[holder], True) for holder in holders):
+                return True
+        return False
+
+    def _opposite(self, node: int, other_node: int, extended: bool) -> list[int]:
+        """
+        Resources shared by the sections ahead of both nodes if they are used in opposite order.
+
+        With `extended` the alternatives at the end of the first section count as part of it.
+        """
+        path, other_path = self._path_of[node], self._path_of[other_node]
+        key = (path, other_path, extended)
+        if key not in self._opposing:
+            positions = self._paths[path].extended if extended else self._paths[path].positions
+            other_positions = self._paths[other_path].positions
+            rows = sorted((positions[r], other_positions[r], r) for r in positions.keys() & other_positions.keys())
+            self._opposing[key] = rows if _inverted(rows) else None
+        shared = self._opposing[key]
+        if shared is None:
+            return []
+        offset, other_offset = self._offset[node], self._offset[other_node]
+        ahead = [item for item in shared[bisect.bisect_left(shared, (offset,)) :] if item[1] >= other_offset]
+        return [resource for _, _, resource in ahead] if _inverted(ahead) else []
+
+    def _overlapping_paths(self, path: int) -> set[int]:
+        if path not in self._overlapping:
+            self._overlapping[path] = {
+                other for resource in self._paths[path].positions for other in self._paths_using[resource]
+            }
+        return self._overlapping[path]
+
+    def _lock(self, train: int, node: int) -> None:
+        """Lock the section ahead of `node`, the resources of the alternatives at its end are locked as alternatives."""
+        previous = self._locked_from[train]
+        if previous >= 0 and self._path_of[previous] == self._path_of[node]:
+            self._locked_from[train] = node
+            return
+        self._unlock(train)
+        path = self._path_of[node]
+        self._lockers.setdefault(path, set()).add(train)
+        for resource in self._paths[path].extended.keys() - self._paths[path].positions.keys():
+            self._alternative_locks[resource].add(train)
+        self._locked_from[train] = node
+
+    def _unlock(self, train: int) -> None:
+        if self._locked_from[train] < 0:
+            return
+        path = self._path_of[self._locked_from[train]]
+        self._lockers[path].discard(train)
+        if not self._lockers[path]:
+            del self._lockers[path]
+        for resource in self._paths[path].extended.keys() - self._paths[path].positions.keys():
+            self._alternative_locks[resource].discard(train)
+        self._locked_from[train] = -1
+
+
+def _inverted(shared: list[tuple[int, int, int]]) -> bool:
+    """True if two of the (position, other position, resource) rows, sorted by position, are in opposite order."""
+    previous_maximum, group_maximum, group = -1, -1, -1
+    for position, other_position, _ in shared:
+        if position != group:
+            previous_maximum, group = max(previous_maximum, group_maximum), position
+        if other_position < previous_maximum:
+            return True
+        group_maximum = max(group_maximum, other_position)
+    return False
@@ -0,0 +1,525 @@
+import bisect
+import heapq
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Literal, NamedTuple
+
+import numpy as np
+
+from hackthetrack.dependencygraph.compact import CompactDependencyGraph
+from hackthetrack.dependencygraph.propagation import StartTimeBounds, propagate_start_bounds
+from hackthetrack.instrumentation import count, timed
+from hackthetrack.solution.objective import DelayObjective
+from hackthetrack.solution.occupancy import OccupancyIndex
+from hackthetrack.solution.schedule import Schedule
+from hackthetrack.solution.verification import verify_schedule
+
+Neighbourhood = Literal["trains", "window", "resources"]
+
+_INF = float("inf")
+_BLOCKED = -1
+"""Train of occupations that block a resource without a train, see _LargeNeighbourhoodSearch.block."""
+
+
+class LnsOptions(NamedTuple):
+    time_limit: float = 10.0
+    """Seconds, checked before every iteration."""
+    max_iterations: int | None = None
+    seed: int = 0
+    neighbourhoods: tuple[Neighbourhood, ...] = ("trains", "window", "resources")
+    """Destroy operators, one of them is drawn uniformly in every iteration."""
+    destroy_size: int = 4
+    """Maximum number of trains removed and re-inserted per iteration."""
+    window: float = 600.0
+    """Length of the time window of the window neighbourhood."""
+    lower_bound: float = 0.0
+    """The search stops once the objective reaches it, e.g. ObjectiveLowerBound.value."""
+
+
+class LnsHooks(NamedTuple):
+    on_improvement: Callable[[Schedule, float], None] | None = None
+    """Called with the schedule and its objective value after every move that lowers the objective."""
+    incumbent: Callable[[float], Schedule | None] | None = None
+    """Called with the current objective value before every iteration, a returned schedule replaces the current one."""
+
+
+@dataclass(frozen=True, slots=True)
+class LnsResult:
+    schedule: Schedule
+    objective_value: float
+    """Infinite while a train is unrouted."""
+    iterations: int
+    improvements: int
+    seconds: float
+    unrouted_trains: np.ndarray
+    """Trains the search could not route within their bounds, the schedule is feasible for the other trains only."""
+
+
+def solve_with_lns(
+    graph: CompactDependencyGraph,
+    objective: DelayObjective,
+    options: LnsOptions = LnsOptions(),
+    initial: Schedule | None = None,
+    hooks: LnsHooks = LnsHooks(),
+) -> LnsResult:
+    """
+    Improve a feasible schedule by repeatedly removing a few trains and re-inserting them one after the other.
+
+    Every removed train is re-inserted along its cheapest route around the occupations of all other trains, found by
+    a search over the free intervals of its operations. Only the re-inserted trains change, so a move is rated by
+    the objective delta of these trains and kept unless it makes the objective worse. Without an initial schedule
+    all trains are inserted into the empty network in order of their latest and earliest start, see construct. Trains
+    of the initial schedule with a violation are inserted around the others, see load.
+    """
+    started = time.perf_counter()
+    search = _LargeNeighbourhoodSearch(graph, objective, options)
+    if initial is None:
+        search.construct()
+    else:
+        search.load(initial)
+    with timed("lns.search"):
+        search.run(started + options.time_limit, hooks)
+    schedule, unrouted = search.schedule(), search.unrouted_trains()
+    return LnsResult(
+        schedule=schedule,
+        objective_value=_INF if unrouted else objective.evaluate(schedule.start),
+        iterations=search.iterations,
+        improvements=search.improvements,
+        seconds=time.perf_counter() - started,
+        unrouted_trains=np.asarray(unrouted, dtype=np.int64),
+    )
+
+
+class _Label(NamedTuple):
+    node: int
+    time: float
+    cost: float
+    parent: int
+
+
+@dataclass(frozen=False, slots=True, init=False)
+class _LargeNeighbourhoodSearch:
+    iterations: int
+    improvements: int
+    _graph: CompactDependencyGraph
+    _options: LnsOptions
+    _rng: np.random.Generator
+    _first: list[int]
+    _start_lb: list[float]
+    _start_ub: list[float]
+    _min_duration: list[float]
+    _successors: list[list[int]]
+    _resources: list[list[tuple[int, float]]]
+    _resource_sets: list[set[int]]
+    _node_costs: dict[int, list[tuple[float, float, float]]]
+    _routes: list[list[int]]
+    _start: list[float]
+    _train_costs: list[float]
+    _objective_value: float
+    _occupations: OccupancyIndex
+    _free: dict[int, tuple[list[float], list[float]]]
+    _free_users: list[set[int]]
+    """Nodes of every resource with cached free intervals, dropped from the cache whenever the resource changes."""
+
+    def __init__(self, graph: CompactDependencyGraph, objective: DelayObjective, options: LnsOptions) -> None:
+        self.iterations, self.improvements = 0, 0
+        self._options, self._rng = options, np.random.default_rng(options.seed)
+        self._first, self._start_lb, self._start_ub, self._min_duration = [], [], [], []
+        self._successors, self._resources, self._resource_sets, self._node_costs = [], [], [], {}
+        self._routes, self._start, self._train_costs, self._objective_value = [], [], [], 0.0
+        self._occupations, self._free, self._free_users = OccupancyIndex(0), {}, []
+        self.extend(graph, objective)
+
+    def extend(self, graph: CompactDependencyGraph, objective: DelayObjective) -> None:
+        """Take over the trains, operations and objective components appended to the graph, all of them unrouted."""
+        first, n_trains = len(self._min_duration), len(self._routes)
+        self._graph = graph
+        self._first.extend(graph.train_offsets[n_trains:-1].tolist())
+        self._start_lb.extend(graph.effective_start_lb[first:].tolist())
+        self._start_ub.extend(graph.effective_start_ub[first:].tolist())
+        self._min_duration.extend(graph.min_duration[first:].tolist())
+        self._successors.extend(_rows(graph.successor_offsets, graph.successors, first))
+        self._resources.extend(
+            list(zip(resource_ids, release_times))
+            for resource_ids, release_times in zip(
+                _rows(graph.resource_offsets, graph.resource_ids, first),
+                _rows(graph.resource_offsets, graph.release_times, first),
+            )
+        )
+        self._resource_sets.extend({resource for resource, _ in resources} for resources in self._resources[first:])
+        added = objective.nodes >= first
+        for node, threshold, coeff, increment in zip(
+            objective.nodes[added].tolist(),
+            objective.threshold[added].tolist(),
+            objective.coeff[added].tolist(),
+            objective.increment[added].tolist(),
+        ):
+            self._node_costs.setdefault(node, []).append((threshold, coeff, increment))
+        self._routes.extend([] for _ in range(n_trains, graph.n_trains))
+        self._start.extend([_INF] * (graph.n_count - first))
+        self._train_costs.extend([0.0] * (graph.n_trains - n_trains))
+        self._occupations.extend(len(graph.resource_names))
+        self._free_users.extend(set() for _ in range(len(self._free_users), len(graph.resource_names)))
+
+    def construct(
+        self, trains: list[int] | None = None, max_ejections: int = 10, max_restarts: int = 10
+    ) -> tuple[list[int], list[int]]:
+        """
+        Insert the trains, by default all, in order of their latest and earliest start around the routed others.
+
+        A train that cannot be inserted within its bounds ejects the trains occupying its resources while it could
+        hold them, is inserted before them and the ejected trains are re-inserted right after it. Every train ejects
+        other trains at most max_ejections times, so the chains of ejections end. Trains still left over are moved to
+        the front of the order and the construction starts again, at most max_restarts times. Returns the inserted
+        trains in the order of their last insertion and the trains left without a route.
+        """
+        bounds = propagate_start_bounds(self._graph)
+        first = self._graph.train_offsets[:-1]
+        trains = list(range(self._graph.n_trains)) if trains is None else trains
+        order = [trains[i] for i in np.lexsort((bounds.earliest[first[trains]], bounds.latest[first[trains]]))]
+        for restart in range(max_restarts + 1):
+            inserted, unrouted = self.insert_with_ejections(order, bounds, max_ejections)
+            if not unrouted or restart == max_restarts:
+                break
+            count("lns.construction restarts")
+            for train in trains:
+                self.remove(train)
+            order = unrouted + [train for train in order if train not in set(unrouted)]
+        return inserted, unrouted
+
+    def insert_with_ejections(
+        self, order: list[int], bounds: StartTimeBounds, max_ejections: int = 10
+    ) -> tuple[list[int], list[int]]:
+        """
+        Insert the unrouted trains in order, ejecting blockers as in construct.
+
+        Returns the inserted trains, including the ejected ones, in the order of their last insertion and the trains
+        left without a route.
+        """
+        pending, ejections, unrouted = deque(order), [0] * self._graph.n_trains, []
+        inserted: dict[int, None] = {}
+        while pending:
+            train = pending.popleft()
+            if self.reinsert(train):
+                inserted.pop(train, None)
+                inserted[train] = None
+                continue
+            blockers = self._blockers(train, bounds) if ejections[train] < max_ejections else []
+            ejections[train] += 1
+            if not blockers:
+                unrouted.append(train)
+                continue
+            for blocker in blockers:
+                self.remove(blocker)
+                inserted.pop(blocker, None)
+            pending.extendleft(reversed([train] + blockers))
+            count("lns.ejected trains", len(blockers))
+        return list(inserted), unrouted
+
+    def _blockers(self, train: int, bounds: StartTimeBounds) -> list[int]:
+        """Trains occupying a resource of the train between the earliest and latest time the train could hold it."""
+        blockers: set[int] = set()
+        first, last = self._graph.train_offsets[train], self._graph.train_offsets[train + 1]
+        earliest, latest = bounds.earliest[first:last].tolist(), bounds.latest[first:last].tolist()
+        for node, begin, end in zip(range(first, last), earliest, latest):
+            end = (end if end < _INF else begin) + self._min_duration[node]
+            for resource, release_time in self._resources[node]:
+                blockers |= self.trains_in(resource, begin, end + release_time)
+        blockers.discard(train)
+        return sorted(blockers, key=lambda blocker: self._start[self._routes[blocker][0]])
+
+    def set_bounds(self, nodes: list[int], start_lb: list[float], start_ub: list[float]) -> None:
+        """Bounds for later insertions, e.g. propagated ones; routed trains are not checked against them."""
+        for node, lower, upper in zip(nodes, start_lb, start_ub):
+            self._start_lb[node], self._start_ub[node] = lower, upper
+
+    def block(self, resource: int, begin: float, end: float) -> None:
+        """Occupy a resource without a train, trains that overlap the interval have to be re-inserted."""
+        self._occupations.add(resource, begin, end, _BLOCKED)
+        self._invalidate([resource])
+
+    def trains_in(self, resource: int, begin: float, end: float) -> set[int]:
+        """Trains occupying the resource in [begin, end); zero length occupations only if strictly inside."""
+        return self._occupations.trains_in(resource, begin, end) - {_BLOCKED}
+
+    def load(self, schedule: Schedule, max_ejections: int = 10) -> list[int]:
+        """
+        Take over the routes and times of a schedule, returns the trains left without a route.
+
+        Trains with a violation in the schedule, e.g. a route ending before an operation without successors, a
+        start_ub violation or entering a resource held by another train, are inserted around the other trains
+        afterwards, as in construct.
+        """
+        result = verify_schedule(self._graph, schedule)
+        violations = [
+            result.route_violations,
+            result.duration_violations,
+            result.start_lb_violations,
+            result.start_ub_violations,
+            result.resource_conflicts[:, 1],
+        ]
+        broken = set(self._graph.train_ids[np.concatenate(violations)].tolist())
+        start, next_node = schedule.start.tolist(), schedule.next_node.tolist()
+        for train, first in enumerate(self._first):
+            if train in broken:
+                continue
+            route = [first]
+            while next_node[route[-1]] >= 0:
+                route.append(next_node[route[-1]])
+            times = [start[node] for node in route]
+            self._place(train, route, times, sum(self._cost(node, t) for node, t in zip(route, times)))
+        if not broken:
+            return []
+        count("lns.reinserted initial trains", len(broken))
+        bounds = propagate_start_bounds(self._graph)
+        order = sorted(broken, key=lambda train: bounds.earliest[self._first[train]])
+        return self.insert_with_ejections(order, bounds, max_ejections)[1]
+
+    def unrouted_trains(self) -> list[int]:
+        return [train for train, route in enumerate(self._routes) if not route]
+
+    def schedule(self) -> Schedule:
+        start = np.full(self._graph.n_count, np.nan)
+        next_node = np.full(self._graph.n_count, -1, dtype=np.int64)
+        for route in self._routes:
+            start[route] = [self._start[node] for node in route]
+            next_node[route[:-1]] = route[1:]
+        return Schedule(start=start, next_node=next_node)
+
+    def run(self, deadline: float, hooks: LnsHooks) -> None:
+        """
+        Destroy and repair until the deadline, max_iterations more iterations or the lower bound is reached.
+
+        Trains without a route stay out.
+        """
+        options = self._options
+        stop = _INF if options.max_iterations is None else self.iterations + options.max_iterations
+        while self.iterations < stop and time.perf_counter() < deadline:
+            if self._objective_value <= options.lower_bound:
+                break
+            if hooks.incumbent is not None and (incumbent := hooks.incumbent(self._objective_value)) is not None:
+                for train in range(self._graph.n_trains):
+                    self.remove(train)
+                self.load(incumbent)
+            self.iterations += 1
+            count("lns.iterations")
+            neighbourhood = options.neighbourhoods[int(self._rng.integers(len(options.neighbourhoods)))]
+            trains = sorted(self._destroy(neighbourhood), key=lambda train: self._start[self._routes[train][0]])
+            previous = self.placements(trains)
+            for train in trains:
+                self.remove(train)
+            delta, reinserted = -sum(cost for *_, cost in previous), []
+            with timed("lns.repair"):
+                for train in trains:
+                    if not self.reinsert(train):
+                        delta = _INF
+                        break
+                    reinserted.append(train)
+                    delta += self._train_costs[train]
+            count("lns.reinserted trains", len(reinserted))
+            if delta < 0.0:
+                self.improvements += 1
+                count("lns.improvements")
+                if hooks.on_improvement is not None:
+                    hooks.on_improvement(self.schedule(), self._objective_value)
+            if delta <= 0.0:
+                continue
+            self.restore(previous)
+
+    def placements(self, trains: list[int]) -> list[tuple[int, list[int], list[float], float]]:
+        """Route, times and cost of every train, to put them back with restore."""
+        return [(train, self._routes[train], self._times(train), self._train_costs[train]) for train in trains]
+
+    def restore(self, placements: list[tuple[int, list[int], list[float], float]]) -> None:
+        for train, *_ in placements:
+            self.remove(train)
+        for train, route, times, cost in placements:
+            if route:
+                self._place(train, route, times, cost)
+
+    def _destroy(self, neighbourhood: Neighbourhood) -> list[int]:
+        """A seed train, preferably a costly one, and up to destroy_size - 1 trains related to it."""
+        size, n_trains = self._options.destroy_size, self._graph.n_trains
+        routed = [train for train in range(n_trains) if self._routes[train]]
+        if not routed:
+            return []
+        costs = np.asarray(self._train_costs)
+        if costs.sum() > 0.0 and self._rng.random() < 0.5:
+            seed = int(self._rng.choice(n_trains, p=costs / costs.sum()))
+        else:
+            seed = routed[int(self._rng.integers(len(routed)))]
+        if neighbourhood == "trains":
+            others = [train for train in routed if train != seed]
+        elif neighbourhood == "window":
+            begin = self._start[self._routes[seed][0]] + self._rng.random() * self._span(seed)
+            end = begin + self._options.window
+            others = [
+                train
+                for train in routed
+                if train != seed and self._start[self._routes[train][0]] < end and self._leave(train) > begin
+            ]
+        else:
+            route = self._routes[seed]
+            node = route[int(self._rng.integers(len(route)))]
+            resources = self._resources[node]
+            if not resources:
+                return [seed]
+            resource = resources[int(self._rng.integers(len(resources)))][0]
+            at = self._start[node]
+            closest = sorted(self._occupations.occupations(resource), key=lambda occupation: abs(occupation[0] - at))
+            return list(dict.fromkeys([seed] + [train for *_, train in closest if train != _BLOCKED]))[:size]
+        chosen = self._rng.choice(len(others), size=min(size - 1, len(others)), replace=False)
+        return [seed] + [others[i] for i in chosen.tolist()]
+
+    def _span(self, train: int) -> float:
+        return self._leave(train) - self._start[self._routes[train][0]]
+
+    def _leave(self, train: int) -> float:
+        last = self._routes[train][-1]
+        return self._start[last] + self._min_duration[last]
+
+    def _times(self, train: int) -> list[float]:
+        return [self._start[node] for node in self._routes[train]]
+
+    def _cost(self, node: int, time_: float) -> float:
+        return sum(
+            coeff * max(time_ - threshold, 0.0) + (increment if time_ > threshold else 0.0)
+            for threshold, coeff, increment in self._node_costs.get(node, ())
+        )
+
+    def _train_occupations(self, route: list[int], times: list[float]) -> list[tuple[int, float, float]]:
+        """(resource, begin, end) rows, a resource used by the next operation too is released without delay."""
+        occupations = []
+        for position, node in enumerate(route):
+            last = position + 1 == len(route)
+            leave = times[position] + self._min_duration[node] if last else times[position + 1]
+            for resource, release_time in self._resources[node]:
+                kept = not last and resource in self._resource_sets[route[position + 1]]
+                occupations.append((resource, times[position], leave if kept else leave + release_time))
+        return occupations
+
+    def _place(self, train: int, route: list[int], times: list[float], cost: float) -> None:
+        self._routes[train], self._train_costs[train] = route, cost
+        self._objective_value += cost
+        for node, time_ in zip(route, times):
+            self._start[node] = time_
+        occupations = self._train_occupations(route, times)
+        for resource, begin, end in occupations:
+            self._occupations.add(resource, begin, end, train)
+        self._invalidate([resource for resource, _, _ in occupations])
+
+    def remove(self, train: int) -> None:
+        route = self._routes[train]
+        occupations = self._train_occupations(route, self._times(train))
+        for resource, begin, end in occupations:
+            self._occupations.remove(resource, begin, end, train)
+        for node in route:
+            self._start[node] = _INF
+        self._objective_value -= self._train_costs[train]
+        self._routes[train], self._train_costs[train] = [], 0.0
+        self._invalidate([resource for resource, _, _ in occupations])
+
+    def _invalidate(self, resources: list[int]) -> None:
+        """Drop the cached free intervals of the nodes using the resources, the other nodes keep theirs."""
+        for resource in resources:
+            for node in self._free_users[resource]:
+                self._free.pop(node, None)
+            self._free_users[resource].clear()
+
+    def reinsert(self, train: int) -> bool:
+        found = self._cheapest_route(train)
+        if found is None:
+            return False
+        self._place(train, *found)
+        return True
+
+    def _cheapest_route(self, train: int) -> tuple[list[int], list[float], float] | None:
+        """
+        Label setting search over (operation, free interval) states, labels are expanded by increasing cost.
+
+        Within a free interval an earlier start is never worse, so a label is dropped if a label of the same state
+        with lower cost starts no later. A train may wait in an operation as long as none of its resources is needed
+        by another train, and it enters the next operation at the earliest free time within every free interval.
+        """
+        labels: list[_Label] = []
+        queue: list[tuple[float, float, int]] = []
+        earliest: dict[tuple[int, int], float] = {}
+
+        def push(node: int, lower: float, upper: float, cost: float, parent: int) -> None:
+            begins, ends = self._free_intervals(node)
+            for interval in range(max(bisect.bisect_right(begins, lower) - 1, 0), len(begins)):
+                entry = max(begins[interval], lower)
+                if entry > upper:
+                    break
+                if entry >= ends[interval] or earliest.get((node, interval), _INF) <= entry:
+                    continue
+                labels.append(_Label(node, entry, cost + self._cost(node, entry), parent))
+                heapq.heappush(queue, (labels[-1].cost, entry, len(labels) - 1))
+
+        first = self._first[train]
+        push(first, self._start_lb[first], self._start_ub[first], 0.0, -1)
+        while queue:
+            _, entry, index = heapq.heappop(queue)
+            node, _, cost, _ = labels[index]
+            state = (node, bisect.bisect_right(self._free_intervals(node)[0], entry) - 1)
+            if earliest.get(state, _INF) <= entry:
+                continue
+            earliest[state] = entry
+            duration = self._min_duration[node]
+            if not self._successors[node]:
+                if entry + duration <= self._deadline(node, -1, entry):
+                    return self._route_of(labels, index)
+                continue
+            for successor in self._successors[node]:
+                upper = min(self._deadline(node, successor, entry), self._start_ub[successor])
+                push(successor, max(entry + duration, self._start_lb[successor]), upper, cost, index)
+        return None
+
+    def _deadline(self, node: int, successor: int, entry: float) -> float:
+        """Latest time to leave `node` entered at `entry` for `successor` (-1 for none) before another train comes."""
+        kept = self._resource_sets[successor] if successor >= 0 else ()
+        return min(
+            (
+                self._occupations.next_begin(resource, entry) - (0.0 if resource in kept else release_time)
+                for resource, release_time in self._resources[node]
+            ),
+            default=_INF,
+        )
+
+    def _free_intervals(self, node: int) -> tuple[list[float], list[float]]:
+        """Begins and ends of the intervals in which `node` can be entered, i.e. none of its resources is busy."""
+        if node not in self._free:
+            busy = sorted(
+                interval
+                for resource, _ in self._resources[node]
+                for interval in zip(*self._occupations.merged(resource))
+            )
+            begins, ends, lower = [], [], -_INF
+            for begin, end in busy:
+                if begin > lower:
+                    begins.append(lower)
+                    ends.append(begin)
+                lower = max(lower, end)
+            begins.append(lower)
+            ends.append(_INF)
+            self._free[node] = begins, ends
+            for resource, _ in self._resources[node]:
+                self._free_users[resource].add(node)
+        return self._free[node]
+
+    def _route_of(self, labels: list[_Label], index: int) -> tuple[list[int], list[float], float]:
+        cost = labels[index].cost
+        route, times = [], []
+        while index >= 0:
+            route.append(labels[index].node)
+            times.append(labels[index].time)
+            index = labels[index].parent
+        return route[::-1], times[::-1], cost
+
+
+def _rows(offsets: np.ndarray, values: np.ndarray, first: int) -> list[list]:
+    """Rows first, first + 1, ... of a CSR matrix as lists."""
+    begin = int(offsets[first])
+    bounds, row_values = (offsets[first:] - begin).tolist(), values[begin:].tolist()
+    return [row_values[bounds[i] : bounds[i + 1]] for i in range(len(bounds) - 1)]
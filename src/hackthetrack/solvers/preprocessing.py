@@ -0,0 +1,256 @@
+from dataclasses import dataclass, replace
+from typing import NamedTuple
+
+import numpy as np
+
+from hackthetrack.dependencygraph.compact import CompactDependencyGraph
+from hackthetrack.dependencygraph.propagation import StartTimeBounds, propagate_start_bounds
+from hackthetrack.displib.compiled_instance import CompiledInstance
+from hackthetrack.instrumentation import timed
+from hackthetrack.solution.schedule import Schedule
+
+
+class ReductionOptions(NamedTuple):
+    remove_infeasible_routes: bool = True
+    tighten_bounds: bool = True
+    drop_single_train_resources: bool = True
+    merge_chains: bool = True
+
+
+@dataclass(frozen=True, slots=True)
+class ReducedInstance:
+    """
+    A smaller instance with the same optimal schedules, and the mapping back to the original nodes.
+
+    Every reduced node stands for a chain of original nodes, an original node starts start_offset after its reduced
+    node. Removed original nodes have a reduced_node of -1.
+    """
+
+    instance: CompiledInstance
+    reduced_node: np.ndarray
+    start_offset: np.ndarray
+    chain_next: np.ndarray
+    original_head: np.ndarray
+
+    def expand_schedule(self, schedule: Schedule) -> Schedule:
+        """The schedule of the original instance for a schedule of the reduced instance."""
+        members = np.flatnonzero(self.reduced_node >= 0)
+        start = np.full(len(self.reduced_node), np.nan)
+        start[members] = schedule.start[self.reduced_node[members]] + self.start_offset[members]
+        visited = ~np.isnan(start)
+        next_node = np.where(visited, self.chain_next, -1)
+        tails = np.flatnonzero(visited & (self.chain_next < 0))
+        next_reduced = schedule.next_node[self.reduced_node[tails]]
+        next_node[tails] = np.where(next_reduced >= 0, self.original_head[next_reduced], -1)
+        return Schedule(start=start, next_node=next_node)
+
+
+def reduce_instance(compiled: CompiledInstance, options: ReductionOptions = ReductionOptions()) -> ReducedInstance:
+    """
+    Shrink an instance before it is handed to a solver.
+
+    1. Operations that cannot be started within their bounds are removed, together with everything only reachable
+       through them or only leading to them, until no more operations can be removed.
+    2. start_lb and start_ub are tightened to the propagated earliest and latest starts.
+    3. Resources used by a single train are dropped, as occupations of one train never conflict.
+    4. Chains of operations with the same resources are merged, if the later operation has neither bounds nor an
+       objective of its own; a train can as well wait in the first operation of such a chain.
+
+    Raises a ValueError if the first operation of a train is removed, i.e. if the instance is infeasible.
+    """
+    with timed("reduce_instance"):
+        kept = np.arange(compiled.n_operations)
+        original_out_degree = np.diff(compiled.successor_offsets)
+        graph = CompactDependencyGraph.from_compiled_instance(compiled)
+        bounds = propagate_start_bounds(graph)
+        while options.remove_infeasible_routes:
+            removed = _removable_nodes(graph, bounds, original_out_degree[kept])
+            if not removed.any():
+                break
+            if removed[graph.train_offsets[:-1]].any():
+                trains = np.flatnonzero(removed[graph.train_offsets[:-1]])
+                raise ValueError(f"Instance is infeasible, trains {trains.tolist()} cannot start their first operation")
+            nodes = np.flatnonzero(~removed)
+            compiled = _contract(compiled, graph, nodes, nodes, np.ones(len(compiled.resource_names), dtype=bool))
+            graph = CompactDependencyGraph.from_compiled_instance(compiled)
+            bounds = propagate_start_bounds(graph)
+            kept = kept[nodes]
+
+        used_resources = np.ones(len(compiled.resource_names), dtype=bool)
+        if options.drop_single_train_resources:
+            used_resources = _resources_of_several_trains(graph)
+        merged = np.zeros(graph.n_count, dtype=bool)
+        if options.merge_chains:
+            merged = _mergeable_nodes(compiled, graph, used_resources)
+        if options.tighten_bounds:
+            compiled = _with_tightened_bounds(compiled, graph, bounds)
+
+        head, start_offset = _chain_heads(graph, merged)
+        heads = np.flatnonzero(~merged)
+        tails = _chain_tails(graph, merged, head, heads)
+        reduced = _contract(
+            compiled, graph, heads, tails, used_resources, start_offset[tails] + graph.min_duration[tails]
+        )
+
+        reduced_node = np.full(len(original_out_degree), -1, dtype=np.int64)
+        new_index = np.full(graph.n_count, -1, dtype=np.int64)
+        new_index[heads] = np.arange(len(heads))
+        reduced_node[kept] = new_index[head]
+        offsets = np.zeros(len(original_out_degree))
+        offsets[kept] = start_offset
+        chain_next = np.full(len(original_out_degree), -1, dtype=np.int64)
+        inner = np.flatnonzero(~np.isin(np.arange(graph.n_count), tails))
+        chain_next[kept[inner]] = kept[graph.successors[graph.successor_offsets[inner]]]
+        return ReducedInstance(
+            instance=reduced,
+            reduced_node=reduced_node,
+            start_offset=offsets,
+            chain_next=chain_next,
+            original_head=kept[heads],
+        )
+
+
+def _removable_nodes(
+    graph: CompactDependencyGraph, bounds: StartTimeBounds, original_out_degree: np.ndarray
+) -> np.ndarray:
+    """Nodes that cannot be started, dead ends whose successors were all removed and nodes that cannot be reached."""
+    out_degree, in_degree = np.diff(graph.successor_offsets), np.diff(graph.predecessor_offsets)
+    unreachable = in_degree == 0
+    unreachable[graph.train_offsets[:-1]] = False
+    return ~bounds.feasible | ((out_degree == 0) & (original_out_degree > 0)) | unreachable
+
+
+def _with_tightened_bounds(
+    compiled: CompiledInstance, graph: CompactDependencyGraph, bounds: StartTimeBounds
+) -> CompiledInstance:
+    """Bounds that are not implied by the propagation stay missing (NaN)."""
+    return replace(
+        compiled,
+        start_lb=np.where(bounds.earliest > graph.effective_start_lb, bounds.earliest, compiled.start_lb),
+        start_ub=np.where(bounds.latest < graph.effective_start_ub, bounds.latest, compiled.start_ub),
+    )
+
+
+def _resources_of_several_trains(graph: CompactDependencyGraph) -> np.ndarray:
+    n_resources = len(graph.resource_names)
+    pairs = np.unique(graph.resource_ids * graph.n_trains + graph.train_ids[graph.resource_use_nodes()])
+    return np.bincount(pairs // max(graph.n_trains, 1), minlength=n_resources) > 1
+
+
+def _mergeable_nodes(
+    compiled: CompiledInstance, graph: CompactDependencyGraph, used_resources: np.ndarray
+) -> np.ndarray:
+    """Nodes with a single predecessor of a single successor, the same resources and no bounds or objective."""
+    sources = np.flatnonzero(np.diff(graph.successor_offsets) == 1)
+    targets = graph.successors[graph.successor_offsets[sources]]
+    objective_nodes = compiled.train_offsets[compiled.objective_train] + compiled.objective_operation
+    free = np.isnan(compiled.start_lb) & np.isnan(compiled.start_ub)
+    free[objective_nodes] = False
+    candidate = (np.diff(graph.predecessor_offsets)[targets] == 1) & free[targets]
+    sources, targets = sources[candidate], targets[candidate]
+
+    # compare the sorted resources of source and target use by use
+    uses = np.flatnonzero(used_resources[graph.resource_ids])
+    use_nodes = graph.resource_use_nodes()[uses]
+    order = np.lexsort((graph.resource_ids[uses], use_nodes))
+    sorted_ids = graph.resource_ids[uses][order]
+    offsets = np.zeros(graph.n_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(use_nodes, minlength=graph.n_count), out=offsets[1:])
+    counts = np.diff(offsets)
+    same_count = counts[sources] == counts[targets]
+    sources, targets = sources[same_count], targets[same_count]
+    pair, source_positions = _row_positions(offsets, sources)
+    _, target_positions = _row_positions(offsets, targets)
+    differing = np.bincount(
+        pair, weights=sorted_ids[source_positions] != sorted_ids[target_positions], minlength=len(sources)
+    )
+
+    merged = np.zeros(graph.n_count, dtype=bool)
+    merged[targets[differing == 0]] = True
+    return merged
+
+
+def _chain_heads(graph: CompactDependencyGraph, merged: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """First node of the chain of every node and the time from the start of that node, by pointer jumping."""
+    head = np.arange(graph.n_count)
+    offset = np.zeros(graph.n_count)
+    members = np.flatnonzero(merged)
+    head[members] = graph.predecessors[graph.predecessor_offsets[members]]
+    offset[members] = graph.min_duration[head[members]]
+    while np.any(head[head] != head):
+        offset, head = offset + offset[head], head[head]
+    return head, offset
+
+
+def _chain_tails(graph: CompactDependencyGraph, merged: np.ndarray, head: np.ndarray, heads: np.ndarray) -> np.ndarray:
+    """Last node of every chain, aligned with `heads`."""
+    single = np.flatnonzero(np.diff(graph.successor_offsets) == 1)
+    continued = np.zeros(graph.n_count, dtype=bool)
+    continued[single] = merged[graph.successors[graph.successor_offsets[single]]]
+    tails = np.flatnonzero(~continued)
+    tail_of_head = np.empty(graph.n_count, dtype=np.int64)
+    tail_of_head[head[tails]] = tails
+    return tail_of_head[heads]
+
+
+def _contract(
+    compiled: CompiledInstance,
+    graph: CompactDependencyGraph,
+    heads: np.ndarray,
+    tails: np.ndarray,
+    used_resources: np.ndarray,
+    min_duration: np.ndarray | None = None,
+) -> CompiledInstance:
+    """
+    The instance with one node per chain from heads[i] to tails[i], the heads have to be sorted.
+
+    A chain starts within the bounds of its head, lasts at least `min_duration` and continues like its tail. Links to
+    nodes that are not heads and objectives of nodes that are not heads are dropped.
+    """
+    new_index = np.full(graph.n_count, -1, dtype=np.int64)
+    new_index[heads] = np.arange(len(heads))
+    train_ids = graph.train_ids[heads]
+    train_offsets = np.zeros(graph.n_trains + 1, dtype=np.int64)
+    np.cumsum(np.bincount(train_ids, minlength=graph.n_trains), out=train_offsets[1:])
+
+    rows, positions = _row_positions(graph.successor_offsets, tails)
+    targets = new_index[graph.successors[positions]]
+    linked = targets >= 0
+    rows, targets = rows[linked], targets[linked]
+    successor_offsets = np.zeros(len(heads) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(heads)), out=successor_offsets[1:])
+
+    rows, positions = _row_positions(compiled.resource_offsets, tails)
+    used = used_resources[compiled.resource_ids[positions]]
+    rows, positions = rows[used], positions[used]
+    resource_offsets = np.zeros(len(heads) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(heads)), out=resource_offsets[1:])
+    resource_index = np.cumsum(used_resources) - 1
+
+    objective_nodes = new_index[compiled.train_offsets[compiled.objective_train] + compiled.objective_operation]
+    objectives = np.flatnonzero(objective_nodes >= 0)
+    objective_nodes = objective_nodes[objectives]
+    return CompiledInstance(
+        train_offsets=train_offsets,
+        start_lb=np.asarray(compiled.start_lb)[heads],
+        start_ub=np.asarray(compiled.start_ub)[heads],
+        min_duration=np.asarray(compiled.min_duration)[heads] if min_duration is None else min_duration,
+        successor_offsets=successor_offsets,
+        successors=targets - train_offsets[train_ids[targets]],
+        resource_offsets=resource_offsets,
+        resource_ids=resource_index[compiled.resource_ids[positions]],
+        release_times=np.asarray(compiled.release_times)[positions],
+        objective_train=train_ids[objective_nodes],
+        objective_operation=objective_nodes - train_offsets[train_ids[objective_nodes]],
+        objective_threshold=np.asarray(compiled.objective_threshold)[objectives],
+        objective_increment=np.asarray(compiled.objective_increment)[objectives],
+        objective_coeff=np.asarray(compiled.objective_coeff)[objectives],
+        resource_names=tuple(name for name, keep in zip(compiled.resource_names, used_resources.tolist()) if keep),
+    )
+
+
+def _row_positions(offsets: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Index into `rows` and position in the values of every entry of the CSR rows `rows`."""
+    starts, counts = offsets[rows], offsets[rows + 1] - offsets[rows]
+    row = np.repeat(np.arange(len(rows)), counts)
+    return row, np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + starts[row]
@@ -0,0 +1,261 @@
+import time
+from dataclasses import dataclass, replace
+from typing import Iterable
+
+import numpy as np
+
+from hackthetrack.dependencygraph.compact import CompactDependencyGraph
+from hackthetrack.dependencygraph.propagation import (
+    StartTimeBounds,
+    propagate_start_bounds,
+    topological_levels,
+    update_start_bounds,
+)
+from hackthetrack.displib.compiled_instance import CompiledInstance
+from hackthetrack.instrumentation import count, timed
+from hackthetrack.solution.objective import DelayObjective
+from hackthetrack.solution.schedule import Schedule
+from hackthetrack.solvers.large_neighbourhood_search import LnsHooks, LnsOptions, LnsResult, _LargeNeighbourhoodSearch
+
+
+@dataclass(frozen=True, slots=True)
+class BoundChange:
+    """New start bounds of a node, None keeps the current bound and NaN removes it."""
+
+    node: int
+    start_lb: float | None = None
+    start_ub: float | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class ResourceOutage:
+    """No train can use the resource in [begin, end)."""
+
+    resource: int
+    begin: float
+    end: float
+
+
+@dataclass(frozen=True, slots=True)
+class TrainInsertion:
+    """All trains and objective components of an instance; resources are matched by name."""
+
+    instance: CompiledInstance
+
+
+@dataclass(frozen=True, slots=True)
+class TrainRemoval:
+    train: int
+
+
+Disruption = BoundChange | ResourceOutage | TrainInsertion | TrainRemoval
+
+
+@dataclass(frozen=True, slots=True)
+class RepairResult:
+    rerouted_trains: np.ndarray
+    """In the order of their re-insertion."""
+    unrouted_trains: np.ndarray
+    """Trains without a route within their bounds around the other trains, retried after every later change."""
+    objective_value: float
+    """Infinite while a train is unrouted."""
+    seconds: float
+
+
+@dataclass(frozen=False, slots=True, init=False)
+class DispatchState:
+    """
+    A schedule that is kept up to date while the instance changes, without rebuilding it from json.
+
+    Disruptions are applied to the state's own copy of the graph. Only the trains they touch are removed and
+    re-inserted along their cheapest route around all other trains, which keep their routes and times; a train that
+    does not fit ejects the trains blocking it, which are re-inserted right after it, as in construct. Start bounds
+    are re-propagated over the cone of the changed nodes only and restrict the re-insertion. Removed trains stay in
+    the arrays without a route, so node and train indices remain valid; compacted() leaves them out.
+    """
+
+    _graph: CompactDependencyGraph
+    _objective: DelayObjective
+    _options: LnsOptions
+    _levels: np.ndarray
+    _bounds: StartTimeBounds
+    _search: _LargeNeighbourhoodSearch
+    _cancelled: set[int]
+    _unrouted: set[int]
+
+    def __init__(
+        self,
+        graph: CompactDependencyGraph,
+        objective: DelayObjective,
+        initial: Schedule | None = None,
+        options: LnsOptions = LnsOptions(),
+    ) -> None:
+        """Without an initial schedule the trains are inserted as in construct, i.e. with ejections and restarts."""
+        self._graph = replace(graph, start_lb=graph.start_lb.copy(), start_ub=graph.start_ub.copy())
+        self._objective, self._options = objective, options
+        self._levels = topological_levels(self._graph)
+        self._bounds = propagate_start_bounds(self._graph)
+        self._search = _LargeNeighbourhoodSearch(self._graph, objective, options)
+        self._search.set_bounds(
+            list(range(graph.n_count)), self._bounds.earliest.tolist(), self._bounds.latest.tolist()
+        )
+        self._cancelled, self._unrouted = set(), set()
+        if initial is None:
+            self._unrouted.update(self._search.construct()[1])
+        else:
+            self._unrouted.update(self._search.load(initial))
+
+    @property
+    def graph(self) -> CompactDependencyGraph:
+        return self._graph
+
+    @property
+    def objective(self) -> DelayObjective:
+        return self._objective
+
+    @property
+    def bounds(self) -> StartTimeBounds:
+        return self._bounds
+
+    @property
+    def cancelled_trains(self) -> np.ndarray:
+        return np.asarray(sorted(self._cancelled), dtype=np.int64)
+
+    @property
+    def unrouted_trains(self) -> np.ndarray:
+        return np.asarray(sorted(self._unrouted), dtype=np.int64)
+
+    def schedule(self) -> Schedule:
+        return self._search.schedule()
+
+    def apply(self, disruptions: Iterable[Disruption]) -> RepairResult:
+        """
+        Apply the changes in order and re-insert every train they touch, together with all unrouted trains.
+
+        A bound change touches the train of its node, an outage every train occupying the resource during it.
+        """
+        started = time.perf_counter()
+        with timed("redispatch.apply"):
+            touched, changed = set(), []
+            for disruption in disruptions:
+                if isinstance(disruption, BoundChange):
+                    if disruption.start_lb is not None:
+                        self._graph.start_lb[disruption.node] = disruption.start_lb
+                    if disruption.start_ub is not None:
+                        self._graph.start_ub[disruption.node] = disruption.start_ub
+                    changed.append(disruption.node)
+                    touched.add(int(self._graph.train_ids[disruption.node]))
+                elif isinstance(disruption, ResourceOutage):
+                    if not disruption.begin < disruption.end:
+                        raise ValueError(f"outage of resource {disruption.resource} ends before it begins")
+                    touched |= self._search.trains_in(disruption.resource, disruption.begin, disruption.end)
+                    self._search.block(disruption.resource, disruption.begin, disruption.end)
+                elif isinstance(disruption, TrainInsertion):
+                    n_trains = self._graph.n_trains
+                    self._insert(disruption.instance)
+                    touched.update(range(n_trains, self._graph.n_trains))
+                else:
+                    self._search.remove(disruption.train)
+                    self._cancelled.add(disruption.train)
+                    self._unrouted.discard(disruption.train)
+            nodes = update_start_bounds(self._graph, self._bounds, self._levels, changed)
+            self._search.set_bounds(
+                nodes.tolist(), self._bounds.earliest[nodes].tolist(), self._bounds.latest[nodes].tolist()
+            )
+            rerouted = self._repair(touched | self._unrouted)
+        return RepairResult(
+            rerouted_trains=np.asarray(rerouted, dtype=np.int64),
+            unrouted_trains=self.unrouted_trains,
+            objective_value=self._objective_value(self.schedule()),
+            seconds=time.perf_counter() - started,
+        )
+
+    def reoptimise(self, time_limit: float | None = None, hooks: LnsHooks = LnsHooks()) -> LnsResult:
+        """Continue the large-neighbourhood search from the current schedule, by default for options.time_limit."""
+        started = time.perf_counter()
+        iterations, improvements = self._search.iterations, self._search.improvements
+        with timed("redispatch.reoptimise"):
+            self._search.run(started + (self._options.time_limit if time_limit is None else time_limit), hooks)
+            if self._unrouted:
+                self._repair(set(self._unrouted))
+        schedule = self.schedule()
+        return LnsResult(
+            schedule=schedule,
+            objective_value=self._objective_value(schedule),
+            iterations=self._search.iterations - iterations,
+            improvements=self._search.improvements - improvements,
+            seconds=time.perf_counter() - started,
+            unrouted_trains=self.unrouted_trains,
+        )
+
+    def compacted(self) -> tuple[CompactDependencyGraph, DelayObjective, Schedule]:
+        """The instance without the removed trains and the current schedule of it, e.g. to verify or export it."""
+        trains = np.setdiff1d(np.arange(self._graph.n_trains), self.cancelled_trains)
+        kept = np.flatnonzero(np.isin(self._graph.train_ids, trains))
+        index = np.full(self._graph.n_count + 1, -1, dtype=np.int64)  # the last entry maps next_node -1 to -1
+        index[kept] = np.arange(len(kept))
+        schedule = self.schedule()
+        objective_nodes = index[self._objective.nodes]
+        components = objective_nodes >= 0
+        return (
+            self._graph.select_trains(trains),
+            DelayObjective(
+                nodes=objective_nodes[components],
+                threshold=self._objective.threshold[components],
+                increment=self._objective.increment[components],
+                coeff=self._objective.coeff[components],
+            ),
+            Schedule(start=schedule.start[kept], next_node=index[schedule.next_node[kept]]),
+        )
+
+    def _insert(self, instance: CompiledInstance) -> None:
+        added = CompactDependencyGraph.from_compiled_instance(instance)
+        added_objective = DelayObjective.from_compiled_instance(instance)
+        added_bounds = propagate_start_bounds(added)
+        first = self._graph.n_count
+        self._graph = self._graph.extended(added)
+        self._objective = DelayObjective(
+            nodes=np.concatenate([self._objective.nodes, added_objective.nodes + first]),
+            threshold=np.concatenate([self._objective.threshold, added_objective.threshold]),
+            increment=np.concatenate([self._objective.increment, added_objective.increment]),
+            coeff=np.concatenate([self._objective.coeff, added_objective.coeff]),
+        )
+        self._levels = np.concatenate([self._levels, topological_levels(added)])
+        self._bounds = StartTimeBounds(
+            earliest=np.concatenate([self._bounds.earliest, added_bounds.earliest]),
+            latest=np.concatenate([self._bounds.latest, added_bounds.latest]),
+        )
+        self._search.extend(self._graph, self._objective)
+        self._search.set_bounds(
+            list(range(first, self._graph.n_count)), added_bounds.earliest.tolist(), added_bounds.latest.tolist()
+        )
+
+    def _objective_value(self, schedule: Schedule) -> float:
+        return np.inf if self._unrouted else self._objective.evaluate(schedule.start)
+
+    def _repair(self, trains: Iterable[int]) -> list[int]:
+        """
+        Remove the trains and re-insert them in order of their earliest start, returns all re-inserted trains.
+
+        A train without a route around the others ejects the trains blocking it, see insert_with_ejections. If trains
+        are left over, all trains are inserted anew as in construct and that schedule is kept if it routes more.
+        """
+        first, earliest = self._graph.train_offsets, self._bounds.earliest
+        trains = sorted(set(trains) - self._cancelled, key=lambda train: earliest[first[train]])
+        for train in trains:
+            self._search.remove(train)
+        rerouted, unrouted = self._search.insert_with_ejections(trains, self._bounds)
+        if unrouted:  # e.g. two trains ejecting each other, build the whole schedule anew unless that routes fewer
+            count("redispatch.reconstructions")
+            trains = [train for train in range(self._graph.n_trains) if train not in self._cancelled]
+            previous = self._search.placements(trains)
+            for train in trains:
+                self._search.remove(train)
+            constructed = self._search.construct(trains)
+            if len(constructed[1]) < len(unrouted):
+                rerouted, unrouted = constructed
+            else:
+                self._search.restore(previous)
+        self._unrouted = (self._unrouted - set(rerouted)) | set(unrouted)
+        count("redispatch.rerouted trains", len(rerouted))
+        return rerouted
@@ -1,63 +1,184 @@
-from dataclasses import dataclass
+import math
+import sqlite3
+from contextlib import closing, contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator, Literal
 
+import pandas as pd
 import yaml
 
 LOGGING_PATH = Path("out/statistics")
+DATABASE_NAME = "statistics.sqlite"
+
+
+@dataclass(frozen=False, slots=True)
+class StatisticsBatch:
+    """Updates and deletions collected by StatisticsLogger.batch, later operations win over earlier ones."""
+
+    updates: dict[str, dict[str, Any]] = field(default_factory=dict)
+    deletions: dict[str, set[str]] = field(default_factory=dict)
+    deletions_on_all_instances: set[str] = field(default_factory=set)
+
+    def update_instance(self, instance_name: str, key: str, value: Any) -> None:
+        self.updates.setdefault(instance_name, {})[key] = value
+        self.deletions.get(instance_name, set()).discard(key)
+
+    def delete_key(self, instance_name: str, key: str) -> None:
+        self.updates.get(instance_name, {}).pop(key, None)
+        self.deletions.setdefault(instance_name, set()).add(key)
+
+    def delete_key_on_all_instances(self, key: str) -> None:
+        for updates in self.updates.values():
+            updates.pop(key, None)
+        self.deletions_on_all_instances.add(key)
+
+    def apply(self, instance_name: str, data: dict) -> dict:
+        """The statistics of an instance after this batch, `data` holds them before."""
+        deleted = self.deletions_on_all_instances | self.deletions.get(instance_name, set())
+        data = {key: value for key, value in data.items() if key not in deleted}
+        data.update(self.updates.get(instance_name, {}))
+        return data
 
 
 @dataclass(frozen=True, slots=True)
 class StatisticsLogger:
+    """
+    Statistics per instance, either as one YAML file per instance or as one SQLite table for all instances.
+
+    Every single update reads and writes the store, use batch() to collect many updates and write them at once.
+    """
+
     base_path: Path = LOGGING_PATH
+    backend: Literal["yaml", "sqlite"] = "yaml"
 
-    def __post_init__(self):
+    def __post_init__(self) -> None:
         self.base_path.mkdir(exist_ok=True, parents=True)
+        if self.backend == "sqlite":
+            with closing(sqlite3.connect(self.database_path)) as connection:
+                with connection:  # commits or rolls back, closing is left to closing()
+                    connection.execute(
+                        "CREATE TABLE IF NOT EXISTS statistics "
+                        "(instance TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (instance, key))"
+                    )
+
+    @property
+    def database_path(self) -> Path:
+        return self.base_path / DATABASE_NAME
 
     def _get_instance_file(self, instance_name: str) -> Path:
         return self.base_path / f"{instance_name}.yaml"
 
+    @contextmanager
+    def batch(self) -> Iterator[StatisticsBatch]:
+        """
+        Collect updates and deletions and write them once when the block completes.
+
+        Every instance file is read and written at most once. Nothing is written if the block raises.
+        """
+        batch = StatisticsBatch()
+        yield batch
+        self.flush(batch)
+
+    def flush(self, batch: StatisticsBatch) -> None:
+        if self.backend == "sqlite":
+            self._flush_to_database(batch)
+            return
+        instance_names = set(batch.updates) | set(batch.deletions)
+        if batch.deletions_on_all_instances:
+            instance_names.update(instance_file.stem for instance_file in self.base_path.glob("*.yaml"))
+        for instance_name in sorted(instance_names):
+            data = self.load_instance_data(instance_name)
+            updated = batch.apply(instance_name, data)
+            if updated != data:
+                with open(self._get_instance_file(instance_name), "w") as f:
+                    yaml.dump(updated, f)
+
+    def _flush_to_database(self, batch: StatisticsBatch) -> None:
+        with closing(sqlite3.connect(self.database_path)) as connection:
+            with connection:
+                connection.executemany(
+                    "DELETE FROM statistics WHERE key = ?", [(key,) for key in batch.deletions_on_all_instances]
+                )
+                connection.executemany(
+                    "DELETE FROM statistics WHERE instance = ? AND key = ?",
+                    [(instance_name, key) for instance_name, keys in batch.deletions.items() for key in keys],
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO statistics (instance, key, value) VALUES (?, ?, ?)",
+                    [
+                        (instance_name, key, yaml.dump(value))
+                        for instance_name, updates in batch.updates.items()
+                        for key, value in updates.items()
+                    ],
+                )
+
     def update_instance(self, instance_name: str, key: str, value: Any) -> None:
         """
-        Update or add information for a specific key in the instance's YAML file.
+        Update or add information for a specific key in the instance's statistics.
 
         If the file or the key does not exist, it is created.
         """
-        data = self.load_instance_data(instance_name)
-        data[key] = value
-
-        with open(self._get_instance_file(instance_name), "w") as f:
-            yaml.dump(data, f)
+        with self.batch() as batch:
+            batch.update_instance(instance_name, key, value)
 
     def load_instance_data(self, instance_name: str) -> dict:
         """
         Retrieve all data for a given instance.
-        Returns an empty dictionary if the file does not exist.
+        Returns an empty dictionary if there is no data for the instance.
         """
+        if self.backend == "sqlite":
+            with closing(sqlite3.connect(self.database_path)) as connection:
+                rows = connection.execute("SELECT key, value FROM statistics WHERE instance = ?", (instance_name,))
+                return {key: yaml.safe_load(value) for key, value in rows}
         file_path = self._get_instance_file(instance_name)
         if file_path.exists():
             with open(file_path, "r") as f:
                 return yaml.safe_load(f) or {}
         return {}
 
-    def delete_key(self, instance_name: str, key: str):
+    def delete_key(self, instance_name: str, key: str) -> None:
         """
-        Delete a key from the instance's YAML file.
+        Delete a key from the instance's statistics.
         If the key does not exist, nothing happens.
         """
-        data = self.load_instance_data(instance_name)
-        if key in data:
-            del data[key]
-            with open(self._get_instance_file(instance_name), "w") as f:
-                yaml.dump(data, f)
+        with self.batch() as batch:
+            batch.delete_key(instance_name, key)
 
-    def delete_key_on_all_instances(self, key: str):
+    def delete_key_on_all_instances(self, key: str) -> None:
         """
         Delete a key from all instances.
         If the key does not exist in any instance, nothing happens.
         """
-        for instance_file in self.base_path.glob("*.yaml"):
-            self.delete_key(instance_file.stem, key)
+        with self.batch() as batch:
+            batch.delete_key_on_all_instances(key)
+
+    def to_frame(self) -> pd.DataFrame:
+        """All statistics as one table with a row per instance and a column per key, missing values are NaN."""
+        if self.backend == "sqlite":
+            with closing(sqlite3.connect(self.database_path)) as connection:
+                rows = pd.read_sql_query("SELECT instance, key, value FROM statistics", connection)
+            rows["value"] = rows["value"].map(yaml.safe_load)
+            return rows.pivot(index="instance", columns="key", values="value")
+        data = {
+            instance_file.stem: self.load_instance_data(instance_file.stem)
+            for instance_file in self.base_path.glob("*.yaml")
+        }
+        return pd.DataFrame.from_dict(data, orient="index").sort_index()
+
+    def export_yaml(self, path: Path | None = None) -> None:
+        """Write the statistics of every instance to a YAML file, the format used by the yaml backend."""
+        path = self.base_path if path is None else path
+        yaml_logger = StatisticsLogger(base_path=path)
+        with yaml_logger.batch() as batch:
+            for instance_name, row in self.to_frame().iterrows():
+                for key, value in row.items():
+                    if not _is_missing(value):
+                        batch.update_instance(str(instance_name), str(key), value)
+
+
+def _is_missing(value: Any) -> bool:
+    return isinstance(value, float) and math.isnan(value)  # NaN fills keys an instance does not have
 
 
 if __name__ == "__main__":
@@ -0,0 +1,43 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from hackthetrack.dependencygraph import CompactDependencyGraph, DependencyGraph
+from hackthetrack.displib import CompiledInstance, DisplibInstance
+
+PATH = Path("src/hackthetrack_tests/dependencygraph_test/data/displib_testinstances_headway1.json")
+
+
+class TestCompactGraph(unittest.TestCase):
+
+    def test_graph_creation(self) -> None:
+        graph = CompactDependencyGraph.from_compiled_instance(CompiledInstance.from_json(PATH, cache_directory=None))
+        self.assertEqual(graph.n_count, 8)
+        self.assertEqual(graph.l_count, 6)
+        self.assertEqual(graph.node_index(1, 2), 6)
+        np.testing.assert_array_equal(graph.successors_of(5), [6])
+        np.testing.assert_array_equal(graph.predecessors_of(6), [5])
+        self.assertEqual(len(graph.predecessors_of(4)), 0)
+        self.assertEqual(graph.resource_names[graph.resources_of(6)[0]], "r1")
+
+    def test_extend_and_select_trains(self) -> None:
+        graph = CompactDependencyGraph.from_compiled_instance(CompiledInstance.from_json(PATH, cache_directory=None))
+        extended = graph.extended(graph)
+        self.assertEqual((extended.n_trains, extended.n_count, extended.l_count), (4, 16, 12))
+        self.assertEqual(extended.resource_names, graph.resource_names)
+        np.testing.assert_array_equal(extended.successors_of(13), graph.successors_of(5) + 8)
+        selected = extended.select_trains(np.array([3, 2]))
+        for field in ["train_offsets", "train_ids", "successors", "predecessors", "resource_ids", "release_times"]:
+            np.testing.assert_array_equal(getattr(selected, field), getattr(graph, field))
+        only_second = graph.select_trains(np.array([1]))
+        np.testing.assert_array_equal(only_second.successors, [1, 2, 3])
+        np.testing.assert_array_equal(only_second.predecessors_of(2), [1])
+
+    def test_matches_dependency_graph(self) -> None:
+        instance = DisplibInstance.from_json(PATH)
+        network = DependencyGraph.from_displib_instance(instance)
+        converted = CompactDependencyGraph.from_displib_instance(instance).to_dependency_graph()
+        self.assertEqual(converted.node_ids, network.node_ids)
+        self.assertEqual(converted.all_nodes, network.all_nodes)
+        self.assertEqual(list(converted.end_node_id_pair_iterator), list(network.end_node_id_pair_iterator))
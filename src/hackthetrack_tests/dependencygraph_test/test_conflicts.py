@@ -0,0 +1,59 @@
+import unittest
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.dependencygraph.conflicts import ResourceConflictIndex
+from hackthetrack.displib import CompiledInstance, DisplibInstance
+from hackthetrack.displib.synthetic import GeneratorOptions, generate_instance
+from hackthetrack.solution import DelayObjective
+from hackthetrack.solution.occupancy import schedule_occupations
+from hackthetrack.solvers import LnsOptions, solve_with_lns
+
+PATH = Path("src/hackthetrack_tests/dependencygraph_test/data/displib_testinstances_headway1.json")
+
+
+class TestResourceConflictIndex(unittest.TestCase):
+
+    def test_unbounded_windows_conflict(self) -> None:
+        graph = CompactDependencyGraph.from_compiled_instance(CompiledInstance.from_json(PATH, cache_directory=None))
+        conflicts = ResourceConflictIndex.from_graph(graph).conflicts()
+        np.testing.assert_array_equal(conflicts.node_pairs(), [[1, 5], [2, 6]])
+        np.testing.assert_array_equal(conflicts.train_pairs(graph), [[0, 1]])
+
+    def test_disjoint_windows_do_not_conflict(self) -> None:
+        compiled = CompiledInstance.from_json(PATH, cache_directory=None)
+        compiled = replace(
+            compiled,
+            start_lb=np.array([np.nan, np.nan, np.nan, np.nan, 100, 100, 100, 100]),
+            start_ub=np.array([0, 0, 5, 10, np.nan, np.nan, np.nan, np.nan]),
+        )
+        graph = CompactDependencyGraph.from_compiled_instance(compiled)
+        # train 0 leaves r1 at 10 at the latest, released at 19, train 1 arrives at 100 at the earliest
+        self.assertEqual(len(ResourceConflictIndex.from_graph(graph).conflicts()), 0)
+        # with a release time ending after the arrival of train 1 the windows overlap again
+        graph = replace(graph, release_times=np.array([9.0, 100.0, 9.0, 9.0]))
+        np.testing.assert_array_equal(ResourceConflictIndex.from_graph(graph).conflicts().node_pairs(), [[2, 6]])
+
+    def test_horizon_bounds_windows(self) -> None:
+        instance = DisplibInstance.from_parsed_json(generate_instance(GeneratorOptions(n_trains=20)))
+        compiled = CompiledInstance.from_displib_instance(instance)
+        graph = CompactDependencyGraph.from_compiled_instance(compiled)
+        result = solve_with_lns(graph, DelayObjective.from_compiled_instance(compiled), LnsOptions(max_iterations=0))
+        horizon = float(np.nanmax(result.schedule.start))
+        unbounded = ResourceConflictIndex.from_graph(graph)
+        bounded = ResourceConflictIndex.from_graph(graph, horizon=horizon)
+        self.assertTrue(np.all(np.isfinite(bounded.window_end)))
+        all_pairs = {tuple(pair) for pair in unbounded.conflicts().node_pairs().tolist()}
+        pairs = {tuple(pair) for pair in bounded.conflicts().node_pairs().tolist()}
+        self.assertLessEqual(pairs, all_pairs)
+        # the schedule finishes by the horizon, so all its occupations lie within the bounded windows
+        nodes, resources, begins, releases = schedule_occupations(graph, result.schedule)
+        use_resources = np.repeat(np.arange(bounded.n_resources), np.diff(bounded.use_offsets))
+        use_keys = bounded.use_nodes * bounded.n_resources + use_resources
+        order = np.argsort(use_keys)
+        uses = order[np.searchsorted(use_keys, nodes * bounded.n_resources + resources, sorter=order)]
+        np.testing.assert_array_less(bounded.window_begin[uses] - 1e-9, begins)
+        np.testing.assert_array_less(releases, bounded.window_end[uses] + 1e-9)
@@ -0,0 +1,50 @@
+import unittest
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.dependencygraph.propagation import (
+    cheapest_completion,
+    mandatory_nodes,
+    propagate_start_bounds,
+    topological_levels,
+    update_start_bounds,
+)
+from hackthetrack.displib import CompiledInstance
+
+PATH = Path("src/hackthetrack_tests/dependencygraph_test/data/displib_testinstances_headway1.json")
+
+
+class TestPropagation(unittest.TestCase):
+
+    def test_levels(self) -> None:
+        graph = CompactDependencyGraph.from_compiled_instance(CompiledInstance.from_json(PATH, cache_directory=None))
+        np.testing.assert_array_equal(topological_levels(graph), [0, 1, 2, 3, 0, 1, 2, 3])
+
+    def test_bounds(self) -> None:
+        compiled = CompiledInstance.from_json(PATH, cache_directory=None)
+        compiled = replace(compiled, start_lb=np.array([np.nan, 3, np.nan, np.nan, np.nan, np.nan, 20, np.nan]))
+        compiled = replace(compiled, start_ub=np.array([0, np.nan, np.nan, 12, 0, np.nan, np.nan, np.nan]))
+        bounds = propagate_start_bounds(CompactDependencyGraph.from_compiled_instance(compiled))
+        np.testing.assert_array_equal(bounds.earliest, [0, 3, 8, 13, 0, 0, 20, 25])
+        np.testing.assert_array_equal(bounds.latest, [0, 2, 7, 12, 0, np.inf, np.inf, np.inf])
+        np.testing.assert_array_equal(bounds.feasible, [True, False, False, False, True, True, True, True])
+
+    def test_update_only_the_cone(self) -> None:
+        graph = CompactDependencyGraph.from_compiled_instance(CompiledInstance.from_json(PATH, cache_directory=None))
+        graph = replace(graph, start_lb=graph.start_lb.copy(), start_ub=graph.start_ub.copy())
+        bounds = propagate_start_bounds(graph)
+        graph.start_lb[[0, 1, 6]] = [np.nan, 3, 20]
+        graph.start_ub[[0, 3, 4]] = [0, 12, 0]
+        changed = update_start_bounds(graph, bounds, topological_levels(graph), [0, 1, 3, 4, 6])
+        expected = propagate_start_bounds(graph)
+        np.testing.assert_array_equal(bounds.earliest, expected.earliest)
+        np.testing.assert_array_equal(bounds.latest, expected.latest)
+        np.testing.assert_array_equal(changed, [1, 2, 3, 6, 7])
+
+    def test_cheapest_completion_and_mandatory_nodes(self) -> None:
+        graph = CompactDependencyGraph.from_compiled_instance(CompiledInstance.from_json(PATH, cache_directory=None))
+        np.testing.assert_array_equal(cheapest_completion(graph, graph.min_duration), [15, 15, 10, 5, 15, 15, 10, 5])
+        self.assertTrue(np.all(mandatory_nodes(graph)))
@@ -0,0 +1,68 @@
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from hackthetrack.dependencygraph import CompactDependencyGraph, RouteIndex
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.displib.synthetic import GeneratorOptions, generate_instance
+
+
+class TestRoutes(unittest.TestCase):
+
+    def setUp(self) -> None:
+        options = GeneratorOptions(n_trains=4, n_sections=10, station_every=3, station_tracks=2, seed=2)
+        compiled = CompiledInstance.from_stream(io.StringIO(json.dumps(generate_instance(options))))
+        self.graph = CompactDependencyGraph.from_compiled_instance(compiled)
+
+    def _all_routes(self, train: int) -> list[list[int]]:
+        routes, stack = [], [[int(self.graph.train_offsets[train])]]
+        while stack:
+            route = stack.pop()
+            successors = self.graph.successors_of(route[-1]).tolist()
+            routes.extend([route] if not successors else [])
+            stack.extend(route + [successor] for successor in successors)
+        return routes
+
+    def test_k_fastest_routes(self) -> None:
+        index = RouteIndex.from_graph(self.graph, k=3)
+        for train in range(self.graph.n_trains):
+            routes = self._all_routes(train)
+            durations = sorted(float(self.graph.min_duration[route].sum()) for route in routes)
+            np.testing.assert_array_equal(index.durations[index.routes_of(train)], durations[:3])
+            self.assertEqual(index.complete[train], len(routes) <= 3)
+            for route in index.routes_of(train):
+                self.assertIn(index.nodes(route).tolist(), routes)
+                used = np.unique(np.concatenate([self.graph.resources_of(node) for node in index.nodes(route)]))
+                np.testing.assert_array_equal(index.resources(route), used)
+        self.assertLess(len(index.segment_node_offsets) - 1, self.graph.n_count)
+
+    def test_lookups(self) -> None:
+        index = RouteIndex.from_graph(self.graph, k=4)
+        fastest = index.fastest_routes()
+        np.testing.assert_array_equal(fastest, index.route_offsets[:-1])
+        resources = index.resources(fastest[0])
+        self.assertEqual(len(index.routes_avoiding(0, index.resource_mask(resources))), 0)
+        np.testing.assert_array_equal(
+            index.routes_avoiding(0, index.resource_mask(np.asarray([], dtype=np.int64))), list(index.routes_of(0))
+        )
+        np.testing.assert_array_equal(index.shared_resources(fastest[0], fastest[0]), resources)
+
+    def test_memoized_and_cached_on_disk(self) -> None:
+        self.assertIs(RouteIndex.from_graph(self.graph, k=2), RouteIndex.from_graph(self.graph, k=2))
+        with tempfile.TemporaryDirectory() as directory:
+            built = RouteIndex.from_graph(self.graph, k=5, cache_directory=Path(directory))
+            loaded = RouteIndex.load(next(Path(directory).glob("*.npz")))
+        self.assertEqual(loaded.k, 5)
+        for name in ["route_offsets", "route_segments", "durations", "footprints", "complete", "segment_nodes"]:
+            np.testing.assert_array_equal(getattr(loaded, name), getattr(built, name))
+
+    def test_memo_hit_writes_missing_cache_file(self) -> None:
+        memoized = RouteIndex.from_graph(self.graph, k=6)
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIs(RouteIndex.from_graph(self.graph, k=6, cache_directory=Path(directory)), memoized)
+            loaded = RouteIndex.load(next(Path(directory).glob("*.npz")))
+        np.testing.assert_array_equal(loaded.footprints, memoized.footprints)
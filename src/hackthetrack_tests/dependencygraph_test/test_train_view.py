@@ -0,0 +1,29 @@
+import unittest
+from pathlib import Path
+
+from hackthetrack.dependencygraph import DependencyGraph
+from hackthetrack.displib import DisplibInstance
+
+PATH = Path("src/hackthetrack_tests/dependencygraph_test/data/displib_testinstances_headway1.json")
+
+
+class TestTrainView(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.network = DependencyGraph.from_displib_instance(DisplibInstance.from_json(PATH))
+
+    def test_trains_cover_all_nodes(self) -> None:
+        views = list(self.network.trains())
+        self.assertEqual([(view.train_id, view.first, view.stop) for view in views], [(0, 0, 4), (1, 4, 8)])
+        self.assertEqual([node for view in views for node in view.nodes()], self.network.all_nodes)
+
+    def test_local_indices(self) -> None:
+        view = self.network.train(1)
+        self.assertEqual(view.n_operations, 4)
+        self.assertEqual(view.node(2), self.network.node_by_train_id_and_index(1, 2))
+        self.assertEqual([node.index for node in view.nodes()], [0, 1, 2, 3])
+        self.assertEqual(view.successors(2), [3])
+
+    def test_dfs_matches_weak_components(self) -> None:
+        for view, component in zip(self.network.trains(), self.network.weak_components()):
+            self.assertEqual(list(view.dfs()), list(zip(*component.underlying_digraph.dfs(0))))
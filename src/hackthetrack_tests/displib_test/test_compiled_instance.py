@@ -0,0 +1,31 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from hackthetrack.displib import CompiledInstance, DisplibInstance
+
+PATH = Path("src/hackthetrack_tests/dependencygraph_test/data/displib_testinstances_headway1.json")
+
+
+class TestCompiledInstance(unittest.TestCase):
+
+    def test_arrays(self) -> None:
+        compiled = CompiledInstance.from_json(PATH, cache_directory=None)
+        self.assertEqual(compiled.n_trains, 2)
+        self.assertEqual(compiled.n_operations, 8)
+        self.assertEqual(compiled.resource_names, ("r0", "r1"))
+        np.testing.assert_array_equal(compiled.train_offsets, [0, 4, 8])
+        np.testing.assert_array_equal(compiled.resource_ids, [0, 1, 0, 1])
+        self.assertTrue(np.isnan(compiled.start_lb[0]))
+
+    def test_round_trip_through_cache(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = Path(tmp)
+            first = CompiledInstance.from_json(PATH, cache)
+            second = CompiledInstance.from_json(PATH, cache)
+            self.assertEqual(len(list(cache.iterdir())), 1)
+            self.assertIsInstance(second.successors, np.memmap)
+            np.testing.assert_array_equal(first.successors, second.successors)
+            self.assertEqual(DisplibInstance.from_json(PATH, cache), DisplibInstance.from_json(PATH))
@@ -0,0 +1,42 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from hackthetrack.displib import CompiledInstance, DisplibInstance, ResourceRegistry
+
+PATH = Path("src/hackthetrack_tests/dependencygraph_test/data/displib_testinstances_headway1.json")
+
+
+class TestResourceRegistry(unittest.TestCase):
+
+    def test_lookups(self) -> None:
+        registry = ResourceRegistry(["r0", "r1"])
+        self.assertEqual(registry.add("r2"), 2)
+        self.assertEqual(registry.add("r0"), 0)
+        self.assertEqual(len(registry), 3)
+        self.assertEqual(registry.id_of("r1"), 1)
+        self.assertEqual(registry.name_of(2), "r2")
+        self.assertIn("r2", registry)
+        self.assertNotIn("r3", registry)
+        with self.assertRaises(KeyError):
+            registry.id_of("r3")
+
+    def test_resources_are_interned(self) -> None:
+        registry = ResourceRegistry()
+        first = registry.intern("r0", 5.0)
+        self.assertIs(registry.intern("r0", 5.0), first)
+        self.assertIsNot(registry.intern("r0", 0.0), first)
+        self.assertEqual(registry.intern("r1", 5.0).id, 1)
+
+    def test_ids_match_compiled_instance(self) -> None:
+        instance = DisplibInstance.from_json(PATH)
+        compiled = CompiledInstance.from_displib_instance(instance)
+        self.assertEqual(instance.resources.names, compiled.resource_names)
+        ids = [resource.id for train in instance.trains for op in train["operations"] for resource in op.resources]
+        np.testing.assert_array_equal(compiled.resource_ids, ids)
+        self.assertEqual(compiled.to_displib_instance(), instance)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import io
+import json
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from hackthetrack.displib import CompiledInstance, DisplibInstance
+from hackthetrack.displib.streaming import iter_displib_json
+
+PATH = Path("src/hackthetrack_tests/dependencygraph_test/data/displib_testinstances_headway1.json")
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_elements_match_json_load(self) -> None:
+        text = PATH.read_text()
+        parsed = json.loads(text)
+        for chunk_size in (1, 7, 1 << 20):
+            items = list(iter_displib_json(io.StringIO(text), chunk_size))
+            self.assertEqual([value for key, value in items if key == "trains"], parsed["trains"])
+            self.assertEqual([value for key, value in items if key == "objective"], parsed["objective"])
+
+    def test_numbers_split_across_chunks(self) -> None:
+        text = '{"objective": [{"coeff": 12345}], "trains": [], "extra": 6789}'
+        self.assertEqual(
+            list(iter_displib_json(io.StringIO(text), 3)), [("objective", {"coeff": 12345}), ("extra", 6789)]
+        )
+
+    def test_malformed_json(self) -> None:
+        with self.assertRaises(ValueError):
+            list(iter_displib_json(io.StringIO('["trains"]')))
+        with self.assertRaises(ValueError):
+            list(iter_displib_json(io.StringIO('{"trains": [[{"resources": []}'), 4))
+
+    def test_instances_from_stream(self) -> None:
+        with open(PATH, "r") as file:
+            streamed = DisplibInstance.from_stream(file)
+        with open(PATH, "r") as file:
+            self.assertEqual(streamed, DisplibInstance.from_parsed_json(json.load(file)))
+        with open(PATH, "r") as file:
+            compiled = CompiledInstance.from_stream(file)
+        expected = CompiledInstance.from_json(PATH, cache_directory=None)
+        np.testing.assert_array_equal(compiled.successors, expected.successors)
+        np.testing.assert_array_equal(compiled.start_lb, expected.start_lb)
+        self.assertEqual(compiled.resource_names, expected.resource_names)
+
+
+if __name__ == "__main__":
+    unittest.main()
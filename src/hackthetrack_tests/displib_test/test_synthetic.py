@@ -0,0 +1,43 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.displib import CompiledInstance, DisplibInstance
+from hackthetrack.displib.synthetic import GeneratorOptions, generate_instance, write_instance
+from hackthetrack.solution import DelayObjective, verify_schedule
+from hackthetrack.solvers import LnsOptions, solve_with_lns
+
+
+class TestSyntheticInstances(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / "instance.json"
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_reproducible_from_seed(self) -> None:
+        options = GeneratorOptions(n_trains=20, n_corridors=2, seed=3)
+        self.assertEqual(generate_instance(options), generate_instance(options))
+        self.assertNotEqual(generate_instance(options), generate_instance(options._replace(seed=4)))
+        write_instance(self.path, options)
+        with open(self.path) as file:
+            self.assertEqual(json.load(file), generate_instance(options))
+
+    def test_readable_and_feasible(self) -> None:
+        options = GeneratorOptions(n_trains=15, n_sections=10, station_tracks=3, objective_share=1.0)
+        write_instance(self.path, options)
+        instance = DisplibInstance.from_json(self.path)
+        self.assertEqual(len(instance.trains), 15)
+        last_operations = sum(
+            not operation.successors for train in instance.trains for operation in train["operations"]
+        )
+        self.assertEqual(len(instance.objectives), last_operations)
+
+        compiled = CompiledInstance.from_json(self.path, cache_directory=None)
+        graph = CompactDependencyGraph.from_compiled_instance(compiled)
+        result = solve_with_lns(graph, DelayObjective.from_compiled_instance(compiled), LnsOptions(max_iterations=0))
+        self.assertTrue(verify_schedule(graph, result.schedule).feasible)
@@ -0,0 +1,47 @@
+from pathlib import Path
+from typing import NamedTuple
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.solution import DelayObjective
+
+HEADWAY1 = Path("src/hackthetrack_tests/dependencygraph_test/data/displib_testinstances_headway1.json")
+
+# parsed DISPLIB json: train 0 cannot start its use of r0 and uses r1 twice, r2 is used by train 1 only
+TWO_TRAINS = {
+    "trains": [
+        [
+            {"start_ub": 0, "min_duration": 0, "successors": [1, 2]},
+            {"start_lb": 10, "start_ub": 5, "min_duration": 5, "resources": [{"resource": "r0"}], "successors": [3]},
+            {"min_duration": 5, "resources": [{"resource": "r1", "release_time": 2}], "successors": [3]},
+            {"min_duration": 5, "resources": [{"resource": "r1", "release_time": 2}], "successors": [4]},
+            {"min_duration": 0, "successors": []},
+        ],
+        [
+            {"start_ub": 0, "min_duration": 0, "successors": [1]},
+            {"min_duration": 3, "resources": [{"resource": "r1", "release_time": 2}], "successors": [2]},
+            {"min_duration": 3, "resources": [{"resource": "r2"}], "successors": [3]},
+            {"min_duration": 1, "successors": []},
+        ],
+    ],
+    "objective": [
+        {"type": "op_delay", "train": 0, "operation": 4, "coeff": 1},
+        {"type": "op_delay", "train": 1, "operation": 3, "coeff": 1},
+    ],
+}
+
+
+class LoadedInstance(NamedTuple):
+    compiled: CompiledInstance
+    graph: CompactDependencyGraph
+    objective: DelayObjective
+
+
+def load_instance(path: Path = HEADWAY1) -> LoadedInstance:
+    """Compile a test instance without the binary cache, together with its graph and delay objective."""
+    compiled = CompiledInstance.from_json(path, cache_directory=None)
+    return LoadedInstance(
+        compiled,
+        CompactDependencyGraph.from_compiled_instance(compiled),
+        DelayObjective.from_compiled_instance(compiled),
+    )
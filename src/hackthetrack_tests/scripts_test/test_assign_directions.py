@@ -0,0 +1,44 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from hackthetrack_tests.instances import load_instance
+from scripts.assign_directions import LayoutOptions, resource_adjacency, use_igraph_to_update_x_and_y_coordinates
+
+
+class TestAssignDirections(unittest.TestCase):
+
+    def setUp(self) -> None:
+        _, graph, _ = load_instance()
+        self.network = graph.to_dependency_graph()
+
+    def _coordinates(self) -> np.ndarray:
+        return np.asarray([[node.coordinates.x, node.coordinates.y] for node in self.network.all_nodes])
+
+    def test_resource_adjacency(self) -> None:
+        n_resources, pairs, counts = resource_adjacency(self.network)
+        # both trains run from r0 straight into r1
+        self.assertEqual(n_resources, 2)
+        np.testing.assert_array_equal(pairs, [[0, 1]])
+        np.testing.assert_array_equal(counts, [2])
+
+    def test_layout_cache(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            options = LayoutOptions(niter=50, cache_directory=Path(directory))
+            use_igraph_to_update_x_and_y_coordinates(self.network, options)
+            self.assertEqual(len(list(Path(directory).glob("*.npy"))), 1)
+            laid_out = self._coordinates()
+            self.assertTrue(np.all(np.isnan(laid_out[[0, 3, 4, 7]])))
+            np.testing.assert_array_equal(laid_out[1], laid_out[5])  # both trains use r0 only
+
+            use_igraph_to_update_x_and_y_coordinates(self.network, options)
+            np.testing.assert_array_equal(self._coordinates(), laid_out)
+
+    def test_truncated_layout_not_cached(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            options = LayoutOptions(niter=2000, time_limit=0.0, cache_directory=Path(directory))
+            use_igraph_to_update_x_and_y_coordinates(self.network, options)
+            self.assertEqual(list(Path(directory).glob("*.npy")), [])
+            self.assertFalse(np.any(np.isnan(self._coordinates()[[1, 2, 5, 6]])))
@@ -0,0 +1,31 @@
+import json
+import time
+import unittest
+from pathlib import Path
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.displib.streaming import open_displib_json
+from hackthetrack.solvers import dispatch_greedily, earliest_start_lb
+from scripts.benchmark_phase1 import BASELINE_PATH, Options, compare_with_baseline
+
+ARCHIVE_PATH = Path(__file__).resolve().parents[3] / "instances" / "displib_instances_phase1.zip"
+
+
+@unittest.skipUnless(ARCHIVE_PATH.is_file(), "The phase 1 instances are not available")
+class TestBenchmarkPhase1(unittest.TestCase):
+
+    def test_greedy_dispatch_on_line3_5(self) -> None:
+        with open_displib_json(ARCHIVE_PATH, "displib_instances_phase1/line3_5.json") as file:
+            graph = CompactDependencyGraph.from_compiled_instance(CompiledInstance.from_stream(file))
+        seconds = []
+        for _ in range(3):
+            started = time.perf_counter()
+            result = dispatch_greedily(graph, earliest_start_lb)
+            seconds.append(time.perf_counter() - started)
+            self.assertTrue(result.complete)
+        with open(BASELINE_PATH, "r") as file:
+            baseline = json.load(file)
+        results = {"instances": {"line3_5": {"greedy_dispatch": {"seconds": min(seconds)}}}}
+        # generous tolerance as the baseline was measured on another machine, resimulating takes over ten times longer
+        self.assertEqual(compare_with_baseline(results, baseline, Options(tolerance=3.0)), [])
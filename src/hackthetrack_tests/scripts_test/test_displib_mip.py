@@ -0,0 +1,35 @@
+import importlib.util
+import unittest
+
+import numpy as np
+
+from hackthetrack.solution import verify_schedule
+from hackthetrack_tests.instances import load_instance
+from scripts.displib_mip import MipOptions, build_displib_mip, solve_displib_mip, solve_instance
+
+
+@unittest.skipIf(importlib.util.find_spec("scipy") is None, "HiGHS is used through scipy")
+class TestDisplibMip(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.compiled, self.graph, self.objective = load_instance()
+
+    def test_solves_headway1_to_optimality(self) -> None:
+        mip = build_displib_mip(self.graph, self.objective)
+        self.assertEqual(len(mip.order_pairs), 2)
+        result = solve_displib_mip(mip)
+        assert result.solution is not None
+        schedule = mip.schedule(self.graph, result.solution)
+        self.assertTrue(verify_schedule(self.graph, schedule).feasible)
+        self.assertAlmostEqual(result.objective_value, 34, places=4)
+        self.assertAlmostEqual(result.bound, 34, places=4)
+        self.assertEqual(self.objective.evaluate(schedule.start), 34)
+
+    def test_expanded_schedule_of_reduced_instance(self) -> None:
+        schedule, statistics = solve_instance(self.compiled, MipOptions(reduce=True))
+        assert schedule is not None
+        self.assertEqual(len(schedule.start), self.graph.n_count)
+        self.assertTrue(verify_schedule(self.graph, schedule).feasible)
+        self.assertEqual(self.objective.evaluate(schedule.start), 34)
+        np.testing.assert_array_equal(schedule.next_node, [1, 2, 3, -1, 5, 6, 7, -1])
+        self.assertEqual(statistics["conflict_pairs"], 2)
@@ -0,0 +1,106 @@
+import importlib.util
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.displib import CompiledInstance, DisplibInstance
+from hackthetrack.solution import DelayObjective, Schedule, verify_schedule
+from hackthetrack.solvers import ReductionOptions, reduce_instance
+from hackthetrack_tests.instances import TWO_TRAINS, load_instance
+from scripts.solving_with_hexaly import (
+    HexalyOptions,
+    _Decisions,
+    _instance_arrays,
+    _set_initial_solution,
+    solve_with_hexaly,
+)
+
+
+class _Sequence(list):
+    """Stands in for the value of a Hexaly list variable."""
+
+    def add(self, value: int) -> None:
+        self.append(value)
+
+
+def _decisions(graph: CompactDependencyGraph, n_sequences: int) -> _Decisions:
+    return _Decisions(
+        start=[SimpleNamespace(value=None) for _ in range(graph.n_count)],
+        visited=[SimpleNamespace(value=None) for _ in range(graph.n_count)],
+        route=[SimpleNamespace(value=None) for _ in range(graph.l_count)],
+        sequences=[SimpleNamespace(value=_Sequence([-1])) for _ in range(n_sequences)],
+        objective=None,
+    )
+
+
+class TestSolvingWithHexaly(unittest.TestCase):
+
+    def setUp(self) -> None:
+        _, self.graph, objective = load_instance()
+        self.arrays = _instance_arrays(self.graph, objective, None)
+
+    def test_instance_arrays(self) -> None:
+        self.assertEqual(self.arrays.earliest, [0, 0, 5, 10, 0, 0, 5, 10])
+        self.assertEqual(self.arrays.latest, [0, 66, 66, 66, 0, 66, 66, 66])
+        self.assertEqual(self.arrays.in_offsets, [0, 0, 1, 2, 3, 3, 4, 5, 6])
+        self.assertEqual(self.arrays.is_first, [1, 0, 0, 0, 1, 0, 0, 0])
+        self.assertEqual(self.arrays.use_offsets, [0, 2, 4])
+        self.assertEqual(self.arrays.use_nodes, [1, 5, 2, 6])
+        self.assertEqual(self.arrays.use_resources, [0, 0, 1, 1])
+        self.assertEqual(self.arrays.stay_offsets, [0, 0, 0, 0, 0])
+        self.assertEqual(self.arrays.objective_nodes, [3, 7])
+
+    def test_unused_resources_get_no_sequence(self) -> None:
+        compiled = CompiledInstance.from_displib_instance(DisplibInstance.from_parsed_json(TWO_TRAINS))
+        options = ReductionOptions(drop_single_train_resources=False, merge_chains=False)
+        reduced = reduce_instance(compiled, options).instance
+        graph = CompactDependencyGraph.from_compiled_instance(reduced)
+        self.assertEqual(graph.resource_names, ("r0", "r1", "r2"))  # the only use of r0 cannot be started
+        arrays = _instance_arrays(graph, DelayObjective.from_compiled_instance(reduced), None)
+        self.assertEqual(arrays.use_offsets, [0, 3, 4])
+        self.assertEqual(arrays.use_nodes, [1, 2, 5, 6])
+        self.assertEqual(arrays.use_resources, [0, 0, 0, 1])
+        # train 0 stays on r1 from its first to its second use, so the release time of the first use does not apply
+        self.assertEqual(arrays.stay_offsets, [0, 1, 1, 1, 1])
+        self.assertEqual(arrays.stay_links, [1])
+
+    def test_initial_solution(self) -> None:
+        decisions = _decisions(self.graph, len(self.arrays.use_offsets) - 1)
+        initial = Schedule(start=np.array([0, 14, 19, 24, 0, 0, 5, 10]), next_node=np.array([1, 2, 3, -1, 5, 6, 7, -1]))
+        _set_initial_solution(decisions, self.graph, self.arrays, initial)
+        self.assertEqual([variable.value for variable in decisions.start], [0, 14, 19, 24, 0, 0, 5, 10])
+        self.assertEqual([variable.value for variable in decisions.visited], [True] * 8)
+        self.assertEqual([variable.value for variable in decisions.route], [True] * 6)
+        # both resources are used by train 1 first, i.e. by the second use in the order of use_nodes
+        self.assertEqual([sequence.value for sequence in decisions.sequences], [[1, 0], [1, 0]])
+
+    def test_incomplete_initial_solution(self) -> None:
+        decisions = _decisions(self.graph, len(self.arrays.use_offsets) - 1)
+        initial = Schedule(
+            start=np.array([0, 0, 5, np.nan, 0, 14, 19, 24]), next_node=np.array([1, 2, -1, -1, 5, 6, 7, -1])
+        )
+        _set_initial_solution(decisions, self.graph, self.arrays, initial)
+        # the start of an unvisited operation is clipped into its bounds, as Hexaly rejects values outside the domain
+        self.assertEqual([variable.value for variable in decisions.start], [0, 0, 5, 10, 0, 14, 19, 24])
+        self.assertEqual([variable.value for variable in decisions.visited], [True] * 3 + [False] + [True] * 4)
+        self.assertEqual([variable.value for variable in decisions.route], [True, True, False, True, True, True])
+        self.assertEqual([sequence.value for sequence in decisions.sequences], [[0, 1], [0, 1]])
+
+
+@unittest.skipUnless(importlib.util.find_spec("hexaly"), "Hexaly is not installed")
+class TestSolveWithHexaly(unittest.TestCase):
+
+    def test_solves_headway1(self) -> None:
+        _, graph, objective = load_instance()
+        solutions = list(solve_with_hexaly(graph, objective, HexalyOptions(time_limit=5)))
+        self.assertGreater(len(solutions), 0)
+        best = solutions[-1]
+        self.assertTrue(verify_schedule(graph, best.schedule).feasible)
+        self.assertAlmostEqual(best.objective_value, 34)
+        self.assertEqual(objective.evaluate(best.schedule.start), 34)
+
+
+if __name__ == "__main__":
+    unittest.main()
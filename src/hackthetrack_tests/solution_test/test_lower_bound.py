@@ -0,0 +1,45 @@
+import io
+import json
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.dependencygraph.propagation import mandatory_nodes
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.displib.synthetic import GeneratorOptions, generate_instance
+from hackthetrack.solution import DelayObjective, ObjectiveLowerBound
+from hackthetrack.solvers import LnsOptions, solve_with_lns
+
+PATH = Path("src/hackthetrack_tests/dependencygraph_test/data/displib_testinstances_headway1.json")
+
+
+class TestLowerBound(unittest.TestCase):
+
+    def test_reaches_the_optimum(self) -> None:
+        compiled = CompiledInstance.from_json(PATH, cache_directory=None)
+        graph = CompactDependencyGraph.from_compiled_instance(compiled)
+        objective = DelayObjective.from_compiled_instance(compiled)
+        bound = ObjectiveLowerBound.from_graph(graph, objective)
+        self.assertEqual(bound.value, 34)
+        self.assertEqual(bound.route_bound, 20)
+        self.assertEqual(bound.gap(34), 0)
+        self.assertEqual(bound.gap(np.inf), 1)
+        self.assertEqual(ObjectiveLowerBound.from_graph(graph, objective, resource_relaxation=False).value, 20)
+
+    def test_below_a_feasible_schedule(self) -> None:
+        options = GeneratorOptions(n_trains=30, n_sections=10, horizon=600, max_slack=0, objective_share=1.0, seed=3)
+        compiled = CompiledInstance.from_stream(io.StringIO(json.dumps(generate_instance(options))))
+        graph = CompactDependencyGraph.from_compiled_instance(compiled)
+        objective = DelayObjective.from_compiled_instance(compiled)
+        tracks = graph.successors[np.repeat(np.diff(graph.successor_offsets) > 1, np.diff(graph.successor_offsets))]
+        mandatory = mandatory_nodes(graph)
+        self.assertGreater(len(tracks), 0)
+        self.assertFalse(np.any(mandatory[tracks]))
+        self.assertEqual(mandatory.sum(), graph.n_count - len(tracks))
+        bound = ObjectiveLowerBound.from_graph(graph, objective)
+        result = solve_with_lns(graph, objective, LnsOptions(max_iterations=0))
+        self.assertGreater(bound.value, 0)
+        self.assertGreaterEqual(bound.value, bound.route_bound)
+        self.assertLessEqual(bound.value, result.objective_value)
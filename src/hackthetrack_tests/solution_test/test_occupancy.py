@@ -0,0 +1,82 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.solution import OccupancyIndex, Schedule, SolutionEvent
+
+PATH = Path("src/hackthetrack_tests/dependencygraph_test/data/displib_testinstances_headway1.json")
+
+
+class TestOccupancyIndex(unittest.TestCase):
+
+    def test_overlap_queries(self) -> None:
+        index = OccupancyIndex(2)
+        index.add(0, 0.0, 100.0, 0)
+        index.add(0, 120.0, 130.0, 1)
+        index.add(0, 125.0, 125.0, 2)
+        self.assertEqual(index.trains_in(0, 50.0, 60.0), {0})
+        self.assertEqual(index.trains_in(0, 100.0, 120.0), set())
+        self.assertEqual(index.trains_in(0, 99.0, 126.0), {0, 1, 2})
+        self.assertEqual(index.trains_in(0, 125.0, 125.0), {1})
+        self.assertEqual(index.trains_in(0, 120.0, 125.0), {1})
+        self.assertFalse(index.is_free(0, 110.0, 140.0, train=1))
+        self.assertTrue(index.is_free(1, 0.0, 1000.0))
+        self.assertEqual(index.next_begin(0, 50.0), 120.0)
+        index.remove(0, 0.0, 100.0, 0)
+        self.assertEqual(index.trains_in(0, 50.0, 60.0), set())
+        self.assertEqual(index.occupations(0), [(120.0, 130.0, 1), (125.0, 125.0, 2)])
+        with self.assertRaises(ValueError):
+            index.remove(0, 0.0, 100.0, 0)
+
+    def test_bulk_build_matches_inserts(self) -> None:
+        rng = np.random.default_rng(0)
+        resources, begins = rng.integers(5, size=300), rng.integers(1000, size=300).astype(float)
+        ends, trains = begins + rng.integers(0, 60, size=300), rng.integers(40, size=300)
+        built = OccupancyIndex.from_arrays(5, resources, begins, ends, trains)
+        inserted = OccupancyIndex(5)
+        for row in zip(resources.tolist(), begins.tolist(), ends.tolist(), trains.tolist()):
+            inserted.add(*row)
+        for resource, begin, length in zip(rng.integers(5, size=100), rng.integers(1000, size=100), [0, 10] * 50):
+            expected = {
+                int(train)
+                for train, occupied, released in zip(
+                    trains[resources == resource], begins[resources == resource], ends[resources == resource]
+                )
+                if occupied < begin + length and released > begin
+            }
+            self.assertEqual(built.trains_in(int(resource), begin, begin + length), expected)
+            self.assertEqual(inserted.trains_in(int(resource), begin, begin + length), expected)
+
+    def test_inserts_and_removals_across_chunks(self) -> None:
+        rng = np.random.default_rng(1)
+        begins = rng.integers(5000, size=2000).astype(float)
+        rows = list(zip(begins.tolist(), (begins + rng.integers(0, 30, size=2000)).tolist(), range(2000)))
+        rows.append((0.0, 10000.0, 2000))
+        index = OccupancyIndex(1)
+        for row in rows:
+            index.add(0, *row)
+        for row in rows[:-1:2] + rows[-1:]:
+            index.remove(0, *row)
+        kept = rows[1:-1:2]
+        self.assertEqual(index.occupations(0), sorted(kept))
+        for begin in rng.integers(5000, size=100).tolist():
+            expected = {train for occupied, released, train in kept if occupied < begin + 10 and released > begin}
+            self.assertEqual(index.trains_in(0, begin, begin + 10), expected)
+
+    def test_from_schedule(self) -> None:
+        graph = CompactDependencyGraph.from_compiled_instance(CompiledInstance.from_json(PATH, cache_directory=None))
+        times = {0: [0, 0, 5, 10], 1: [0, 14, 19, 24]}
+        events = [
+            SolutionEvent(time=time, train=train, operation=operation)
+            for train, starts in times.items()
+            for operation, time in enumerate(starts)
+        ]
+        index = OccupancyIndex.from_schedule(
+            graph, Schedule.from_events(graph, sorted(events, key=lambda e: e["time"]))
+        )
+        self.assertEqual(index.occupations(0), [(0.0, 14.0, 0), (14.0, 28.0, 1)])
+        self.assertEqual(index.trains_in(1, 10.0, 20.0), {0, 1})
+        self.assertTrue(index.is_free(1, 20.0, 24.0, train=1))
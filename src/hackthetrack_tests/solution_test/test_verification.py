@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.displib import CompiledInstance, DisplibInstance
+from hackthetrack.solution import Schedule, SolutionEvent, verify_schedule
+from hackthetrack_tests.instances import load_instance
+
+
+def _events(start_times: dict[int, list[float]]) -> list[SolutionEvent]:
+    events = [
+        SolutionEvent(time=time, train=train, operation=operation)
+        for train, times in start_times.items()
+        for operation, time in enumerate(times)
+    ]
+    return sorted(events, key=lambda event: event["time"])
+
+
+class TestVerification(unittest.TestCase):
+
+    def setUp(self) -> None:
+        _, self.graph, self.objective = load_instance()
+
+    def test_feasible_schedule(self) -> None:
+        schedule = Schedule.from_events(self.graph, _events({0: [0, 0, 5, 10], 1: [0, 14, 19, 24]}))
+        self.assertTrue(verify_schedule(self.graph, schedule).feasible)
+        self.assertEqual(self.objective.evaluate(schedule.start), 34)
+        round_trip = Schedule.from_events(self.graph, schedule.to_events(self.graph))
+        np.testing.assert_array_equal(round_trip.start, schedule.start)
+        np.testing.assert_array_equal(round_trip.next_node, schedule.next_node)
+
+    def test_violations(self) -> None:
+        schedule = Schedule.from_events(self.graph, _events({0: [0, 0, 5, 10], 1: [0, 13, 16, 24]}))
+        result = verify_schedule(self.graph, schedule)
+        self.assertFalse(result.feasible)
+        np.testing.assert_array_equal(result.resource_conflicts, [[1, 5, 0], [2, 6, 1]])
+        np.testing.assert_array_equal(result.duration_violations, [5])
+
+        schedule = Schedule.from_events(self.graph, _events({0: [0, 0, 5], 1: [1, 14, 19, 24]}))
+        result = verify_schedule(self.graph, schedule)
+        np.testing.assert_array_equal(result.route_violations, [2])
+        np.testing.assert_array_equal(result.start_ub_violations, [4])
+
+    def test_conflict_behind_release_of_same_train(self) -> None:
+        def operation(successors: list[int], release_time: int | None = None) -> dict:
+            resources = [] if release_time is None else [{"resource": "r", "release_time": release_time}]
+            return {"min_duration": 1, "resources": resources, "successors": successors}
+
+        instance = DisplibInstance.from_parsed_json(
+            {
+                "trains": [[operation([1], 10), operation([])], [operation([1], 20), operation([2]), operation([], 0)]],
+                "objective": [{"type": "op_delay", "train": 0, "operation": 1, "threshold": 0, "coeff": 1}],
+            }
+        )
+        graph = CompactDependencyGraph.from_compiled_instance(CompiledInstance.from_displib_instance(instance))
+        schedule = Schedule.from_events(graph, _events({0: [0, 4], 1: [1, 2, 4]}))
+        # train 1 enters again while its own release runs longest, train 0 still holds the resource until 14
+        np.testing.assert_array_equal(verify_schedule(graph, schedule).resource_conflicts, [[0, 2, 0], [0, 4, 0]])
+
+    def test_evaluate_many(self) -> None:
+        starts = np.full((2, self.graph.n_count), np.nan)
+        starts[:, [3, 7]] = [[10, 24], [0, 2]]
+        np.testing.assert_array_equal(self.objective.evaluate_many(starts), [34, 2])
@@ -0,0 +1,61 @@
+import io
+import json
+import unittest
+
+import numpy as np
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.displib.synthetic import GeneratorOptions, generate_instance
+from hackthetrack.solution import verify_schedule
+from hackthetrack.solvers import (
+    DispatchHooks,
+    dispatch_greedily,
+    earliest_start_lb,
+    first_come_first_served,
+    objective_weighted,
+)
+from hackthetrack_tests.instances import load_instance
+
+
+class TestGreedyDispatch(unittest.TestCase):
+
+    def setUp(self) -> None:
+        _, self.graph, self.objective = load_instance()
+
+    def test_feasible_schedule(self) -> None:
+        result = dispatch_greedily(self.graph, earliest_start_lb)
+        self.assertTrue(result.complete)
+        self.assertTrue(verify_schedule(self.graph, result.schedule).feasible)
+        np.testing.assert_array_equal(result.schedule.start, [0, 0, 5, 10, 0, 14, 19, 24])
+        self.assertEqual(self.objective.evaluate(result.schedule.start), 34)
+
+    def test_priority_rules(self) -> None:
+        for rule in [None, lambda graph: objective_weighted(graph, self.objective)]:
+            result = dispatch_greedily(self.graph) if rule is None else dispatch_greedily(self.graph, rule)
+            self.assertTrue(verify_schedule(self.graph, result.schedule).feasible)
+
+    def test_hooks(self) -> None:
+        entered, finished = [], []
+        hooks = DispatchHooks(
+            on_enter=lambda train, node, time: entered.append((train, node, time)),
+            on_finish=lambda train, time: finished.append((train, time)),
+        )
+        result = dispatch_greedily(self.graph, earliest_start_lb, hooks)
+        self.assertEqual(sorted(node for _, node, _ in entered), list(range(self.graph.n_count)))
+        self.assertEqual(finished, [(0, 15.0), (1, 29.0)])
+        for train, node, time in entered:
+            self.assertEqual(self.graph.train_ids[node], train)
+            self.assertEqual(result.schedule.start[node], time)
+
+    def test_single_track_corridor(self) -> None:
+        # trains in both directions over single track sections with a two track station every fifth section
+        options = GeneratorOptions(n_trains=15, n_sections=10, horizon=1800, seed=0)
+        compiled = CompiledInstance.from_stream(io.StringIO(json.dumps(generate_instance(options))))
+        graph = CompactDependencyGraph.from_compiled_instance(compiled)
+        self.assertFalse(dispatch_greedily(graph, earliest_start_lb, max_rollbacks=0).complete)
+        for rule in [earliest_start_lb, first_come_first_served]:
+            result = dispatch_greedily(graph, rule)
+            self.assertTrue(result.complete)
+            self.assertGreater(result.rollbacks, 0)
+            self.assertTrue(verify_schedule(graph, result.schedule).feasible)
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+from hackthetrack.solution import Schedule, verify_schedule
+from hackthetrack.solvers import LnsHooks, LnsOptions, dispatch_greedily, earliest_start_lb, solve_with_lns
+from hackthetrack_tests.instances import load_instance
+
+
+class TestLargeNeighbourhoodSearch(unittest.TestCase):
+
+    def setUp(self) -> None:
+        _, self.graph, self.objective = load_instance()
+
+    def test_construct_without_initial_schedule(self) -> None:
+        result = solve_with_lns(self.graph, self.objective, LnsOptions(max_iterations=0))
+        self.assertTrue(verify_schedule(self.graph, result.schedule).feasible)
+        self.assertEqual(result.iterations, 0)
+        self.assertEqual(result.objective_value, self.objective.evaluate(result.schedule.start))
+
+    def test_improves_greedy_schedule(self) -> None:
+        initial = dispatch_greedily(self.graph, earliest_start_lb).schedule
+        result = solve_with_lns(self.graph, self.objective, LnsOptions(max_iterations=50), initial)
+        self.assertTrue(verify_schedule(self.graph, result.schedule).feasible)
+        self.assertLessEqual(result.objective_value, self.objective.evaluate(initial.start))
+        self.assertEqual(result.iterations, 50)
+
+    def test_seed_makes_search_deterministic(self) -> None:
+        options = LnsOptions(max_iterations=30, seed=7, destroy_size=1)
+        first = solve_with_lns(self.graph, self.objective, options)
+        second = solve_with_lns(self.graph, self.objective, options)
+        np.testing.assert_array_equal(first.schedule.start, second.schedule.start)
+        np.testing.assert_array_equal(first.schedule.next_node, second.schedule.next_node)
+
+    def test_hooks(self) -> None:
+        greedy = dispatch_greedily(self.graph, earliest_start_lb).schedule
+        offered, improvements = [greedy], []
+        hooks = LnsHooks(
+            on_improvement=lambda schedule, objective_value: improvements.append(objective_value),
+            incumbent=lambda objective_value: offered.pop() if offered else None,
+        )
+        result = solve_with_lns(self.graph, self.objective, LnsOptions(max_iterations=20), hooks=hooks)
+        self.assertEqual(offered, [])
+        self.assertLessEqual(result.objective_value, self.objective.evaluate(greedy.start))
+        self.assertEqual(len(improvements), result.improvements)
+
+    def test_broken_trains_of_initial_schedule_are_reinserted(self) -> None:
+        empty = Schedule(start=np.full(self.graph.n_count, np.nan), next_node=np.full(self.graph.n_count, -1))
+        truncated = Schedule(
+            start=np.array([0, 0, 5, np.nan, 0, 14, 19, 24]), next_node=np.array([1, 2, -1, -1, 5, 6, 7, -1])
+        )
+        conflicting = Schedule(
+            start=np.array([0, 0, 5, 10, 0, 0, 5, 10]), next_node=np.array([1, 2, 3, -1, 5, 6, 7, -1])
+        )
+        for initial in [empty, truncated, conflicting]:
+            result = solve_with_lns(self.graph, self.objective, LnsOptions(max_iterations=0), initial)
+            self.assertTrue(verify_schedule(self.graph, result.schedule).feasible)
+            self.assertEqual(len(result.unrouted_trains), 0)
+            self.assertEqual(result.objective_value, 34)
@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.displib import CompiledInstance, DisplibInstance
+from hackthetrack.solution import DelayObjective, verify_schedule
+from hackthetrack.solvers import ReductionOptions, dispatch_greedily, earliest_start_lb, reduce_instance
+from hackthetrack_tests.instances import TWO_TRAINS
+
+
+class TestPreprocessing(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.compiled = CompiledInstance.from_displib_instance(DisplibInstance.from_parsed_json(TWO_TRAINS))
+        self.graph = CompactDependencyGraph.from_compiled_instance(self.compiled)
+
+    def test_reduction(self) -> None:
+        reduced = reduce_instance(self.compiled)
+        # operation 1 of train 0 cannot be started, 2 and 3 are merged, r0 and r2 are used by a single train
+        np.testing.assert_array_equal(reduced.reduced_node, [0, -1, 1, 1, 2, 3, 4, 5, 6])
+        np.testing.assert_array_equal(reduced.start_offset, [0, 0, 0, 5, 0, 0, 0, 0, 0])
+        np.testing.assert_array_equal(reduced.instance.min_duration, [0, 10, 0, 0, 3, 3, 1])
+        self.assertEqual(reduced.instance.resource_names, ("r1",))
+        np.testing.assert_array_equal(reduced.instance.start_lb[[1, 2]], [np.nan, 10])
+        np.testing.assert_array_equal(reduced.instance.objective_operation, [2, 3])
+
+    def test_expanded_schedule(self) -> None:
+        reduced = reduce_instance(self.compiled)
+        graph = CompactDependencyGraph.from_compiled_instance(reduced.instance)
+        result = dispatch_greedily(graph, earliest_start_lb)
+        schedule = reduced.expand_schedule(result.schedule)
+        self.assertTrue(verify_schedule(self.graph, schedule).feasible)
+        self.assertEqual(
+            DelayObjective.from_compiled_instance(self.compiled).evaluate(schedule.start),
+            DelayObjective.from_compiled_instance(reduced.instance).evaluate(result.schedule.start),
+        )
+
+    def test_options(self) -> None:
+        options = ReductionOptions(drop_single_train_resources=False, merge_chains=False)
+        reduced = reduce_instance(self.compiled, options)
+        self.assertEqual(reduced.instance.n_operations, 8)
+        self.assertEqual(reduced.instance.resource_names, ("r0", "r1", "r2"))
+
+    def test_infeasible_instance(self) -> None:
+        instance = {"trains": [[{"start_lb": 5, "start_ub": 0, "min_duration": 0, "successors": []}]], "objective": []}
+        with self.assertRaises(ValueError):
+            reduce_instance(CompiledInstance.from_displib_instance(DisplibInstance.from_parsed_json(instance)))
+
+
+if __name__ == "__main__":
+    unittest.main()
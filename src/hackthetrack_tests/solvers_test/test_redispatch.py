@@ -0,0 +1,131 @@
+import io
+import json
+import unittest
+
+import numpy as np
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.displib.synthetic import GeneratorOptions, generate_instance
+from hackthetrack.solution import DelayObjective, verify_schedule
+from hackthetrack.solvers import (
+    BoundChange,
+    DispatchState,
+    LnsOptions,
+    ResourceOutage,
+    TrainInsertion,
+    TrainRemoval,
+    solve_with_lns,
+)
+
+# trains 0 and 1 both wait on a and b until train 2 leaves c, delaying train 0 on c pushes it into the path of train 1
+QUEUED_TRAINS = {
+    "trains": [
+        [
+            {"start_ub": 0, "min_duration": 0, "resources": [{"resource": "a"}], "successors": [1]},
+            {"min_duration": 20, "resources": [{"resource": "b"}, {"resource": "a"}], "successors": [2]},
+            {"min_duration": 600, "resources": [{"resource": "c"}], "successors": [3]},
+            {"min_duration": 0, "successors": []},
+        ],
+        [
+            {"start_ub": 0, "min_duration": 230, "successors": [1]},
+            {"min_duration": 200, "resources": [{"resource": "a"}], "successors": [2]},
+            {"min_duration": 20, "resources": [{"resource": "b"}, {"resource": "a"}], "successors": [3]},
+            {"min_duration": 480, "resources": [{"resource": "c"}], "successors": [4]},
+            {"min_duration": 0, "successors": []},
+        ],
+        [
+            {"start_ub": 0, "min_duration": 12000, "resources": [{"resource": "c"}], "successors": [1]},
+            {"min_duration": 400, "successors": [2]},
+            {"min_duration": 0, "successors": []},
+        ],
+    ],
+    "objective": [
+        {"type": "op_delay", "train": 0, "operation": 3, "coeff": 1},
+        {"type": "op_delay", "train": 1, "operation": 4, "coeff": 1},
+        {"type": "op_delay", "train": 2, "operation": 2, "coeff": 1},
+    ],
+}
+
+
+class TestRedispatch(unittest.TestCase):
+
+    def setUp(self) -> None:
+        options = GeneratorOptions(n_trains=12, n_sections=10, horizon=1200, objective_share=1.0, seed=5)
+        self.compiled = CompiledInstance.from_stream(io.StringIO(json.dumps(generate_instance(options))))
+        self.graph = CompactDependencyGraph.from_compiled_instance(self.compiled)
+        self.objective = DelayObjective.from_compiled_instance(self.compiled)
+        self.state = DispatchState(self.graph, self.objective, options=LnsOptions(max_iterations=20))
+
+    def test_delay_reroutes_only_the_delayed_train(self) -> None:
+        before = self.state.schedule()
+        first = self.graph.node_index(3, 0)
+        result = self.state.apply([BoundChange(first, start_lb=before.start[first] + 300)])
+        after = self.state.schedule()
+        np.testing.assert_array_equal(result.rerouted_trains, [3])
+        self.assertEqual(len(result.unrouted_trains), 0)
+        self.assertGreaterEqual(after.start[first], before.start[first] + 300)
+        self.assertGreaterEqual(self.state.bounds.earliest[first + 1], before.start[first] + 300)
+        others = self.graph.train_ids != 3
+        np.testing.assert_array_equal(after.start[others], before.start[others])
+        self.assertTrue(verify_schedule(self.state.graph, after).feasible)
+
+    def test_outage_moves_trains_off_the_resource(self) -> None:
+        before = self.state.schedule()
+        node = self.graph.node_index(5, 1)
+        resource, begin = int(self.graph.resources_of(node)[0]), float(before.start[node])
+        result = self.state.apply([ResourceOutage(resource, begin, begin + 200)])
+        self.assertIn(5, result.rerouted_trains)
+        schedule = self.state.schedule()
+        self.assertTrue(verify_schedule(self.state.graph, schedule).feasible)
+        end = schedule.end(self.state.graph)
+        users = self.graph.resource_use_nodes()[self.graph.resource_ids == resource]
+        users = users[schedule.visited[users]]
+        self.assertTrue(np.all((schedule.start[users] >= begin + 200) | (end[users] <= begin)))
+
+    def test_insert_and_remove_trains(self) -> None:
+        result = self.state.apply([TrainRemoval(0), TrainInsertion(self.compiled)])
+        self.assertEqual(self.state.graph.n_trains, 24)
+        np.testing.assert_array_equal(np.sort(result.rerouted_trains), np.arange(12, 24))
+        np.testing.assert_array_equal(self.state.cancelled_trains, [0])
+        graph, objective, schedule = self.state.compacted()
+        self.assertEqual(graph.n_trains, 23)
+        self.assertTrue(verify_schedule(graph, schedule).feasible)
+        self.assertEqual(objective.evaluate(schedule.start), result.objective_value)
+
+    def test_reoptimise_continues_from_current_schedule(self) -> None:
+        first = self.graph.node_index(7, 0)
+        repaired = self.state.apply([BoundChange(first, start_lb=self.graph.start_lb[first] + 600)])
+        result = self.state.reoptimise(time_limit=10.0)
+        self.assertEqual(result.iterations, 20)
+        self.assertLessEqual(result.objective_value, repaired.objective_value)
+        self.assertTrue(verify_schedule(self.state.graph, result.schedule).feasible)
+
+    def test_constructs_without_initial_schedule(self) -> None:
+        constructed = solve_with_lns(self.graph, self.objective, LnsOptions(max_iterations=0)).schedule
+        np.testing.assert_array_equal(self.state.schedule().start, constructed.start)
+
+    def test_objective_infinite_while_unrouted(self) -> None:
+        first = self.graph.node_index(2, 0)
+        start = float(self.state.schedule().start[first])
+        result = self.state.apply([BoundChange(first, start_lb=start + 100, start_ub=start)])
+        np.testing.assert_array_equal(result.unrouted_trains, [2])
+        self.assertEqual(result.objective_value, np.inf)
+        self.assertEqual(self.state.reoptimise(time_limit=10.0).objective_value, np.inf)
+        result = self.state.apply([BoundChange(first, start_ub=np.nan)])
+        self.assertEqual(len(result.unrouted_trains), 0)
+        self.assertEqual(result.objective_value, self.objective.evaluate(self.state.schedule().start))
+
+    def test_delay_ejects_blocking_trains(self) -> None:
+        compiled = CompiledInstance.from_stream(io.StringIO(json.dumps(QUEUED_TRAINS)))
+        graph = CompactDependencyGraph.from_compiled_instance(compiled)
+        objective = DelayObjective.from_compiled_instance(compiled)
+        state = DispatchState(graph, objective)
+        before = state.schedule()
+        result = state.apply([BoundChange(3, start_lb=before.start[3] + 60)])
+        self.assertEqual(len(result.unrouted_trains), 0)
+        self.assertIn(1, result.rerouted_trains)
+        schedule = state.schedule()
+        self.assertGreaterEqual(schedule.start[3], before.start[3] + 60)
+        self.assertTrue(verify_schedule(graph, schedule).feasible)
+        self.assertEqual(result.objective_value, objective.evaluate(schedule.start))
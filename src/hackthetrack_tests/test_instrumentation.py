@@ -0,0 +1,71 @@
+import json
+import pstats
+import tempfile
+import unittest
+from pathlib import Path
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.instrumentation import count, instrumented, profiled, timed
+from hackthetrack.statistics_logger import StatisticsLogger
+
+PATH = Path("src/hackthetrack_tests/dependencygraph_test/data/displib_testinstances_headway1.json")
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_disabled_outside_of_instrumented(self) -> None:
+        self.assertIs(timed("a"), timed("b"))
+        count("a")
+        with instrumented() as instrumentation:
+            pass
+        self.assertEqual(instrumentation.summary(), {})
+
+    def test_timers_and_counters(self) -> None:
+        with instrumented() as instrumentation:
+            graph = CompactDependencyGraph.from_compiled_instance(
+                CompiledInstance.from_json(PATH, cache_directory=None)
+            )
+            for _ in range(3):
+                with timed("step"):
+                    count("steps")
+            count("nodes", graph.n_count)
+            with instrumented() as nested:
+                count("steps")
+        summary = instrumentation.summary()
+        self.assertEqual(summary["parse calls"], 1)
+        self.assertEqual(summary["compact_graph calls"], 1)
+        self.assertEqual(summary["step calls"], 3)
+        self.assertGreaterEqual(summary["step seconds"], 0.0)
+        self.assertEqual(summary["steps"], 3)
+        self.assertEqual(summary["nodes"], 8)
+        self.assertEqual(nested.summary(), {"steps": 1})
+
+    def test_exports(self) -> None:
+        with instrumented(trace=True) as instrumentation:
+            with timed("step"):
+                count("steps")
+        instrumentation.write_json(self.path / "summary.json")
+        instrumentation.write_chrome_trace(self.path / "trace.json")
+        with open(self.path / "summary.json") as file:
+            self.assertEqual(json.load(file)["counters"], {"steps": 1})
+        with open(self.path / "trace.json") as file:
+            events = json.load(file)["traceEvents"]
+        self.assertEqual([(event["name"], event["ph"]) for event in events], [("step", "X"), ("steps", "C")])
+
+        logger = StatisticsLogger(base_path=self.path / "statistics")
+        with logger.batch() as batch:
+            instrumentation.update_statistics(batch, "instance")
+        self.assertEqual(set(logger.load_instance_data("instance")), {"step seconds", "step calls", "steps"})
+
+    def test_profiled(self) -> None:
+        with profiled(self.path / "run.prof"):
+            CompiledInstance.from_json(PATH, cache_directory=None)
+        self.assertGreater(len(pstats.Stats(str(self.path / "run.prof")).get_stats_profile().func_profiles), 0)
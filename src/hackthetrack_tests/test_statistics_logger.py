@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Literal
+
+from hackthetrack.statistics_logger import StatisticsLogger
+
+
+class TestStatisticsLogger(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_batch(self) -> None:
+        backends: list[Literal["yaml", "sqlite"]] = ["yaml", "sqlite"]
+        for backend in backends:
+            logger = StatisticsLogger(base_path=self.path / backend, backend=backend)
+            with logger.batch() as batch:
+                batch.update_instance("a", "trains", 3)
+                batch.update_instance("a", "objectives per train", {0: 1, 1: 2})
+                batch.update_instance("b", "trains", 5)
+                batch.update_instance("b", "release times", [0, 1])
+                batch.delete_key("b", "release times")
+            self.assertEqual(logger.load_instance_data("a"), {"trains": 3, "objectives per train": {0: 1, 1: 2}})
+
+            logger.update_instance("b", "feasible", True)
+            logger.delete_key_on_all_instances("trains")
+            self.assertEqual(logger.load_instance_data("b"), {"feasible": True})
+
+            frame = logger.to_frame()
+            self.assertEqual(sorted(frame.index), ["a", "b"])
+            self.assertEqual(frame.loc["a", "objectives per train"], {0: 1, 1: 2})
+            self.assertTrue(frame.loc["b", "feasible"])
+
+    def test_failed_batch_writes_nothing(self) -> None:
+        logger = StatisticsLogger(base_path=self.path)
+        with self.assertRaises(RuntimeError), logger.batch() as batch:
+            batch.update_instance("a", "trains", 3)
+            raise RuntimeError()
+        self.assertEqual(logger.load_instance_data("a"), {})
+
+    def test_export_yaml(self) -> None:
+        logger = StatisticsLogger(base_path=self.path / "sqlite", backend="sqlite")
+        logger.update_instance("a", "trains", 3)
+        logger.export_yaml(self.path / "yaml")
+        self.assertEqual(StatisticsLogger(base_path=self.path / "yaml").load_instance_data("a"), {"trains": 3})
@@ -1,24 +1,99 @@
+import hashlib
+import os
+import tempfile
+import time
 from dataclasses import replace
-from itertools import chain
+from pathlib import Path
 from typing import Literal, NamedTuple
 
-from ugraph import EndNodeIdPair, NodeId, NodeIndex, ThreeDCoordinates
+import igraph
+import numpy as np
+from ugraph import NODE_ATTRIBUTE_KEY, EndNodeIdPair, NodeId, ThreeDCoordinates
 
 from hackthetrack.dependencygraph import DependencyGraph, Link, LinkType, Node, NodeType
+from hackthetrack.paths import OUTPUT_ROOT
+
+LAYOUT_CACHE_PATH = OUTPUT_ROOT / "cache" / "layouts"
+_CHUNK_ITERATIONS = 500
 
 
 class LayoutOptions(NamedTuple):
     layout_algorithm: Literal["fr"] = "fr"
+    graph: Literal["resources", "bipartite"] = "resources"  # resource adjacency only, or operations and resources
+    niter: int = 10000
+    time_limit: float | None = None  # seconds, iterations run in chunks until either budget is used up
+    cache_directory: Path | None = LAYOUT_CACHE_PATH  # complete resource adjacency layouts, by graph content
 
 
 def use_igraph_to_update_x_and_y_coordinates(
     network: DependencyGraph, options: LayoutOptions = LayoutOptions()
 ) -> None:
-    copied = network.shallow_copy
-    resources = frozenset(
-        resource.name for resource in chain.from_iterable(node.resources for node in network.all_nodes)
+    """
+    Lay out the resources and place every operation at the mean location of its resources.
+
+    By default only the resource adjacency graph is laid out: resources are linked if one operation uses both or
+    consecutive operations use them, weighted by how often that happens. It has a node per resource instead of a
+    node per operation and resource, and its layout is cached on disk. All nodes are replaced in one bulk update.
+    """
+    if options.graph == "bipartite":
+        resource_coordinates = _bipartite_layout(network, options)
+    else:
+        resource_coordinates = _resource_adjacency_layout(network, options)
+
+    nodes = network.all_nodes
+    updated = []
+    for node in nodes:
+        resource_ids = [resource.id for resource in node.resources]
+        if resource_ids:
+            x, y = resource_coordinates[resource_ids].mean(axis=0).tolist()
+            coordinates = ThreeDCoordinates(x=x, y=y, z=0)
+        else:
+            coordinates = ThreeDCoordinates(x=float("nan"), y=float("nan"), z=float("nan"))
+        updated.append(replace(node, coordinates=coordinates))
+    # the ids stay the same, so the node attributes can be swapped without replace_node
+    network.underlying_digraph.vs[NODE_ATTRIBUTE_KEY] = updated
+
+
+def resource_adjacency(network: DependencyGraph) -> tuple[int, np.ndarray, np.ndarray]:
+    """Number of resources, resource pairs (first < second) used together or in succession and their counts."""
+    nodes = network.all_nodes
+    resource_ids = [[resource.id for resource in node.resources] for node in nodes]
+    n_resources = 1 + max((resource_id for ids in resource_ids for resource_id in ids), default=-1)
+    pairs = [(first, second) for ids in resource_ids for first in ids for second in ids if first < second]
+    pairs.extend(
+        (first, second)
+        for source, target in network.edge_tuple_iterator
+        for first in resource_ids[source]
+        for second in resource_ids[target]
+        if first != second
     )
-    zero_coordinates = ThreeDCoordinates(x=0, y=0, z=0)
+    ordered = np.sort(np.asarray(pairs, dtype=np.int64).reshape(-1, 2), axis=1)
+    keys, counts = np.unique(ordered[:, 0] * max(n_resources, 1) + ordered[:, 1], return_counts=True)
+    return n_resources, np.column_stack([keys // max(n_resources, 1), keys % max(n_resources, 1)]), counts
+
+
+def _resource_adjacency_layout(network: DependencyGraph, options: LayoutOptions) -> np.ndarray:
+    n_resources, edges, counts = resource_adjacency(network)
+    path = None
+    if options.cache_directory is not None:
+        digest = hashlib.sha256(f"{n_resources} {options.layout_algorithm} {options.niter}".encode())
+        digest.update(edges.tobytes())
+        digest.update(counts.tobytes())
+        path = options.cache_directory / f"{digest.hexdigest()}.npy"
+        if path.is_file():
+            return np.load(path)
+    graph = igraph.Graph(n=n_resources, edges=edges.tolist(), directed=False)
+    coordinates, complete = _layout(graph, options, counts.tolist())
+    if path is not None and complete:  # a layout cut off by the time limit must not be reused by runs without one
+        _save_atomically(path, coordinates)
+    return coordinates
+
+
+def _bipartite_layout(network: DependencyGraph, options: LayoutOptions) -> np.ndarray:
+    """The previous layout of operations and resources together, only the resource coordinates are returned."""
+    copied = network.shallow_copy
+    n_resources = 1 + max((resource.id for node in network.all_nodes for resource in node.resources), default=-1)
+    resource_node_ids = [NodeId(f"resource_{resource_id}") for resource_id in range(n_resources)]
     base_node = Node(
         NodeId(f"resource_{0}"),
         index=-1,
@@ -28,30 +103,48 @@ def use_igraph_to_update_x_and_y_coordinates(
         min_duration=0,
         resources=[],
         successors=[],
-        coordinates=zero_coordinates,
+        coordinates=ThreeDCoordinates(x=0, y=0, z=0),
         node_type=NodeType.RESOURCE,
     )
-    copied.add_nodes([replace(base_node, id=NodeId(f"resource_{resource}")) for resource in resources])
+    copied.add_nodes([replace(base_node, id=node_id) for node_id in resource_node_ids])
     links_to_add = []
-    for node in copied.all_nodes:
+    for node in network.all_nodes:
         for resource in node.resources:
             links_to_add.append(
-                (EndNodeIdPair((node.id, NodeId(f"resource_{resource.name}"))), Link(link_type=LinkType.PRECEDENCE))
+                (EndNodeIdPair((node.id, resource_node_ids[resource.id])), Link(link_type=LinkType.PRECEDENCE))
             )
     copied.add_links(links_to_add)
+    # resource nodes were added after the operations, in order of their ids
+    return _layout(copied.underlying_digraph, options, None)[0][network.n_count :]
 
-    layout = copied.underlying_digraph.layout(options.layout_algorithm, dim=2, weights=None, niter=10000)
-    resource_coordinates = {
-        resource_name: ThreeDCoordinates(x=layout[i][0], y=layout[i][1], z=0)
-        for i, resource_name in enumerate(resources, start=network.n_count)
-    }
-
-    nan_coordinates = ThreeDCoordinates(x=float("nan"), y=float("nan"), z=float("nan"))
-    for i, node in enumerate(network.all_nodes):
-        i: NodeIndex
-        resource_locations = tuple(resource_coordinates[resource.name] for resource in node.resources)
-        if len(resource_locations) > 0:
-            average_coordinates = ThreeDCoordinates.create_mean_location_coordinates(resource_locations)
-        else:
-            average_coordinates = nan_coordinates
-        network.replace_node(i, replace(node, coordinates=average_coordinates))
+
+def _layout(graph: igraph.Graph, options: LayoutOptions, weights: list[int] | None) -> tuple[np.ndarray, bool]:
+    """
+    Run the layout in chunks of iterations until niter or the time limit is reached, returns whether all ran.
+
+    Every chunk continues from the previous coordinates and starts at the temperature the full run would have at
+    that point. igraph cools every call down to zero, so chunked runs do not reproduce a single run of niter
+    iterations, later chunks merely start cooler.
+    """
+    if options.time_limit is None:
+        layout = graph.layout(options.layout_algorithm, weights=weights, niter=options.niter)
+        return np.asarray(layout.coords), True
+    deadline = time.perf_counter() + options.time_limit
+    temperature = np.sqrt(graph.vcount()) / 10
+    coordinates, done = None, 0
+    while done < options.niter and (coordinates is None or time.perf_counter() < deadline):
+        chunk = min(_CHUNK_ITERATIONS, options.niter - done)
+        start_temperature = temperature * (1 - done / options.niter)
+        coordinates = graph.layout(
+            options.layout_algorithm, weights=weights, niter=chunk, seed=coordinates, start_temp=start_temperature
+        ).coords
+        done += chunk
+    return np.asarray(coordinates), done == options.niter
+
+
+def _save_atomically(path: Path, coordinates: np.ndarray) -> None:
+    path.parent.mkdir(exist_ok=True, parents=True)
+    descriptor, temporary = tempfile.mkstemp(prefix=f".{path.stem}.", suffix=".npy", dir=path.parent)
+    with os.fdopen(descriptor, "wb") as file:
+        np.save(file, coordinates, allow_pickle=False)
+    os.replace(temporary, path)
@@ -0,0 +1,223 @@
+import argparse
+import fnmatch
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path, PurePosixPath
+from typing import Iterator, NamedTuple
+from zipfile import ZipFile
+
+import numpy as np
+from tqdm import tqdm
+
+from hackthetrack.dependencygraph import CompactDependencyGraph, DependencyGraph
+from hackthetrack.displib import CompiledInstance, DisplibInstance
+from hackthetrack.displib.streaming import open_displib_json
+from hackthetrack.solution import DelayObjective, ObjectiveLowerBound, verify_schedule
+from hackthetrack.solvers import dispatch_greedily, earliest_start_lb
+from scripts.assign_directions import use_igraph_to_update_x_and_y_coordinates
+from scripts.inspect_resource_occupation import find_all_occupations
+from scripts.load_and_convert_all_instances import add_precedence_links
+
+BASELINE_PATH = Path(__file__).with_name("benchmark_phase1_baseline.json")
+"""Stored results on line3_5, e.g. to check the greedy dispatch with --path_to_baseline and --instances line3_5."""
+
+
+class Options(NamedTuple):
+    path_to_archive: Path = Path("instances/displib_instances_phase1.zip")
+    path_to_results: Path = Path("out/benchmarks/phase1.json")
+    path_to_baseline: Path | None = None  # results of an earlier run to compare against
+    instances: str = "*"  # glob pattern on the instance names, e.g. "line1_*"
+    repeat: int = 1  # the fastest of the repetitions is reported
+    track_memory: bool = True  # one additional pass with tracemalloc for peak memory and object counts
+    do_layout: bool = False  # disabled as it takes a long time to compute
+    tolerance: float = 1.25  # stages slower than tolerance * baseline are reported as regressions
+    min_seconds: float = 0.01  # differences below this are considered noise
+
+
+class Regression(NamedTuple):
+    instance: str
+    stage: str
+    seconds: float
+    baseline_seconds: float
+
+
+@dataclass(frozen=False, slots=True)
+class _Recorder:
+    """Measures the stages of one pass, either their run time or their memory usage."""
+
+    track_memory: bool
+    results: dict[str, dict[str, float]] = field(default_factory=dict)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self.track_memory:
+            started = time.perf_counter()
+            yield
+            self.results[name] = {"seconds": time.perf_counter() - started}
+            return
+        gc.collect()
+        objects_before = len(gc.get_objects())
+        memory_before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        yield
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        self.results[name] = {
+            "peak_bytes": peak - memory_before,
+            "retained_objects": len(gc.get_objects()) - objects_before,
+        }
+
+
+def run_benchmark(options: Options = Options()) -> dict:
+    """
+    Time every stage of every instance of the archive and write the results as json.
+
+    Instances are read straight from the zip archive. Timings are taken without tracemalloc, as tracing slows down
+    allocations considerably; peak memory and the number of objects still alive after a stage come from a separate
+    pass.
+    """
+    with ZipFile(options.path_to_archive, "r") as zip_file:
+        members = sorted(
+            member
+            for member in zip_file.namelist()
+            if member.endswith(".json") and fnmatch.fnmatch(PurePosixPath(member).stem, options.instances)
+        )
+        instances = {}
+        for member in tqdm(members, desc="Benchmarking instances", colour="green", unit="instance"):
+            instances[PurePosixPath(member).stem] = _benchmark_instance(zip_file, member, options)
+    results = {"metadata": _metadata(options), "instances": instances}
+    options.path_to_results.parent.mkdir(exist_ok=True, parents=True)
+    with open(options.path_to_results, "w") as file:
+        json.dump(results, file, indent=2)
+    return results
+
+
+def _benchmark_instance(zip_file: ZipFile, member: str, options: Options) -> dict[str, dict[str, float]]:
+    timings: dict[str, dict[str, float]] = {}
+    for _ in range(options.repeat):
+        recorder = _Recorder(track_memory=False)
+        _run_stages(zip_file, member, options, recorder)
+        for stage, measurement in recorder.results.items():
+            if stage not in timings or measurement["seconds"] < timings[stage]["seconds"]:
+                timings[stage] = measurement
+    if options.track_memory:
+        recorder = _Recorder(track_memory=True)
+        tracemalloc.start()
+        try:
+            _run_stages(zip_file, member, options, recorder)
+        finally:
+            tracemalloc.stop()
+        for stage, measurement in recorder.results.items():
+            timings[stage].update(measurement)
+    return timings
+
+
+def _run_stages(zip_file: ZipFile, member: str, options: Options, recorder: _Recorder) -> None:
+    with recorder.stage("read"):
+        data = zip_file.read(member)
+    with recorder.stage("parse_json"):
+        parsed = json.loads(data)
+    with recorder.stage("displib_instance"):
+        instance = DisplibInstance.from_parsed_json(parsed)
+    with recorder.stage("dependency_graph"):
+        network = DependencyGraph.from_displib_instance(instance)
+    with recorder.stage("compiled_instance"):
+        compiled = CompiledInstance.from_displib_instance(instance)
+    with recorder.stage("stream_compiled_instance"), open_displib_json(options.path_to_archive, member) as file:
+        CompiledInstance.from_stream(file)
+    with recorder.stage("compact_graph"):
+        graph = CompactDependencyGraph.from_compiled_instance(compiled)
+    with recorder.stage("occupations"):
+        find_all_occupations(graph)
+    if options.do_layout:
+        with recorder.stage("layout"):
+            use_igraph_to_update_x_and_y_coordinates(network)
+    with recorder.stage("precedence_links"):
+        add_precedence_links(network, graph)
+    with recorder.stage("greedy_dispatch"):
+        result = dispatch_greedily(graph, earliest_start_lb)
+    with recorder.stage("verify_schedule"):
+        verify_schedule(graph, result.schedule)
+    with recorder.stage("lower_bound"):
+        ObjectiveLowerBound.from_graph(graph, DelayObjective.from_compiled_instance(compiled))
+
+
+def _metadata(options: Options) -> dict:
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "archive": str(options.path_to_archive),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "repeat": options.repeat,
+    }
+
+
+def compare_with_baseline(results: dict, baseline: dict, options: Options = Options()) -> list[Regression]:
+    """Stages of instances present in both runs that became slower than tolerance * baseline."""
+    regressions = []
+    for instance, stages in results["instances"].items():
+        for stage, measurement in stages.items():
+            baseline_measurement = baseline["instances"].get(instance, {}).get(stage)
+            if baseline_measurement is None:
+                continue
+            seconds, baseline_seconds = measurement["seconds"], baseline_measurement["seconds"]
+            if seconds > options.tolerance * baseline_seconds and seconds - baseline_seconds > options.min_seconds:
+                regressions.append(Regression(instance, stage, seconds, baseline_seconds))
+    return regressions
+
+
+def _print_summary(results: dict, baseline: dict | None) -> None:
+    totals: dict[str, list[float]] = {}
+    for stages in results["instances"].values():
+        for stage, measurement in stages.items():
+            totals.setdefault(stage, []).append(measurement["seconds"])
+    baseline_totals: dict[str, float] = {}
+    for instance, stages in (baseline or {"instances": {}})["instances"].items():
+        for stage, measurement in stages.items():
+            if stage in results["instances"].get(instance, {}):
+                baseline_totals[stage] = baseline_totals.get(stage, 0.0) + measurement["seconds"]
+    for stage, seconds in totals.items():
+        line = f"{stage:<18} {sum(seconds):>9.3f}s total {max(seconds):>8.3f}s max"
+        if stage in baseline_totals:
+            line += f" {sum(seconds) / max(baseline_totals[stage], 1e-9):>6.2f}x baseline"
+        print(line)
+
+
+def main(options: Options = Options()) -> int:
+    results = run_benchmark(options)
+    baseline = None
+    if options.path_to_baseline is not None:
+        with open(options.path_to_baseline, "r") as file:
+            baseline = json.load(file)
+    _print_summary(results, baseline)
+    if baseline is None:
+        return 0
+    regressions = compare_with_baseline(results, baseline, options)
+    for regression in regressions:
+        print(
+            f"Regression in {regression.stage} on {regression.instance}: "
+            f"{regression.seconds:.3f}s instead of {regression.baseline_seconds:.3f}s"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path_to_archive", type=Path, default=Path("instances/displib_instances_phase1.zip"))
+    parser.add_argument("--path_to_results", type=Path, default=Path("out/benchmarks/phase1.json"))
+    parser.add_argument("--path_to_baseline", type=Path, default=None)
+    parser.add_argument("--instances", type=str, default="*")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no_memory", dest="track_memory", action="store_false")
+    parser.add_argument("--do_layout", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    parser.add_argument("--min_seconds", type=float, default=0.01)
+    sys.exit(main(Options(**vars(parser.parse_args()))))
@@ -1,68 +1,448 @@
-from typing import NamedTuple, NewType
-import gurobipy as grb
-from hackthetrack.dependencygraph import DependencyGraph
+import argparse
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Literal, NamedTuple
 
+import numpy as np
 
-TrainId = NewType("TrainId", int)
-EventId = NewType("EventId", int)
-NextEventId = NewType("NextEventId", int)
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.dependencygraph.conflicts import ResourceConflictIndex, ResourceConflicts
+from hackthetrack.dependencygraph.propagation import propagate_start_bounds
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.solution import DelayObjective, Schedule, verify_schedule
+from hackthetrack.solvers import reduce_instance
 
-class DisplibParameters:
-    pass
 
+class MipOptions(NamedTuple):
+    solver: Literal["highs", "gurobi"] = "highs"
+    time_limit: float | None = None  # seconds
+    horizon: float | None = None  # latest start of any operation, derived from the instance if not given
+    reduce: bool = True  # solve the instance after reduce_instance and expand the schedule afterwards
+    verbose: bool = False
 
-class DisplibData(NamedTuple):
-    parameters: DisplibParameters
-    network: DependencyGraph
 
+class VariableBlocks(NamedTuple):
+    """Slices of the variable vector, one block per kind of variable."""
 
-class _DisplibVariables(NamedTuple):
-    time_variables: grb.tupledict[TrainId, EventId, grb.Var]
-    route_variables: grb.tupledict[TrainId, EventId, grb.Var]
-    consecutive_events_variables: grb.tupledict[TrainId, EventId, NextEventId, grb.Var]
+    start: slice  # start time of every node
+    visited: slice  # binary, the node is on the route of its train
+    route: slice  # binary, the train moves along the link
+    order: slice  # binary, first node of a conflicting pair before the second one
+    delay: slice  # delay of every objective component beyond its threshold
+    late: slice  # binary, objective components with an increment that are late
 
 
+@dataclass(frozen=True, slots=True)
+class DisplibMip:
+    """
+    The DISPLIB problem as a mixed integer program min cost @ x s.t. row_lower <= A x <= row_upper.
 
+    A is stored in coordinate form (rows, columns, values), so any solver that takes a sparse matrix can be used.
+    Resource constraints are big-M disjunctions, created only for the node pairs of different trains whose occupation
+    windows overlap (see ResourceConflictIndex).
+    """
 
+    cost: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    integrality: np.ndarray
+    rows: np.ndarray
+    columns: np.ndarray
+    values: np.ndarray
+    row_lower: np.ndarray
+    row_upper: np.ndarray
+    blocks: VariableBlocks
+    order_pairs: np.ndarray
+    big_m: float
 
-@dataclass  # (frozen=True)
-class DISPLIB:
-    _model: grb.Model
-    _variables: _DisplibVariables
-    _data: DisplibData
+    @property
+    def n_variables(self) -> int:
+        return len(self.cost)
 
-    def solve(self, write_lp: bool = False, lp_file_path: Optional[str] = None) -> None:
-        if write_lp:
-            if not lp_file_path:
-                lp_file_path = f"{self.__class__.__name__}.lp"
-            self._model.write(lp_file_path)
+    @property
+    def n_constraints(self) -> int:
+        return len(self.row_lower)
 
-        self._model.optimize()
+    def matrix(self) -> Any:  # scipy.sparse.csr_array, scipy has no type stubs
+        from scipy.sparse import coo_array  # pylint: disable=import-outside-toplevel
 
-def create_displib_mip(displib_data: DisplibData) -> DISPLIB:
-    _add_constraints(displib_data, displib_model := grb.Model(), displib_variables := _add_variables(displib_model, displib_data))
-    return DISPLIB(displib_model, displib_variables, displib_data)
+        return coo_array((self.values, (self.rows, self.columns)), shape=(self.n_constraints, self.n_variables)).tocsr()
 
+    def schedule(self, graph: CompactDependencyGraph, solution: np.ndarray) -> Schedule:
+        """Start times are rounded, as all times of the DISPLIB format are integral."""
+        visited = solution[self.blocks.visited] > 0.5
+        start = np.where(visited, np.round(solution[self.blocks.start]), np.nan)
+        taken = solution[self.blocks.route] > 0.5
+        next_node = np.full(graph.n_count, -1, dtype=np.int64)
+        next_node[graph.link_sources()[taken]] = graph.successors[taken]
+        return Schedule(start=start, next_node=next_node)
 
-def build_mip_from_dependency_graph(network: DependencyGraph) -> None:
-    displib_mip = create_displib_mip(planning_data)
-    displib_mip.solve(write_lp=True)
 
-def _add_constraints(displib_data: DisplibData, displib_model: grb.Model, displib_variables: _DisplibVariables) -> None:
-    pass
+class MipResult(NamedTuple):
+    status: str
+    solution: np.ndarray | None
+    objective_value: float
+    bound: float
 
 
-def _add_time_variables(displib_model, displib_data) -> grb.tupledict[TrainId, EventId, grb.Var]:
-    time_variables = grb.tupledict(TrainId, EventId, grb.Var)
-    nodes = displib_data.network.all_nodes
-    for node in nodes:
-        time_variables[node.train_id, node.id] = displib_model.addVar(
-            lb=node.start_lb,
-            ub=node.start_ub,
-            name=f"t_{node.id}")
+def build_displib_mip(
+    graph: CompactDependencyGraph, objective: DelayObjective, horizon: float | None = None
+) -> DisplibMip:
+    """
+    Create all variables and constraints as arrays; no per-variable Python objects are involved.
 
+    Without a horizon, the latest start of every node is bounded by the time a schedule running all operations and
+    release times one after the other would need.
+    """
+    bounds = propagate_start_bounds(graph)
+    if horizon is None:
+        finite_lb = graph.effective_start_lb[np.isfinite(graph.effective_start_lb)]
+        horizon = float(finite_lb.max(initial=0.0) + graph.min_duration.sum() + graph.release_times.sum())
+    latest = np.minimum(bounds.latest, horizon)
+    big_m = horizon + float(graph.min_duration.max(initial=0.0) + graph.release_times.max(initial=0.0))
+    big_m += max(0.0, -float(objective.threshold.min(initial=0.0)))
 
+    conflicts = ResourceConflictIndex.from_graph(graph, bounds.earliest, latest).conflicts()
+    order_pairs, pair_of_conflict = np.unique(
+        np.sort(np.stack((conflicts.first, conflicts.second), axis=1), axis=1), axis=0, return_inverse=True
+    )
+    components = np.flatnonzero(objective.threshold < latest[objective.nodes])  # others can never be late
+    late = components[objective.increment[components] > 0]
 
+    sizes = [graph.n_count, graph.n_count, graph.l_count, len(order_pairs), len(components), len(late)]
+    starts = np.cumsum([0] + sizes)
+    blocks = VariableBlocks(*(slice(int(lo), int(hi)) for lo, hi in zip(starts[:-1], starts[1:])))
+    columns = _Columns(blocks)
 
-def _add_variables(displib_model: grb.Model, displib_data: DisplibData) -> _DisplibVariables:
-    _add_time_variables(displib_model, displib_data)
\ No newline at end of file
+    lower, upper = np.zeros(starts[-1]), np.ones(starts[-1])
+    lower[blocks.start], upper[blocks.start] = bounds.earliest, latest
+    lower[columns.visited(graph.train_offsets[:-1])] = 1.0  # every train starts with its first operation
+    upper[blocks.delay] = np.inf
+    integrality = np.ones(starts[-1], dtype=np.uint8)
+    integrality[blocks.start] = integrality[blocks.delay] = 0
+    cost = np.zeros(starts[-1])
+    cost[blocks.delay] = objective.coeff[components]
+    cost[blocks.late] = objective.increment[late]
+
+    constraints = _ConstraintBuilder()
+    _add_routing(constraints, columns, graph, big_m)
+    _add_objective(constraints, columns, objective, components, late, big_m)
+    _add_disjunctions(constraints, columns, graph, conflicts, pair_of_conflict.ravel(), order_pairs, big_m)
+    rows, cols, values, row_lower, row_upper = constraints.build()
+    return DisplibMip(
+        cost=cost,
+        lower=lower,
+        upper=upper,
+        integrality=integrality,
+        rows=rows,
+        columns=cols,
+        values=values,
+        row_lower=row_lower,
+        row_upper=row_upper,
+        blocks=blocks,
+        order_pairs=order_pairs,
+        big_m=big_m,
+    )
+
+
+class _Columns(NamedTuple):
+    """Column of a variable in the variable vector."""
+
+    blocks: VariableBlocks
+
+    def start(self, nodes: np.ndarray) -> np.ndarray:
+        return self.blocks.start.start + nodes
+
+    def visited(self, nodes: np.ndarray) -> np.ndarray:
+        return self.blocks.visited.start + nodes
+
+    def route(self, links: np.ndarray) -> np.ndarray:
+        return self.blocks.route.start + links
+
+    def order(self, pairs: np.ndarray) -> np.ndarray:
+        return self.blocks.order.start + pairs
+
+    def delay(self, components: np.ndarray) -> np.ndarray:
+        return self.blocks.delay.start + components
+
+    def late(self, components: np.ndarray) -> np.ndarray:
+        return self.blocks.late.start + components
+
+
+@dataclass(frozen=False, slots=True, init=False)
+class _ConstraintBuilder:
+    """Collects blocks of rows, each given by the (local row, column, value) of its terms and its row bounds."""
+
+    _n_rows: int
+    _rows: list[np.ndarray]
+    _columns: list[np.ndarray]
+    _values: list[np.ndarray]
+    _lower: list[np.ndarray]
+    _upper: list[np.ndarray]
+
+    def __init__(self) -> None:
+        self._n_rows = 0
+        self._rows, self._columns, self._values, self._lower, self._upper = [], [], [], [], []
+
+    def add(
+        self,
+        terms: list[tuple[np.ndarray, np.ndarray, np.ndarray | float]],
+        lower: np.ndarray | float,
+        upper: np.ndarray | float,
+    ) -> None:
+        """`terms` are (local row, column, coefficient) triples, `lower` and `upper` are arrays over the rows."""
+        lower, upper = np.asarray(lower, dtype=np.float64), np.asarray(upper, dtype=np.float64)
+        n_rows = max(lower.size, upper.size)
+        for rows, columns, values in terms:
+            self._rows.append(np.asarray(rows) + self._n_rows)
+            self._columns.append(np.asarray(columns))
+            self._values.append(np.broadcast_to(np.asarray(values, dtype=np.float64), np.shape(columns)))
+        self._lower.append(np.broadcast_to(lower, n_rows))
+        self._upper.append(np.broadcast_to(upper, n_rows))
+        self._n_rows += n_rows
+
+    def build(self) -> tuple[np.ndarray, ...]:
+        empty = np.zeros(0)
+        return (
+            np.concatenate(self._rows or [empty]).astype(np.int64),
+            np.concatenate(self._columns or [empty]).astype(np.int64),
+            np.concatenate(self._values or [empty]),
+            np.concatenate(self._lower or [empty]),
+            np.concatenate(self._upper or [empty]),
+        )
+
+
+def _add_routing(
+    constraints: _ConstraintBuilder, columns: _Columns, graph: CompactDependencyGraph, big_m: float
+) -> None:
+    """Every visited node is left along exactly one link and entered along exactly one, links respect min_duration."""
+    sources, targets = graph.link_sources(), graph.successors
+    links = np.arange(graph.l_count)
+    with_successors = np.flatnonzero(np.diff(graph.successor_offsets) > 0)
+    row = np.searchsorted(with_successors, sources)
+    constraints.add(
+        [(row, columns.route(links), 1.0), (np.arange(len(with_successors)), columns.visited(with_successors), -1.0)],
+        0.0,
+        np.zeros(len(with_successors)),
+    )
+    entered = np.setdiff1d(np.arange(graph.n_count), graph.train_offsets[:-1])
+    by_target = np.argsort(targets, kind="stable")
+    by_target = by_target[np.isin(targets[by_target], entered)]
+    row = np.searchsorted(entered, targets[by_target])
+    constraints.add(
+        [(row, columns.route(by_target), 1.0), (np.arange(len(entered)), columns.visited(entered), -1.0)],
+        0.0,
+        np.zeros(len(entered)),
+    )
+    # t_target >= t_source + min_duration if the link is taken
+    constraints.add(
+        [
+            (links, columns.start(targets), 1.0),
+            (links, columns.start(sources), -1.0),
+            (links, columns.route(links), -big_m),
+        ],
+        graph.min_duration[sources] - big_m,
+        np.full(graph.l_count, np.inf),
+    )
+
+
+def _add_objective(
+    constraints: _ConstraintBuilder,
+    columns: _Columns,
+    objective: DelayObjective,
+    components: np.ndarray,
+    late: np.ndarray,
+    big_m: float,
+) -> None:
+    """delay >= t - threshold and t - threshold <= big_m * late, both only binding if the node is visited."""
+    rows = np.arange(len(components))
+    nodes = objective.nodes[components]
+    constraints.add(
+        [(rows, columns.delay(rows), 1.0), (rows, columns.start(nodes), -1.0), (rows, columns.visited(nodes), -big_m)],
+        -objective.threshold[components] - big_m,
+        np.full(len(components), np.inf),
+    )
+    rows = np.arange(len(late))
+    nodes = objective.nodes[late]
+    constraints.add(
+        [(rows, columns.start(nodes), 1.0), (rows, columns.late(rows), -big_m), (rows, columns.visited(nodes), big_m)],
+        np.full(len(late), -np.inf),
+        objective.threshold[late] + big_m,
+    )
+
+
+def _add_disjunctions(
+    constraints: _ConstraintBuilder,
+    columns: _Columns,
+    graph: CompactDependencyGraph,
+    conflicts: ResourceConflicts,
+    pair_of_conflict: np.ndarray,
+    order_pairs: np.ndarray,
+    big_m: float,
+) -> None:
+    """
+    For every shared resource of a conflicting pair, one of the nodes has to be left and released before the other
+    one starts. order = 1 puts the first node of the pair first.
+
+    A node is left when the chosen successor starts; the release time only applies if that successor does not use
+    the resource as well. A node without successors is left after its min_duration.
+    """
+    n_resources = max(len(graph.resource_names), 1)
+    use_keys = graph.resource_use_nodes() * n_resources + graph.resource_ids
+    key_order = np.argsort(use_keys)
+    sorted_keys = use_keys[key_order]
+    for holder, other in ((conflicts.first, conflicts.second), (conflicts.second, conflicts.first)):
+        # holder before other is enforced if order == 1 for the first node of the pair and order == 0 for the second
+        holder_is_first = holder == order_pairs[pair_of_conflict, 0]
+        sign = np.where(holder_is_first, 1.0, -1.0)
+        release = graph.release_times[
+            key_order[np.searchsorted(sorted_keys, holder * n_resources + conflicts.resource_ids)]
+        ]
+        order_columns = columns.order(pair_of_conflict)
+
+        # holder continues along a link: t_next + release - t_other <= M (3 - [holder first] - route - visited_other)
+        row, links = _links_of(graph, holder)
+        nexts = graph.successors[links]
+        stays = np.isin(nexts * n_resources + conflicts.resource_ids[row], sorted_keys)
+        constant = np.where(holder_is_first, 3.0, 2.0)[row] * big_m - np.where(stays, 0.0, release[row])
+        local = np.arange(len(links))
+        constraints.add(
+            [
+                (local, columns.start(nexts), 1.0),
+                (local, columns.start(other[row]), -1.0),
+                (local, order_columns[row], sign[row] * big_m),
+                (local, columns.route(links), big_m),
+                (local, columns.visited(other[row]), big_m),
+            ],
+            np.full(len(links), -np.inf),
+            constant,
+        )
+
+        # holder is the last operation: t_holder + min_duration + release - t_other <= M (...)
+        terminal = np.flatnonzero(np.diff(graph.successor_offsets)[holder] == 0)
+        local = np.arange(len(terminal))
+        constraints.add(
+            [
+                (local, columns.start(holder[terminal]), 1.0),
+                (local, columns.start(other[terminal]), -1.0),
+                (local, order_columns[terminal], sign[terminal] * big_m),
+                (local, columns.visited(holder[terminal]), big_m),
+                (local, columns.visited(other[terminal]), big_m),
+            ],
+            np.full(len(terminal), -np.inf),
+            np.where(holder_is_first, 3.0, 2.0)[terminal] * big_m
+            - graph.min_duration[holder[terminal]]
+            - release[terminal],
+        )
+
+
+def _links_of(graph: CompactDependencyGraph, nodes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Index into `nodes` and link of every outgoing link of `nodes`."""
+    starts, counts = graph.successor_offsets[nodes], np.diff(graph.successor_offsets)[nodes]
+    row = np.repeat(np.arange(len(nodes)), counts)
+    return row, np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + starts[row]
+
+
+def solve_displib_mip(mip: DisplibMip, options: MipOptions = MipOptions()) -> MipResult:
+    if options.solver == "gurobi":
+        return _solve_with_gurobi(mip, options)
+    return _solve_with_highs(mip, options)
+
+
+def _solve_with_highs(mip: DisplibMip, options: MipOptions) -> MipResult:
+    from scipy.optimize import Bounds, LinearConstraint, milp  # pylint: disable=import-outside-toplevel
+
+    solver_options: dict[str, bool | float] = {"disp": options.verbose}
+    if options.time_limit is not None:
+        solver_options["time_limit"] = options.time_limit
+    result = milp(
+        mip.cost,
+        integrality=mip.integrality,
+        bounds=Bounds(mip.lower, mip.upper),
+        constraints=LinearConstraint(mip.matrix(), mip.row_lower, mip.row_upper),
+        options=solver_options,
+    )
+    bound = getattr(result, "mip_dual_bound", np.nan)
+    objective_value = float(result.fun) if result.x is not None else np.inf
+    return MipResult(status=result.message, solution=result.x, objective_value=objective_value, bound=float(bound))
+
+
+def _solve_with_gurobi(mip: DisplibMip, options: MipOptions) -> MipResult:
+    import gurobipy as grb  # pylint: disable=import-outside-toplevel
+
+    matrix = mip.matrix()
+    with grb.Env(params={"OutputFlag": int(options.verbose)}) as env, grb.Model(env=env) as model:
+        if options.time_limit is not None:
+            model.Params.TimeLimit = options.time_limit
+        vtype = np.where(mip.integrality == 1, grb.GRB.BINARY, grb.GRB.CONTINUOUS)
+        variables = model.addMVar(mip.n_variables, lb=mip.lower, ub=mip.upper, vtype=vtype, obj=mip.cost)
+        equal = mip.row_lower == mip.row_upper
+        for rows, sense, rhs in (
+            (np.flatnonzero(equal), grb.GRB.EQUAL, mip.row_lower),
+            (np.flatnonzero(~equal & np.isfinite(mip.row_upper)), grb.GRB.LESS_EQUAL, mip.row_upper),
+            (np.flatnonzero(~equal & np.isfinite(mip.row_lower)), grb.GRB.GREATER_EQUAL, mip.row_lower),
+        ):
+            if len(rows) > 0:
+                model.addMConstr(matrix[rows], variables, sense, rhs[rows])
+        model.optimize()
+        if model.SolCount == 0:
+            return MipResult(status=str(model.Status), solution=None, objective_value=np.inf, bound=model.ObjBound)
+        return MipResult(
+            status=str(model.Status), solution=variables.X, objective_value=model.ObjVal, bound=model.ObjBound
+        )
+
+
+def solve_instance(compiled: CompiledInstance, options: MipOptions = MipOptions()) -> tuple[Schedule | None, dict]:
+    """Build and solve the MIP of an instance, the schedule refers to the nodes of the original instance."""
+    statistics: dict[str, Any] = {}
+    started = time.perf_counter()
+    reduced = reduce_instance(compiled) if options.reduce else None
+    instance = compiled if reduced is None else reduced.instance
+    graph = CompactDependencyGraph.from_compiled_instance(instance)
+    mip = build_displib_mip(graph, DelayObjective.from_compiled_instance(instance), options.horizon)
+    statistics["build_seconds"] = time.perf_counter() - started
+    statistics["variables"], statistics["constraints"] = mip.n_variables, mip.n_constraints
+    statistics["conflict_pairs"] = len(mip.order_pairs)
+
+    started = time.perf_counter()
+    result = solve_displib_mip(mip, options)
+    statistics["solve_seconds"] = time.perf_counter() - started
+    statistics["status"], statistics["objective_value"], statistics["bound"] = (
+        result.status,
+        result.objective_value,
+        result.bound,
+    )
+    if result.solution is None:
+        return None, statistics
+    schedule = mip.schedule(graph, result.solution)
+    return (schedule if reduced is None else reduced.expand_schedule(schedule)), statistics
+
+
+def main(path: Path, path_to_solution: Path | None, options: MipOptions) -> None:
+    compiled = CompiledInstance.from_json(path)
+    schedule, statistics = solve_instance(compiled, options)
+    for key, value in statistics.items():
+        print(f"{key:<16} {value}")
+    if schedule is None:
+        return
+    graph = CompactDependencyGraph.from_compiled_instance(compiled)
+    objective_value = DelayObjective.from_compiled_instance(compiled).evaluate(schedule.start)
+    print(f"{'feasible':<16} {verify_schedule(graph, schedule).feasible}")
+    print(f"{'objective':<16} {objective_value}")
+    if path_to_solution is not None:
+        path_to_solution.parent.mkdir(exist_ok=True, parents=True)
+        schedule.write_json(graph, path_to_solution, objective_value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--path_to_solution", type=Path, default=None)
+    parser.add_argument("--solver", choices=["highs", "gurobi"], default="highs")
+    parser.add_argument("--time_limit", type=float, default=None)
+    parser.add_argument("--horizon", type=float, default=None)
+    parser.add_argument("--no_reduce", dest="reduce", action="store_false")
+    parser.add_argument("--verbose", action="store_true")
+    arguments = vars(parser.parse_args())
+    main(arguments.pop("path"), arguments.pop("path_to_solution"), MipOptions(**arguments))
@@ -0,0 +1,22 @@
+import argparse
+from pathlib import Path
+
+from tqdm import tqdm
+
+from hackthetrack.displib.synthetic import GeneratorOptions, write_instance
+
+
+def main(path_to_output: Path, sizes: list[int], trains_per_corridor: int, seed: int) -> None:
+    """Write one instance per size with a constant number of trains per corridor, e.g. for scripts.profile_instances."""
+    for n_trains in tqdm(sizes):
+        options = GeneratorOptions(n_trains=n_trains, n_corridors=max(n_trains // trains_per_corridor, 1), seed=seed)
+        write_instance(path_to_output / f"synthetic_{n_trains}_seed_{seed}.json", options)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path_to_output", type=Path, default=Path("out/instances/synthetic"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--trains_per_corridor", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    main(**vars(parser.parse_args()))
@@ -1,13 +1,16 @@
+import re
 from collections import defaultdict
 from collections.abc import Collection
 from typing import Hashable, NamedTuple
 
+import numpy as np
 from _plotly_utils.colors import sample_colorscale
 from plotly import express as px
 from plotly import graph_objects as go
 from ugraph.plot import ColorMap
 
-from hackthetrack.dependencygraph import DependencyGraph
+from hackthetrack.dependencygraph import CompactDependencyGraph, DependencyGraph
+from hackthetrack.dependencygraph.propagation import propagate_start_bounds
 
 
 def create_colormap(elements: Collection[Hashable], default_color: str | None = None) -> ColorMap:
@@ -32,13 +35,31 @@ class Occupation(NamedTuple):
     start_ub: float
 
 
+class _OccupationColumns(NamedTuple):
+    """The fields of many occupations as one array per field."""
+
+    start: np.ndarray
+    end: np.ndarray
+    resource: np.ndarray
+    train: np.ndarray
+    operation: np.ndarray
+    release_time: np.ndarray
+    min_duration: np.ndarray
+    start_lb: np.ndarray
+    start_ub: np.ndarray
+
+    @classmethod
+    def from_occupations(cls, occupations: Collection[Occupation]) -> "_OccupationColumns":
+        return cls(*(np.asarray(column) for column in zip(*occupations)))
+
+
 def find_all_occupations_with_dfs(network: DependencyGraph) -> tuple[Occupation, ...]:
     occupations = []
-    for train in network.weak_components():
-        train_nodes = train.all_nodes
+    for train in network.trains():
+        train_nodes = train.nodes()
         completed_time = [node.start_lb for node in train_nodes]
         start_time = [-float("inf") for _ in train_nodes]
-        for node_index, parent_index in zip(*train.underlying_digraph.dfs(0)):
+        for node_index, parent_index in train.dfs():
             if parent_index == -1:
                 start_time[node_index] = 0
                 start_lb = 0 if completed_time[node_index] is None else completed_time[node_index]
@@ -66,53 +87,128 @@ def find_all_occupations_with_dfs(network: DependencyGraph) -> tuple[Occupation,
     return tuple(occupations)
 
 
+def find_all_occupations(graph: CompactDependencyGraph) -> tuple[Occupation, ...]:
+    """Occupations of all operations when every operation starts as early as possible."""
+    start = propagate_start_bounds(graph).earliest
+    nodes = graph.resource_use_nodes()
+    return tuple(
+        map(
+            Occupation._make,
+            zip(
+                start[nodes].tolist(),
+                (start + graph.min_duration)[nodes].tolist(),
+                [graph.resource_names[resource_id] for resource_id in graph.resource_ids.tolist()],
+                graph.train_ids[nodes].tolist(),
+                graph.local_indices[nodes].tolist(),
+                graph.release_times.tolist(),
+                graph.min_duration[nodes].tolist(),
+                graph.effective_start_lb[nodes].tolist(),
+                graph.effective_start_ub[nodes].tolist(),
+            ),
+        )
+    )
+
+
 def _split_in_string_and_number(s: str) -> tuple[str, int]:
-    i = 0
-    for i, c in enumerate(s):
-        if not c.isdigit():
-            break
-    i += 1
-    return s[:i], int(s[i:])
+    """Split a resource name into its text and its trailing number, names without a number come first."""
+    match = re.fullmatch(r"(.*?)(\d*)", s)
+    if match is None:
+        return s, -1
+    text, number = match.groups()
+    return text, int(number) if number else -1
+
+
+class PlotOptions(NamedTuple):
+    webgl: bool = False  # Scattergl traces are drawn by the GPU, which keeps huge figures responsive
+    time_window: tuple[float, float] | None = None  # only occupations overlapping (begin, end) are drawn
+    resources: Collection[str] | None = None  # only occupations of these resources are drawn
+
 
+def plot_occupations(occupations: Collection[Occupation], options: PlotOptions = PlotOptions()) -> go.Figure:
+    """
+    Draw every occupation as a vertical line at its resource, followed by a dashed line for the release time.
 
-def plot_occupations(occupations: Collection[Occupation]) -> go.Figure:
+    All occupations of a train form a single trace of segments separated by NaN, hover texts are passed as
+    customdata, so the figure has two traces per train instead of two per occupation.
+    """
+    occupations = _filter_occupations(occupations, options)
     # find all the resources, so we can sort them (assign an index)
     # resources have a string part (predecessor) and a number part (index)
     # sort on string and then on number
     resources = frozenset(occupation.resource for occupation in occupations)
-    resource_to_index = {
-        resource: i for i, resource in enumerate(sorted(resources, key=lambda x: _split_in_string_and_number(x)))
-    }
+    resource_to_index = {resource: i for i, resource in enumerate(sorted(resources, key=_split_in_string_and_number))}
 
     # find all the trains, so we can give them a color
     trains = sorted(frozenset(occupation.train for occupation in occupations))
     train_to_color = create_colormap(trains)
 
     figure = go.Figure()
-    for occupation in occupations:
+    figure.update_layout(xaxis={"tickvals": list(range(len(resources))), "ticktext": list(resource_to_index.keys())})
+    if not occupations:
+        return figure
+
+    columns = _OccupationColumns.from_occupations(occupations)
+    positions = np.fromiter((resource_to_index[resource] for resource in columns.resource), dtype=float)
+    hover_data = np.column_stack([column.astype(object) for column in columns[2:]])
+    scatter = go.Scattergl if options.webgl else go.Scatter
+    order = np.argsort(columns.train, kind="stable")
+    boundaries = np.flatnonzero(np.diff(columns.train[order])) + 1
+    for group in np.split(order, boundaries):
+        train = int(columns.train[group[0]])
+        end = columns.end[group]
         figure.add_trace(
-            go.Scatter(
-                y=[occupation.start, occupation.end],
-                x=[resource_to_index[occupation.resource], resource_to_index[occupation.resource]],
+            scatter(
+                y=_segments(columns.start[group], end),
+                x=_segments(positions[group], positions[group]),
                 mode="lines",
-                line={"color": train_to_color[occupation.train], "width": 10},
-                name=f"Train {occupation.train} Operation {occupation.operation}",
-                hoverinfo="text",
-                showlegend=False,
-                hovertext=f"Resource: {occupation.resource}<br>Train: {occupation.train}<br>Operation: {occupation.operation}<br>Release time: {occupation.release_time}<br>Min duration: {occupation.min_duration}<br>Start LB: {occupation.start_lb}<br>Start UB: {occupation.start_ub}",
+                line={"color": train_to_color[train], "width": 10},
+                name=f"Train {train}",
+                legendgroup=str(train),
+                customdata=np.repeat(hover_data[group], 3, axis=0),
+                hovertemplate=_HOVER_TEMPLATE,
             )
         )
-        # add lower bound with opacity 0.5
+        # add release times with a dashed line
+        released = columns.release_time[group] > 0
         figure.add_trace(
-            go.Scatter(
-                y=[occupation.end, occupation.end + occupation.release_time],
-                x=[resource_to_index[occupation.resource], resource_to_index[occupation.resource]],
+            scatter(
+                y=_segments(end[released], end[released] + columns.release_time[group][released]),
+                x=_segments(positions[group][released], positions[group][released]),
                 mode="lines",
-                line={"color": train_to_color[occupation.train], "width": 1, "dash": "dash"},
-                name=f"Train {occupation.train} Operation {occupation.operation} Start LB",
-                hoverinfo="text",
+                line={"color": train_to_color[train], "width": 1, "dash": "dash"},
+                name=f"Train {train} release times",
+                legendgroup=str(train),
+                hoverinfo="skip",
                 showlegend=False,
             )
         )
-    figure.update_layout(xaxis={"tickvals": list(range(len(resources))), "ticktext": list(resource_to_index.keys())})
     return figure
+
+
+_HOVER_TEMPLATE = (
+    "Resource: %{customdata[0]}<br>Train: %{customdata[1]}<br>Operation: %{customdata[2]}<br>"
+    "Release time: %{customdata[3]}<br>Min duration: %{customdata[4]}<br>Start LB: %{customdata[5]}<br>"
+    "Start UB: %{customdata[6]}<extra></extra>"
+)
+
+
+def _filter_occupations(occupations: Collection[Occupation], options: PlotOptions) -> list[Occupation]:
+    kept = list(occupations)
+    if options.resources is not None:
+        resources = frozenset(options.resources)
+        kept = [occupation for occupation in kept if occupation.resource in resources]
+    if options.time_window is not None:
+        begin, end = options.time_window
+        kept = [
+            occupation
+            for occupation in kept
+            if occupation.start <= end and occupation.end + occupation.release_time >= begin
+        ]
+    return kept
+
+
+def _segments(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Coordinates of the line segments (first[i], second[i]), separated by NaN."""
+    coordinates = np.full((len(first), 3), np.nan)
+    coordinates[:, 0], coordinates[:, 1] = first, second
+    return coordinates.ravel()
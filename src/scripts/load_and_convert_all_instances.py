@@ -1,43 +1,42 @@
 import argparse
+import os
+import shutil
+import tempfile
+import time
 from collections import defaultdict
-from itertools import permutations
-from pathlib import Path
-from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import Iterator, NamedTuple
 from zipfile import ZipFile
 
 from tqdm import tqdm
 from ugraph import EndNodeIdPair
 from ugraph.plot import ColorMap, add_2d_ugraph_to_figure
 
-from hackthetrack.dependencygraph import DependencyGraph, Link, LinkType
-from hackthetrack.displib import DisplibInstance
+from hackthetrack.dependencygraph import CompactDependencyGraph, DependencyGraph, Link, LinkType
+from hackthetrack.dependencygraph.conflicts import ResourceConflictIndex
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.displib.streaming import open_displib_json
 from scripts.assign_directions import use_igraph_to_update_x_and_y_coordinates
 
+EXTRACT = "extract"
+DEPENDENCY_GRAPH = "dependency_graph"
+STANDARD_FIGURE = "standard_figure"
+PRECEDENCE_FIGURE = "precedence_figure"
 
-def add_precedence_links(network: DependencyGraph) -> None:
-    by_resource = defaultdict(list)
-    for node in network.all_nodes:
-        for resources in node.resources:
-            by_resource[resources.name].append(node)
 
+def add_precedence_links(network: DependencyGraph, graph: CompactDependencyGraph) -> None:
+    """Link every pair of operations of different trains whose occupation windows on a shared resource overlap."""
+    conflicts = ResourceConflictIndex.from_graph(graph).conflicts().node_pairs().tolist()
     links_to_add = []
-    for group in by_resource.values():
-        for origin, destination in permutations(group, r=2):
-            cannot_collide = origin.train_id == destination.train_id
-            if cannot_collide:
-                continue
-            links_to_add.append((EndNodeIdPair((origin.id, destination.id)), Link(LinkType.PRECEDENCE)))
+    for first, second in conflicts:
+        first_id, second_id = graph.node_id(first), graph.node_id(second)
+        links_to_add.append((EndNodeIdPair((first_id, second_id)), Link(LinkType.PRECEDENCE)))
+        links_to_add.append((EndNodeIdPair((second_id, first_id)), Link(LinkType.PRECEDENCE)))
     network.add_links(links_to_add)
 
 
-def unzip_instances(path_to_instances: Path, path_to_dump: Path) -> None:
-    path_to_dump.mkdir(exist_ok=True, parents=True)
-    for set_of_instances in path_to_instances.glob("*.zip"):
-        if set_of_instances.is_file():
-            with ZipFile(set_of_instances, "r") as zip_ref:
-                zip_ref.extractall(path_to_dump)
-
-
 class Options(NamedTuple):
     path_to_instances: Path = Path("instances")
     path_to_save_instances: Path = Path("out/instances")
@@ -45,34 +44,155 @@ class Options(NamedTuple):
     path_to_figures: Path = Path("out/figures")
     do_standard_figure: bool = True
     do_precedence_figure: bool = False  # disabled as it takes a long time to compute
+    workers: int | None = None  # None uses all cores, 1 converts in the current process
+    force: bool = False  # redo every stage even if its outputs are newer than its inputs
+
+
+class ConversionTask(NamedTuple):
+    """One instance inside a zip archive, the outputs of every stage and the stages that have to be redone."""
+
+    archive: Path
+    member: str
+    outputs: dict[str, tuple[Path, ...]]
+    stages: frozenset[str]
 
 
 def load_and_convert_all_displib_instances(options: Options = Options()) -> None:
-    unzip_instances(path_to_instances=options.path_to_instances, path_to_dump=options.path_to_save_instances)
-    if options.do_precedence_figure or options.do_standard_figure:
-        options.path_to_figures.mkdir(exist_ok=True, parents=True)
-    options.path_to_dependency_graphs.mkdir(exist_ok=True, parents=True)
-
-    all_paths = [
-        path
-        for directory in options.path_to_save_instances.iterdir()
-        if directory.is_dir()
-        for path in directory.glob("*.json")
-    ]
-
-    for path_to_instance in tqdm(all_paths, desc="Converting instances", colour="green", unit="instance"):
-        network = DependencyGraph.from_displib_instance(DisplibInstance.from_json(path_to_instance))
-        network.write_json(options.path_to_dependency_graphs / f"{path_to_instance.name}.DependencyGraph.json")
+    """
+    Convert all instances of all zip archives in parallel, one instance per task.
+
+    Instances are parsed straight out of the archives, the extracted json is only written as an output of its own.
+    Every stage writes its outputs atomically and is skipped if its outputs are newer than its input, so an
+    interrupted run resumes where it stopped.
+    """
+    started = time.perf_counter()
+    tasks = [task for task in _collect_tasks(options) if task.stages]
+    timings: dict[str, list[float]] = defaultdict(list)
+    progress = tqdm(total=len(tasks), desc="Converting instances", colour="green", unit="instance")
+    if options.workers == 1:
+        for task in tasks:
+            _add_timings(timings, _convert_instance(task))
+            progress.update()
+    else:
+        with ProcessPoolExecutor(max_workers=options.workers) as executor:
+            for future in as_completed([executor.submit(_convert_instance, task) for task in tasks]):
+                _add_timings(timings, future.result())
+                progress.update()
+    progress.close()
+    _print_timings(timings, time.perf_counter() - started)
+
+
+def _collect_tasks(options: Options) -> Iterator[ConversionTask]:
+    for archive in sorted(options.path_to_instances.glob("*.zip")):
+        if not archive.is_file():
+            continue
+        with ZipFile(archive, "r") as zip_file:
+            members = [info.filename for info in zip_file.infolist() if info.filename.endswith(".json")]
+        for member in members:
+            parts = PurePosixPath(member).parts
+            if ".." in parts:
+                continue
+            outputs = _outputs(options, options.path_to_save_instances.joinpath(*parts))
+            stages = _outdated_stages(outputs, archive.stat().st_mtime) if not options.force else frozenset(outputs)
+            yield ConversionTask(archive=archive, member=member, outputs=outputs, stages=stages)
+
+
+def _outputs(options: Options, path_to_instance: Path) -> dict[str, tuple[Path, ...]]:
+    outputs: dict[str, tuple[Path, ...]] = {
+        EXTRACT: (path_to_instance,),
+        DEPENDENCY_GRAPH: (options.path_to_dependency_graphs / f"{path_to_instance.name}.DependencyGraph.json",),
+    }
+    if options.do_standard_figure:
+        outputs[STANDARD_FIGURE] = (
+            options.path_to_figures / f"{path_to_instance.stem}.jpg",
+            options.path_to_figures / f"{path_to_instance.stem}.html",
+        )
+    if options.do_precedence_figure:
+        outputs[PRECEDENCE_FIGURE] = (options.path_to_figures / f"{path_to_instance.stem}.with_precedence_links.jpg",)
+    return outputs
+
+
+def _outdated_stages(outputs: dict[str, tuple[Path, ...]], archive_modified: float) -> frozenset[str]:
+    """The extracted json depends on the archive, all other stages depend on the extracted json."""
+    if not _is_up_to_date(outputs[EXTRACT], archive_modified):
+        return frozenset(outputs)
+    instance_modified = outputs[EXTRACT][0].stat().st_mtime
+    return frozenset(stage for stage, paths in outputs.items() if not _is_up_to_date(paths, instance_modified))
+
+
+def _is_up_to_date(paths: tuple[Path, ...], input_modified: float) -> bool:
+    return all(path.is_file() and path.stat().st_mtime >= input_modified for path in paths)
+
+
+def _convert_instance(task: ConversionTask) -> dict[str, float]:
+    """Redo the outdated stages of one instance and return the seconds spent per stage."""
+    timings: dict[str, float] = {}
+    path_to_instance = task.outputs[EXTRACT][0]
+    if EXTRACT in task.stages:
+        with _timed(timings, EXTRACT), ZipFile(task.archive, "r") as zip_file:
+            with zip_file.open(task.member) as source, _atomic_output(path_to_instance) as temporary:
+                with open(temporary, "wb") as target:
+                    shutil.copyfileobj(source, target)
+    if not task.stages - {EXTRACT}:
+        return timings
+
+    with _timed(timings, "parse"), open_displib_json(task.archive, task.member) as file:
+        graph = CompactDependencyGraph.from_compiled_instance(CompiledInstance.from_stream(file))
+    with _timed(timings, "build_graph"):
+        network = graph.to_dependency_graph()
+    if DEPENDENCY_GRAPH in task.stages:
+        with _timed(timings, DEPENDENCY_GRAPH), _atomic_output(task.outputs[DEPENDENCY_GRAPH][0]) as temporary:
+            network.write_json(temporary)
+    if not task.stages & {STANDARD_FIGURE, PRECEDENCE_FIGURE}:
+        return timings
+
+    with _timed(timings, "layout"):
         use_igraph_to_update_x_and_y_coordinates(network)
-        if options.do_standard_figure:
-            network.debug_plot(options.path_to_figures / f"{path_to_instance.stem}.jpg")
-            add_2d_ugraph_to_figure(network, color_map=ColorMap(defaultdict(lambda: "black"))).write_html(
-                options.path_to_figures / f"{path_to_instance.stem}.html"
-            )
-
-        if options.do_precedence_figure:
-            add_precedence_links(network)
-            network.debug_plot(options.path_to_figures / f"{path_to_instance.stem}.with_precedence_links.jpg")
+    if STANDARD_FIGURE in task.stages:
+        jpg, html = task.outputs[STANDARD_FIGURE]
+        with _timed(timings, STANDARD_FIGURE), _atomic_output(jpg) as temporary_jpg, _atomic_output(html) as temporary:
+            network.debug_plot(temporary_jpg)
+            add_2d_ugraph_to_figure(network, color_map=ColorMap(defaultdict(lambda: "black"))).write_html(temporary)
+    if PRECEDENCE_FIGURE in task.stages:
+        with _timed(timings, PRECEDENCE_FIGURE), _atomic_output(task.outputs[PRECEDENCE_FIGURE][0]) as temporary:
+            add_precedence_links(network, graph)
+            network.debug_plot(temporary)
+    return timings
+
+
+@contextmanager
+def _timed(timings: dict[str, float], stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    yield
+    timings[stage] = time.perf_counter() - started
+
+
+@contextmanager
+def _atomic_output(path: Path) -> Iterator[Path]:
+    """Temporary file next to `path` that replaces `path` once the block completed, keeping all suffixes."""
+    path.parent.mkdir(exist_ok=True, parents=True)
+    descriptor, temporary = tempfile.mkstemp(prefix=f".{path.name}.", suffix="".join(path.suffixes), dir=path.parent)
+    os.close(descriptor)
+    try:
+        yield Path(temporary)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+
+
+def _add_timings(timings: dict[str, list[float]], instance_timings: dict[str, float]) -> None:
+    for stage, seconds in instance_timings.items():
+        timings[stage].append(seconds)
+
+
+def _print_timings(timings: dict[str, list[float]], wall_time: float) -> None:
+    for stage, seconds in timings.items():
+        print(
+            f"{stage:<18} {len(seconds):>5} instances {sum(seconds):>9.2f}s total "
+            f"{sum(seconds) / len(seconds):>8.3f}s mean {max(seconds):>8.3f}s max"
+        )
+    print(f"{'wall time':<18} {wall_time:>25.2f}s")
 
 
 if __name__ == "__main__":
@@ -83,4 +203,6 @@ if __name__ == "__main__":
     parser.add_argument("--path_to_figures", type=Path, default=Path("out/figures"))
     parser.add_argument("--do_standard_figure", action="store_true")
     parser.add_argument("--do_precedence_figure", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true")
     load_and_convert_all_displib_instances(Options(**vars(parser.parse_args())))
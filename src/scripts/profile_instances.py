@@ -0,0 +1,65 @@
+import argparse
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Literal, NamedTuple
+
+from tqdm import tqdm
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.dependencygraph.conflicts import ResourceConflictIndex
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.instrumentation import instrumented, profiled
+from hackthetrack.solution import DelayObjective, verify_schedule
+from hackthetrack.solvers import LnsOptions, dispatch_greedily, earliest_start_lb, solve_with_lns
+from hackthetrack.statistics_logger import StatisticsLogger
+
+
+class Options(NamedTuple):
+    path_to_output: Path = Path("out/profiles")
+    lns_seconds: float = 0.0  # LNS after the greedy dispatch, skipped if 0
+    trace: bool = True  # write a Chrome trace per instance next to the json summary
+    profiler: Literal["cprofile", "pyinstrument"] | None = None
+
+
+def profile_instance(path: Path, logger: StatisticsLogger, options: Options = Options()) -> dict[str, float | int]:
+    """Run the pipeline on one instance with instrumentation and store the timers and counters as statistics."""
+    options.path_to_output.mkdir(exist_ok=True, parents=True)
+    output = options.path_to_output / path.stem
+    profile = nullcontext() if options.profiler is None else profiled(output.with_suffix(".prof"), options.profiler)
+    with instrumented(trace=options.trace) as instrumentation:
+        with profile:
+            compiled = CompiledInstance.from_json(path, cache_directory=None)
+            graph = CompactDependencyGraph.from_compiled_instance(compiled)
+            ResourceConflictIndex.from_graph(graph).conflicts()
+            schedule = dispatch_greedily(graph, earliest_start_lb).schedule
+            verify_schedule(graph, schedule)
+            if options.lns_seconds > 0:
+                objective = DelayObjective.from_compiled_instance(compiled)
+                try:
+                    solve_with_lns(graph, objective, LnsOptions(options.lns_seconds))
+                except ValueError:
+                    pass  # some instances have no insertion order respecting all start_ub
+    instrumentation.write_json(output.with_suffix(".json"))
+    if options.trace:
+        instrumentation.write_chrome_trace(output.with_suffix(".trace.json"))
+    with logger.batch() as batch:
+        instrumentation.update_statistics(batch, path.stem)
+    return instrumentation.summary()
+
+
+def main(paths: list[Path], options: Options) -> None:
+    logger = StatisticsLogger()
+    for path in tqdm(paths):
+        profile_instance(path, logger, options)
+    print(logger.to_frame().filter(like=" seconds").loc[[path.stem for path in paths]].to_string())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", type=Path, nargs="+")
+    parser.add_argument("--path_to_output", type=Path, default=Path("out/profiles"))
+    parser.add_argument("--lns_seconds", type=float, default=0.0)
+    parser.add_argument("--no_trace", dest="trace", action="store_false")
+    parser.add_argument("--profiler", choices=["cprofile", "pyinstrument"], default=None)
+    arguments = vars(parser.parse_args())
+    main(arguments.pop("paths"), Options(**arguments))
@@ -0,0 +1,228 @@
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, NamedTuple
+
+import numpy as np
+
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.solution import DelayObjective, ObjectiveLowerBound, Schedule, verify_schedule
+from hackthetrack.solvers import (
+    LnsHooks,
+    LnsOptions,
+    dispatch_greedily,
+    earliest_start_lb,
+    first_come_first_served,
+    objective_weighted,
+    reduce_instance,
+    solve_with_lns,
+)
+
+
+class PortfolioOptions(NamedTuple):
+    time_limit: float = 60.0  # wall-clock seconds for the whole run, including writing the solution
+    lns_workers: int | None = None  # defaults to the cores left over by the other workers
+    mip: bool = True
+    hexaly: bool = True  # only used if hexaly is installed
+    margin: float = 2.0  # seconds reserved for stopping the workers and writing the solution
+
+
+@dataclass(frozen=True, slots=True)
+class SharedIncumbent:
+    """
+    The best schedule found by any worker, kept in shared memory so every process can read and replace it.
+
+    Workers only offer schedules better than the current one; readers compare objective_value first and copy the
+    arrays only if the incumbent has improved. Once stopped, workers neither offer nor read any more, so a worker
+    terminated afterwards cannot leave the lock held.
+    """
+
+    lock: Any
+    stopped: Any
+    value: Any  # objective value, inf while there is none
+    worker: Any  # index of the worker that found the incumbent
+    start: Any
+    next_node: Any
+
+    @classmethod
+    def create(cls, n_count: int) -> "SharedIncumbent":
+        return cls(
+            lock=multiprocessing.Lock(),
+            stopped=multiprocessing.Event(),
+            value=multiprocessing.RawValue("d", float("inf")),
+            worker=multiprocessing.RawValue("i", -1),
+            start=multiprocessing.RawArray("d", n_count),
+            next_node=multiprocessing.RawArray("q", n_count),
+        )
+
+    @property
+    def objective_value(self) -> float:
+        return self.value.value
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def offer(self, schedule: Schedule, objective_value: float, worker: int) -> bool:
+        """Replace the incumbent if the schedule is better and the incumbent is not stopped, returns True if it was."""
+        if objective_value >= self.value.value or self.stopped.is_set():
+            return False
+        with self.lock:
+            if objective_value >= self.value.value or self.stopped.is_set():
+                return False
+            np.frombuffer(self.start, dtype=np.float64)[:] = schedule.start
+            np.frombuffer(self.next_node, dtype=np.int64)[:] = schedule.next_node
+            self.value.value, self.worker.value = objective_value, worker
+        return True
+
+    def schedule(self) -> Schedule:
+        with self.lock:
+            return Schedule(
+                start=np.frombuffer(self.start, dtype=np.float64).copy(),
+                next_node=np.frombuffer(self.next_node, dtype=np.int64).copy(),
+            )
+
+    def better_than(self, objective_value: float) -> Schedule | None:
+        """A copy of the incumbent if it is better than `objective_value`, used as LnsHooks.incumbent."""
+        return self.schedule() if self.value.value < objective_value and not self.stopped.is_set() else None
+
+
+class _Worker(NamedTuple):
+    name: str
+    run: Callable[..., None]
+    arguments: tuple
+
+
+def run_portfolio(compiled: CompiledInstance, options: PortfolioOptions = PortfolioOptions()) -> tuple[Schedule, dict]:
+    """
+    Run greedy dispatch, LNS with different seeds, the MIP and Hexaly in parallel processes until the deadline.
+
+    All workers publish feasible schedules to one SharedIncumbent; LNS workers continue from it whenever another
+    worker is ahead. Workers stop themselves `margin` seconds before the deadline. Stragglers are terminated after
+    the incumbent has been stopped and they had a moment to leave it.
+    """
+    deadline = time.monotonic() + options.time_limit - options.margin
+    graph = CompactDependencyGraph.from_compiled_instance(compiled)
+    incumbent = SharedIncumbent.create(graph.n_count)
+    workers = _workers(options)
+    processes = [
+        multiprocessing.Process(target=worker.run, args=(compiled, incumbent, index, deadline) + worker.arguments)
+        for index, worker in enumerate(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(max(deadline + options.margin / 2 - time.monotonic(), 0.0))
+    incumbent.stop()
+    for process in processes:
+        process.join(max(deadline + 3 * options.margin / 4 - time.monotonic(), 0.0))
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+    lower_bound = ObjectiveLowerBound.from_graph(graph, DelayObjective.from_compiled_instance(compiled))
+    statistics = {
+        "workers": [worker.name for worker in workers],
+        "objective_value": incumbent.objective_value,
+        "lower_bound": lower_bound.value,
+        "gap": lower_bound.gap(incumbent.objective_value),
+    }
+    if incumbent.worker.value < 0:
+        return Schedule(start=np.full(graph.n_count, np.nan), next_node=np.full(graph.n_count, -1)), statistics
+    statistics["found_by"] = workers[incumbent.worker.value].name
+    return incumbent.schedule(), statistics
+
+
+def _workers(options: PortfolioOptions) -> list[_Worker]:
+    workers = [_Worker("greedy", _run_greedy, ())]
+    if options.mip and importlib.util.find_spec("scipy") is not None:
+        workers.append(_Worker("mip", _run_mip, ()))
+    if options.hexaly and importlib.util.find_spec("hexaly") is not None:
+        workers.append(_Worker("hexaly", _run_hexaly, ()))
+    n_lns = options.lns_workers if options.lns_workers is not None else max((os.cpu_count() or 1) - len(workers), 1)
+    workers.extend(_Worker(f"lns_{seed}", _run_lns, (seed,)) for seed in range(n_lns))
+    return workers
+
+
+def _run_greedy(compiled: CompiledInstance, incumbent: SharedIncumbent, index: int, deadline: float) -> None:
+    graph = CompactDependencyGraph.from_compiled_instance(compiled)
+    objective = DelayObjective.from_compiled_instance(compiled)
+    for rule in [earliest_start_lb, lambda graph: objective_weighted(graph, objective), first_come_first_served]:
+        if time.monotonic() >= deadline:
+            return
+        result = dispatch_greedily(graph, rule)
+        if result.complete and verify_schedule(graph, result.schedule).feasible:
+            incumbent.offer(result.schedule, objective.evaluate(result.schedule.start), index)
+
+
+def _run_lns(compiled: CompiledInstance, incumbent: SharedIncumbent, index: int, deadline: float, seed: int) -> None:
+    graph = CompactDependencyGraph.from_compiled_instance(compiled)
+    objective = DelayObjective.from_compiled_instance(compiled)
+
+    def offer(schedule: Schedule, objective_value: float) -> None:
+        if not np.any(np.isnan(schedule.start[graph.train_offsets[:-1]])):  # trains the search could not route
+            incumbent.offer(schedule, objective_value, index)
+
+    hooks = LnsHooks(on_improvement=offer, incumbent=incumbent.better_than)
+    initial = incumbent.better_than(float("inf"))
+    lower_bound = ObjectiveLowerBound.from_graph(graph, objective).value
+    options = LnsOptions(time_limit=deadline - time.monotonic(), seed=seed, lower_bound=lower_bound)
+    result = solve_with_lns(graph, objective, options, initial, hooks)
+    offer(result.schedule, result.objective_value)
+
+
+def _run_mip(compiled: CompiledInstance, incumbent: SharedIncumbent, index: int, deadline: float) -> None:
+    from scripts.displib_mip import MipOptions, solve_instance  # pylint: disable=import-outside-toplevel
+
+    schedule, _ = solve_instance(compiled, MipOptions(time_limit=max(deadline - time.monotonic(), 1.0)))
+    graph = CompactDependencyGraph.from_compiled_instance(compiled)
+    if schedule is not None and verify_schedule(graph, schedule).feasible:
+        incumbent.offer(schedule, DelayObjective.from_compiled_instance(compiled).evaluate(schedule.start), index)
+
+
+def _run_hexaly(compiled: CompiledInstance, incumbent: SharedIncumbent, index: int, deadline: float) -> None:
+    # pylint: disable-next=import-outside-toplevel
+    from scripts.solving_with_hexaly import HexalyOptions, solve_with_hexaly
+
+    reduced = reduce_instance(compiled)
+    reduced_graph = CompactDependencyGraph.from_compiled_instance(reduced.instance)
+    graph = CompactDependencyGraph.from_compiled_instance(compiled)
+    objective = DelayObjective.from_compiled_instance(compiled)
+    options = HexalyOptions(time_limit=max(int(deadline - time.monotonic()), 1))
+    initial = dispatch_greedily(reduced_graph, earliest_start_lb).schedule
+    for solution in solve_with_hexaly(
+        reduced_graph, DelayObjective.from_compiled_instance(reduced.instance), options, initial
+    ):
+        schedule = reduced.expand_schedule(solution.schedule)
+        if verify_schedule(graph, schedule).feasible:
+            incumbent.offer(schedule, objective.evaluate(schedule.start), index)
+
+
+def main(path: Path, path_to_solution: Path | None, options: PortfolioOptions) -> None:
+    compiled = CompiledInstance.from_json(path)
+    schedule, statistics = run_portfolio(compiled, options)
+    for key, value in statistics.items():
+        print(f"{key:<16} {value}")
+    graph = CompactDependencyGraph.from_compiled_instance(compiled)
+    feasible = verify_schedule(graph, schedule).feasible
+    print(f"{'feasible':<16} {feasible}")
+    if path_to_solution is not None and feasible:
+        path_to_solution.parent.mkdir(exist_ok=True, parents=True)
+        schedule.write_json(graph, path_to_solution, statistics["objective_value"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--path_to_solution", type=Path, default=None)
+    parser.add_argument("--time_limit", type=float, default=60.0)
+    parser.add_argument("--lns_workers", type=int, default=None)
+    parser.add_argument("--no_mip", dest="mip", action="store_false")
+    parser.add_argument("--no_hexaly", dest="hexaly", action="store_false")
+    parser.add_argument("--margin", type=float, default=2.0)
+    arguments = vars(parser.parse_args())
+    main(arguments.pop("path"), arguments.pop("path_to_solution"), PortfolioOptions(**arguments))
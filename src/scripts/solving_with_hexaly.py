@@ -1,77 +1,373 @@
+import argparse
+import queue
+import threading
+import time
 from pathlib import Path
-import hexaly.optimizer
+from typing import Any, Callable, Iterator, NamedTuple
 
-from hackthetrack.dependencygraph.network import DependencyGraph
-from hackthetrack.displib.load_displib_instance import DisplibInstance
+import numpy as np
 
+from hackthetrack.dependencygraph import CompactDependencyGraph
+from hackthetrack.dependencygraph.propagation import propagate_start_bounds
+from hackthetrack.displib import CompiledInstance
+from hackthetrack.solution import DelayObjective, Schedule, verify_schedule
+from hackthetrack.solvers import dispatch_greedily, earliest_start_lb, reduce_instance
 
-def main():
-    displib_instance_path = Path("out/instances/displib_instances_phase1/line1_critical_0.json")
-    instance = DisplibInstance.from_json(displib_instance_path)
 
-    network = DependencyGraph.from_displib_instance(instance)
-    objective_nodes = [
-        network.node_by_train_id_and_index(obj["train"], obj["operation"]) for obj in instance.objectives
-    ]
-    objective_node_indices = [node.index for node in objective_nodes]
+class HexalyOptions(NamedTuple):
+    time_limit: int = 60  # seconds
+    seed: int = 0
+    horizon: int | None = None  # latest start of any operation, derived from the instance if not given
+    tick_seconds: int = 1  # how often the incumbent is checked for an improvement
+    verbosity: int = 0
+
+
+class AnytimeSolution(NamedTuple):
+    schedule: Schedule
+    objective_value: float
+    seconds: float
+
+
+class _Decisions(NamedTuple):
+    start: list[Any]
+    visited: list[Any]
+    route: list[Any]
+    sequences: list[Any]  # one list variable per used resource over the local indices of its uses
+    objective: Any
+
+
+class _InstanceArrays(NamedTuple):
+    """Everything the model needs, as plain lists so they can be turned into Hexaly arrays in one call each."""
+
+    earliest: list[int]
+    latest: list[int]
+    min_duration: list[int]
+    link_sources: list[int]
+    link_targets: list[int]
+    successor_offsets: list[int]
+    in_offsets: list[int]
+    in_links: list[int]
+    is_first: list[int]
+    node_train: list[int]
+    use_offsets: list[int]
+    use_nodes: list[int]
+    use_resources: list[int]
+    use_release: list[int]
+    stay_offsets: list[int]
+    stay_links: list[int]
+    objective_nodes: list[int]
+    objective_threshold: list[float]
+    objective_increment: list[float]
+    objective_coeff: list[float]
+
+
+def solve_with_hexaly(
+    graph: CompactDependencyGraph,
+    objective: DelayObjective,
+    options: HexalyOptions = HexalyOptions(),
+    initial: Schedule | None = None,
+) -> Iterator[AnytimeSolution]:
+    """
+    Solve the instance with Hexaly and yield every improving solution as soon as it is found.
 
-    num_operations = len(network.all_nodes)
+    The optimizer runs in a background thread; solutions are collected by a time ticked callback. An initial
+    schedule, e.g. from dispatch_greedily, is used as a warm start even if it is incomplete or infeasible.
+    """
+    solutions: queue.Queue = queue.Queue()
+    done = object()
+
+    def run() -> None:
+        try:
+            _solve(graph, objective, options, initial, solutions.put)
+        except BaseException as exception:  # pylint: disable=broad-except
+            solutions.put(exception)
+        finally:
+            solutions.put(done)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while (item := solutions.get()) is not done:
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+    thread.join()
+
+
+def _solve(
+    graph: CompactDependencyGraph,
+    objective: DelayObjective,
+    options: HexalyOptions,
+    initial: Schedule | None,
+    emit: Callable[[AnytimeSolution], None],
+) -> None:
+    import hexaly.optimizer  # pylint: disable=import-outside-toplevel
+
+    arrays = _instance_arrays(graph, objective, options.horizon)
+    started = time.perf_counter()
+    best = np.inf
+
+    def report(optimizer: Any, _: Any = None) -> None:
+        nonlocal best
+        if optimizer.solution.status not in (
+            hexaly.optimizer.HxSolutionStatus.FEASIBLE,
+            hexaly.optimizer.HxSolutionStatus.OPTIMAL,
+        ):
+            return
+        value = float(decisions.objective.value)
+        if value < best:
+            best = value
+            emit(AnytimeSolution(_schedule(graph, decisions), value, time.perf_counter() - started))
 
     with hexaly.optimizer.HexalyOptimizer() as optimizer:
-        model = optimizer.get_model()
-
-        operations = [model.interval(node.start_lb if node.start_lb else 0, horizon) for node in network.all_nodes]
-        operation_array = model.array(operations)
-
-        resource_allocation = model.array([model.list(num_operations) for _ in range(num_resources)])
-
-        operation_to_train_array = model.array(operation_to_train)
-
-        # lower bound on operation duration and upper bound on start time if applicable
-        for i, operation in enumerate(operations):
-            model.add_constraint(model.length(operation) >= network.all_nodes[i].min_duration)
-            if network.all_nodes[i].start_ub is not None:
-                model.add_constraint(model.start(operation) <= network.all_nodes[i].start_ub)
-
-        # ordering of operations on the same resource with release times if subsequent operations are on different trains
-        for r in range(num_resources):
-            sequence = resource_allocation[r]
-            release_times_for_resource = model.array(release_times[r])
-            sequence_lambda = model.lambda_function(
-                lambda i: operation_array[sequence[i]]
-                + (operation_to_train_array[sequence[i]] != operation_to_train_array[sequence[i + 1]])
-                * release_times_for_resource[sequence[i]]
-                < operation_array[sequence[i + 1]]
+        decisions = _build_model(optimizer.model, arrays)
+        if initial is not None:
+            _set_initial_solution(decisions, graph, arrays, initial)
+        optimizer.param.time_limit = options.time_limit
+        optimizer.param.seed = options.seed
+        optimizer.param.verbosity = options.verbosity
+        optimizer.param.time_between_ticks = options.tick_seconds
+        optimizer.add_callback(hexaly.optimizer.HxCallbackType.TIME_TICKED, report)
+        optimizer.solve()
+        report(optimizer)
+
+
+def _instance_arrays(graph: CompactDependencyGraph, objective: DelayObjective, horizon: int | None) -> _InstanceArrays:
+    bounds = propagate_start_bounds(graph)
+    if horizon is None:
+        horizon = int(graph.effective_start_lb.max(initial=0.0) + graph.min_duration.sum() + graph.release_times.sum())
+    sources, targets = graph.link_sources(), graph.successors
+    in_links = np.argsort(targets, kind="stable")
+    in_offsets = np.zeros(graph.n_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(targets, minlength=graph.n_count), out=in_offsets[1:])
+    is_first = np.zeros(graph.n_count, dtype=np.int64)
+    is_first[graph.train_offsets[:-1]] = 1
+
+    # uses sorted by resource, so the uses of the r-th used resource are use_offsets[r]:use_offsets[r + 1]; resources
+    # without uses, e.g. after reduce_instance removed their operations, are left out as Hexaly lists cannot be empty
+    n_resources = max(len(graph.resource_names), 1)
+    use_order = np.argsort(graph.resource_ids, kind="stable")
+    use_nodes, resource_ids = graph.resource_use_nodes()[use_order], graph.resource_ids[use_order]
+    _, use_resources, use_counts = np.unique(resource_ids, return_inverse=True, return_counts=True)
+    use_offsets = np.zeros(len(use_counts) + 1, dtype=np.int64)
+    np.cumsum(use_counts, out=use_offsets[1:])
+
+    # links after which a train stays on the resource of a use, the release time does not apply then
+    use_keys = np.sort(graph.resource_use_nodes() * n_resources + graph.resource_ids)
+    counts = np.diff(graph.successor_offsets)[use_nodes]
+    use_of_link = np.repeat(np.arange(len(use_nodes)), counts)
+    links = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    links += graph.successor_offsets[use_nodes][use_of_link]
+    stays = np.isin(targets[links] * n_resources + resource_ids[use_of_link], use_keys)
+    stay_offsets = np.zeros(len(use_nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(use_of_link[stays], minlength=len(use_nodes)), out=stay_offsets[1:])
+
+    return _InstanceArrays(
+        earliest=np.ceil(bounds.earliest).astype(np.int64).tolist(),
+        latest=np.floor(np.minimum(bounds.latest, horizon)).astype(np.int64).tolist(),
+        min_duration=graph.min_duration.astype(np.int64).tolist(),
+        link_sources=sources.tolist(),
+        link_targets=targets.tolist(),
+        successor_offsets=graph.successor_offsets.tolist(),
+        in_offsets=in_offsets.tolist(),
+        in_links=in_links.tolist(),
+        is_first=is_first.tolist(),
+        node_train=graph.train_ids.tolist(),
+        use_offsets=use_offsets.tolist(),
+        use_nodes=use_nodes.tolist(),
+        use_resources=use_resources.tolist(),
+        use_release=graph.release_times[use_order].astype(np.int64).tolist(),
+        stay_offsets=stay_offsets.tolist(),
+        stay_links=links[stays].tolist(),
+        objective_nodes=objective.nodes.tolist(),
+        objective_threshold=objective.threshold.tolist(),
+        objective_increment=objective.increment.tolist(),
+        objective_coeff=objective.coeff.tolist(),
+    )
+
+
+def _build_model(model: Any, arrays: _InstanceArrays) -> _Decisions:
+    """
+    One decision per node and link plus one list per used resource; every family of constraints is a single lambda
+    expression over constant arrays, so the size of the model graph does not grow with the number of constraints.
+    """
+    n_count, n_links, n_uses = len(arrays.earliest), len(arrays.link_sources), len(arrays.use_nodes)
+    const = {field: model.array(values) for field, values in arrays._asdict().items()}
+    start = [model.int(lo, hi) for lo, hi in zip(arrays.earliest, arrays.latest)]
+    visited = [model.bool() for _ in range(n_count)]
+    route = [model.bool() for _ in range(n_links)]
+    sequences = [
+        model.list(arrays.use_offsets[r + 1] - arrays.use_offsets[r]) for r in range(len(arrays.use_offsets) - 1)
+    ]
+    start_array, visited_array, route_array = model.array(start), model.array(visited), model.array(route)
+    sequence_array = model.array(sequences)
+
+    def links_sum(offsets: Any, row: Any, term: Callable[[Any], Any], links: Any = None) -> Any:
+        """Sum of `term` over the links of a CSR row, `links` maps the positions of the row to links."""
+        return model.sum(
+            model.range(offsets[row], offsets[row + 1]),
+            model.lambda_function(lambda k: term(k if links is None else links[k])),
+        )
+
+    # a visited node is left along exactly one link and, unless it is the first one, entered along exactly one
+    model.constraint(
+        model.and_(
+            model.range(0, n_count),
+            model.lambda_function(
+                lambda i: model.and_(
+                    links_sum(const["successor_offsets"], i, lambda link: route_array[link])
+                    == visited_array[i] * (const["successor_offsets"][i + 1] > const["successor_offsets"][i]),
+                    links_sum(const["in_offsets"], i, lambda link: route_array[link], const["in_links"])
+                    + const["is_first"][i]
+                    == visited_array[i],
+                )
+            ),
+        )
+    )
+    # a train stays at least min_duration in an operation before it moves on along the chosen link
+    model.constraint(
+        model.and_(
+            model.range(0, n_links),
+            model.lambda_function(
+                lambda link: route_array[link]
+                * (
+                    start_array[const["link_sources"][link]]
+                    + const["min_duration"][const["link_sources"][link]]
+                    - start_array[const["link_targets"][link]]
+                )
+                <= 0
+            ),
+        )
+    )
+
+    # the time a train leaves a node, i.e. the start of the chosen successor, or its end if it is the last one
+    leave = model.array(
+        model.range(0, n_count),
+        model.lambda_function(
+            lambda i: model.iif(
+                const["successor_offsets"][i + 1] > const["successor_offsets"][i],
+                links_sum(
+                    const["successor_offsets"],
+                    i,
+                    lambda link: route_array[link] * start_array[const["link_targets"][link]],
+                ),
+                start_array[i] + const["min_duration"][i],
             )
-            model.constraint(model.and_(model.range(0, model.count(sequence) - 1), sequence_lambda))
-
-        # no-wait and routing of trains
-        for node in network.all_nodes:
-            neighbors = network.neighbors(node.id, "out")
-            if len(neighbors) == 0:
-                continue
-            elif len(neighbors) == 1:
-                model.add_constraint(
-                    model.end(operation_array[node.index]) == model.start(operation_array[neighbors[0].index])
+        ),
+    )
+    # the release time applies unless the train moves on to an operation using the same resource
+    released = model.array(
+        model.range(0, n_uses),
+        model.lambda_function(
+            lambda use: leave[const["use_nodes"][use]]
+            + const["use_release"][use]
+            * (1 - links_sum(const["stay_offsets"], use, lambda link: route_array[link], const["stay_links"]))
+        ),
+    )
+
+    # every resource sequence holds exactly the uses of the visited nodes
+    model.constraint(
+        model.and_(
+            model.range(0, n_uses),
+            model.lambda_function(
+                lambda use: model.contains(
+                    sequence_array[const["use_resources"][use]], use - const["use_offsets"][const["use_resources"][use]]
                 )
-            else:
-                model.add_constraint(
-                    model.or_(
-                        [
-                            model.end(operation_array[node.index]) == model.start(operation_array[neighbor.index])
-                            for neighbor in neighbors
-                        ]
-                    )
+                == visited_array[const["use_nodes"][use]]
+            ),
+        )
+    )
+
+    # consecutive uses of a resource by different trains: the second starts after the first was released
+    def ordered(resource: Any) -> Any:
+        sequence, offset = sequence_array[resource], const["use_offsets"][resource]
+        return model.and_(
+            model.range(0, model.count(sequence) - 1),
+            model.lambda_function(
+                lambda k: start_array[const["use_nodes"][offset + sequence[k + 1]]]
+                >= model.iif(
+                    const["node_train"][const["use_nodes"][offset + sequence[k]]]
+                    != const["node_train"][const["use_nodes"][offset + sequence[k + 1]]],
+                    released[offset + sequence[k]],
+                    start_array[const["use_nodes"][offset + sequence[k]]],
                 )
+            ),
+        )
 
-        # activate all trains
+    if sequences:
+        model.constraint(model.and_(model.range(0, len(sequences)), model.lambda_function(ordered)))
 
-        # objective
-        model.minimize(model.sum(model.start(operation_array[i]) for i in objective_node_indices))
-        model.close()
+    def cost(component: Any) -> Any:
+        node = const["objective_nodes"][component]
+        delay = start_array[node] - const["objective_threshold"][component]
+        return visited_array[node] * (
+            const["objective_coeff"][component] * model.max(0, delay)
+            + const["objective_increment"][component] * (delay > 0)
+        )
 
-        optimizer.solve()
+    total = model.sum(model.range(0, len(arrays.objective_nodes)), model.lambda_function(cost))
+    model.minimize(total)
+    model.close()
+    return _Decisions(start=start, visited=visited, route=route, sequences=sequences, objective=total)
+
+
+def _set_initial_solution(
+    decisions: _Decisions, graph: CompactDependencyGraph, arrays: _InstanceArrays, initial: Schedule
+) -> None:
+    visited = initial.visited
+    start = np.clip(np.nan_to_num(initial.start, nan=0.0), arrays.earliest, arrays.latest).astype(np.int64)
+    for variable, value in zip(decisions.start, start.tolist()):
+        variable.value = value
+    for variable, value in zip(decisions.visited, visited.tolist()):
+        variable.value = value
+    taken = np.zeros(graph.l_count, dtype=bool)
+    sources = np.flatnonzero(initial.next_node >= 0)
+    link_keys = graph.link_sources() * graph.n_count + graph.successors
+    taken[np.isin(link_keys, sources * graph.n_count + initial.next_node[sources])] = True
+    for variable, value in zip(decisions.route, taken.tolist()):
+        variable.value = value
+    use_nodes = np.asarray(arrays.use_nodes)
+    for resource, sequence in enumerate(decisions.sequences):
+        lo, hi = arrays.use_offsets[resource], arrays.use_offsets[resource + 1]
+        local = np.flatnonzero(visited[use_nodes[lo:hi]])
+        sequence.value.clear()
+        for use in local[np.argsort(start[use_nodes[lo:hi][local]], kind="stable")].tolist():
+            sequence.value.add(use)
+
+
+def _schedule(graph: CompactDependencyGraph, decisions: _Decisions) -> Schedule:
+    visited = np.fromiter((variable.value for variable in decisions.visited), dtype=bool, count=graph.n_count)
+    start = np.fromiter((variable.value for variable in decisions.start), dtype=np.float64, count=graph.n_count)
+    taken = np.fromiter((variable.value for variable in decisions.route), dtype=bool, count=graph.l_count)
+    next_node = np.full(graph.n_count, -1, dtype=np.int64)
+    next_node[graph.link_sources()[taken]] = graph.successors[taken]
+    return Schedule(start=np.where(visited, start, np.nan), next_node=next_node)
+
+
+def main(path: Path, path_to_solution: Path | None, options: HexalyOptions) -> None:
+    compiled = CompiledInstance.from_json(path)
+    reduced = reduce_instance(compiled)
+    graph = CompactDependencyGraph.from_compiled_instance(reduced.instance)
+    initial = dispatch_greedily(graph, earliest_start_lb).schedule
+    original_graph = CompactDependencyGraph.from_compiled_instance(compiled)
+    for solution in solve_with_hexaly(graph, DelayObjective.from_compiled_instance(reduced.instance), options, initial):
+        schedule = reduced.expand_schedule(solution.schedule)
+        feasible = verify_schedule(original_graph, schedule).feasible
+        print(f"{solution.seconds:>8.1f}s objective {solution.objective_value:>12.1f} feasible {feasible}")
+        if path_to_solution is not None and feasible:
+            path_to_solution.parent.mkdir(exist_ok=True, parents=True)
+            schedule.write_json(original_graph, path_to_solution, solution.objective_value)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "path", type=Path, nargs="?", default=Path("out/instances/displib_instances_phase1/line1_critical_0.json")
+    )
+    parser.add_argument("--path_to_solution", type=Path, default=None)
+    parser.add_argument("--time_limit", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--horizon", type=int, default=None)
+    parser.add_argument("--tick_seconds", type=int, default=1)
+    parser.add_argument("--verbosity", type=int, default=0)
+    arguments = vars(parser.parse_args())
+    main(arguments.pop("path"), arguments.pop("path_to_solution"), HexalyOptions(**arguments))